@@ -3,4 +3,4 @@ test
 """
 
 from .config import GENOME_VERSION
-from .main import rnpfind
+from .main import rnpfind, rnpfind_batch
@@ -28,15 +28,17 @@ should be edited to incorporate the function on RNPFind!
 
 # First, import the function from wherever it is defined:
 from .over_all_corr_analysis import overall_correlation_analysis
+from .per_binding_site_analysis import per_binding_site_analysis
 from .ucsc_visualize import ucsc_visualize
 
 # Give your method a short name:
-analysis_methods_supported_short = ["csv", "bed"]
+analysis_methods_supported_short = ["csv", "bed", "sites"]
 
 # Give your method a long name:
 analysis_methods_supported_long = [
     "Binding correlation csv",
     "Bed files with binding data",
+    "Nearby sites per binding site csv",
 ]
 
 # Map your short name to the variable imported above that corresponds to your
@@ -44,4 +46,10 @@ analysis_methods_supported_long = [
 analysis_method_functions = {
     "csv": overall_correlation_analysis,
     "bed": ucsc_visualize,
+    "sites": per_binding_site_analysis,
 }
+
+# The short names of the methods run when none are asked for. Leave out
+# methods whose output can get very large, so that they are only run on
+# request:
+analysis_methods_default = ["csv", "bed"]
@@ -0,0 +1,71 @@
+"""
+Defines the class AnnotationTable, which stores the annotations of the binding
+sites obtained from one data source.
+
+Data sources annotate each binding site with a row of features (e.g. a database
+id, a score and an experiment type). Many binding sites share the same row: a
+motif found by a PWM scan is annotated the same way wherever it is found, and
+experimental sites that are merged together keep the rows of all of them. So
+rather than carrying the row itself (or a string encoding of it) on every site,
+rows are stored once in an AnnotationTable, and binding sites are annotated with
+the integer id of their row. Sites that were merged from several sites are
+annotated with a tuple of the ids of their rows.
+"""
+
+
+class AnnotationTable:
+    """
+    A table of annotation rows, each stored once and referred to by an
+    integer id.
+    """
+
+    def __init__(self):
+        # Rows by id, and ids by row
+        self.rows = []
+        self._row_ids = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, row_id):
+        return self.rows[row_id]
+
+    def add(self, row):
+        """
+        Adds a row to the table, unless an identical row is already in it, and
+        returns the id of the row.
+
+        :param row: an iterable of features (strings) annotating a binding site
+
+        """
+        row = tuple(row)
+        row_id = self._row_ids.get(row)
+        if row_id is None:
+            row_id = len(self.rows)
+            self.rows.append(row)
+            self._row_ids[row] = row_id
+        return row_id
+
+    def get_rows(self, annotation):
+        """
+        Returns the rows a binding site annotation refers to.
+
+        :param annotation: a row id, or a tuple of row ids (as for merged
+                           sites)
+
+        """
+        if isinstance(annotation, tuple):
+            return [self.rows[row_id] for row_id in annotation]
+        return [self.rows[annotation]]
+
+    @staticmethod
+    def merge(annotation_list):
+        """
+        Merges the annotations of binding sites that are being merged
+        together. Meant as the annotation_merger of
+        BindingSites.overlap_collapse(), which passes in a list of row ids.
+
+        :param annotation_list: a list of row ids
+
+        """
+        return tuple(annotation_list)
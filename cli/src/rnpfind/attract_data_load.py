@@ -4,9 +4,10 @@ ATTRACT database.
 
 """
 
-from .config import ANNOTATION_COLUMN_DELIMITER, ATTRACT_PATH
+from .config import ATTRACT_PATH
 from .picklify import picklify
 from .pwm_scan import get_human_seq, pwm_scan, str_to_pwm
+from .site_batch import SiteBatch
 
 attract_all_column_names = [
     "Gene_name",
@@ -59,10 +60,20 @@ def generate_matrix_to_pwm_dict():
     return matrix_to_pwm_dict
 
 
+def attract_max_site_length():
+    """
+    Returns the length of the longest motif scanned for by
+    attract_data_load(), which is that of the longest binding site it gives.
+    """
+    matrix_to_pwm_dict = picklify(generate_matrix_to_pwm_dict)
+    return max(len(pwm["A"]) for pwm in matrix_to_pwm_dict.values())
+
+
 def attract_data_load(rna_info):
     """
     Loads RBP binding sites from the ATTRACT database for a given RNA molecule,
-    and returns the sites as a Generator / Iterator object.
+    and returns the sites as a Generator / Iterator object, with one SiteBatch
+    per motif scanned for (empty if the motif is not found).
     :param rna_info: a dictionary containing the location of the RNA on the
         hg38 genome by specifying its chromosome location, start coordinates,
         and end coordinates.
@@ -101,8 +112,8 @@ def attract_data_load(rna_info):
                 )
                 continue
 
-            annotation = ANNOTATION_COLUMN_DELIMITER.join(
-                [protein_columns[i] for i in attract_columns_of_interest]
+            annotation = tuple(
+                protein_columns[i] for i in attract_columns_of_interest
             )
 
             rbp = protein_columns[0]
@@ -111,13 +122,9 @@ def attract_data_load(rna_info):
 
             pwm = matrix_to_pwm_dict[matrix_id]
             sites = pwm_scan(rna_seq, pwm)
-            if not sites:
-                protein_columns = (
-                    handle.readline().replace("\n", "").split("\t")
-                )
-                continue
 
-            for start, end in sites:
-                yield rbp, start, end, annotation
+            # Yielded even if empty, so every region gets the same chunks
+            # (see data_load_sources_max_site_lengths)
+            yield SiteBatch.from_sites(rbp, annotation, sites)
 
             protein_columns = handle.readline().replace("\n", "").split("\t")
@@ -0,0 +1,940 @@
+"""
+Writes bigBed and bigWig files, the indexed binary forms of BED and wig files
+that the UCSC Genome Browser reads from trackhubs, without the UCSC
+bedToBigBed and bedGraphToBigWig tools.
+
+Both are BBI files, laid out as follows (all numbers little-endian):
+    - a header, followed by room for a header per zoom level (for as many
+      zoom levels as there may be)
+    - the AutoSql description of the fields (bigBed only)
+    - a summary of all the data (see Summary)
+    - an extension header, giving no extra indexes (bigBed only)
+    - a B+ tree mapping chromosome names to ids and sizes
+    - the data: the number of items, then blocks of items on one chromosome,
+      each compressed with zlib
+    - an R tree indexing the blocks by the region they cover
+    - for each zoom level, blocks of summaries of the data over windows of
+      reduction bases, and an R tree indexing them
+    - the magic number of the file again
+
+Files are laid out byte for byte as bedToBigBed and bedGraphToBigWig lay
+them out (test/test_data holds files made by those tools, to check against).
+bigBed files, the summaries give the depth of coverage by the items, as for
+bedToBigBed. See https://genome.ucsc.edu/goldenPath/help/bigBed.html and the
+kent source (bbiFile.h) for details.
+"""
+
+import struct
+import zlib
+
+BIGBED_MAGIC = 0x8789F2EB
+BIGWIG_MAGIC = 0x888FFC26
+CHROM_TREE_MAGIC = 0x78CA8C91
+R_TREE_MAGIC = 0x2468ACE0
+BBI_VERSION = 4
+
+# The most children a node of either tree has
+BLOCK_SIZE = 256
+# The most items in a block of data (or of summaries of a zoom level)
+BED_ITEMS_PER_SLOT = 512
+WIG_ITEMS_PER_SLOT = 1024
+
+MAX_ZOOM_LEVELS = 10
+# Each zoom level summarizes windows this many times wider than the last
+ZOOM_INCREMENT = 4
+# The narrowest windows tried for the first zoom level, and the widest
+MIN_ZOOM_REDUCTION = 10
+MAX_ZOOM_REDUCTION = 1000000000
+
+# Type of bigWig sections whose items are (start, end, value)
+BEDGRAPH_SECTION = 1
+
+HEADER_SIZE = 64
+ZOOM_HEADER_SIZE = 24
+SUMMARY_SIZE = 40
+ZOOM_RECORD_SIZE = 32
+TREE_HEADER_SIZE = 32
+R_TREE_HEADER_SIZE = 48
+EXTENSION_HEADER_SIZE = 64
+
+
+def read_chrom_sizes(chrom_sizes_path):
+    """
+    Reads a chrom.sizes file (as given by UCSC for each genome), and returns a
+    dictionary mapping chromosome names to their sizes.
+
+    :param chrom_sizes_path: path to the chrom.sizes file
+
+    """
+    chrom_sizes = {}
+    with open(chrom_sizes_path) as handle:
+        for line in handle:
+            if line.strip():
+                chrom, size = line.split()[:2]
+                chrom_sizes[chrom] = int(size)
+    return chrom_sizes
+
+
+def read_bed_rows(bed_path):
+    """
+    Reads the rows of a BED file as (chrom, start, end, fields) rows, as taken
+    by write_bigbed(), skipping track, browser and comment lines.
+
+    :param bed_path: path to the BED file
+
+    """
+    rows = []
+    with open(bed_path) as handle:
+        for line in handle:
+            line = line.rstrip("\r\n")
+            if not line or line.startswith(("track", "browser", "#")):
+                continue
+            chrom, start, end, *fields = line.split("\t")
+            rows.append((chrom, int(start), int(end), fields))
+    return rows
+
+
+def read_wig_runs(wig_path):
+    """
+    Reads the values of a wig file (in fixedStep, variableStep or bedGraph
+    format) as (chrom, start, end, value) runs of bases, as taken by
+    write_bigwig(). Neighbouring bases of the same value are joined into one
+    run.
+
+    :param wig_path: path to the wig file
+
+    """
+    runs = []
+
+    def add_run(chrom, start, end, value):
+        """Adds a run, joining it to the last one if they meet"""
+        if runs and runs[-1][0] == chrom and runs[-1][2] == start:
+            if runs[-1][3] == value:
+                runs[-1] = (chrom, runs[-1][1], end, value)
+                return
+        runs.append((chrom, start, end, value))
+
+    step_type = "bedGraph"
+    section = {}
+    position = 0
+    with open(wig_path) as handle:
+        for line in handle:
+            words = line.split()
+            if not words or words[0] in ("track", "browser"):
+                continue
+            if words[0].startswith("#"):
+                continue
+            if words[0] in ("fixedStep", "variableStep"):
+                step_type = words[0]
+                section = dict(word.split("=", 1) for word in words[1:])
+                # Positions in fixedStep and variableStep sections are 1-based
+                position = int(section.get("start", 1)) - 1
+                continue
+
+            span = int(section.get("span", 1))
+            if step_type == "fixedStep":
+                add_run(
+                    section["chrom"],
+                    position,
+                    position + span,
+                    float(words[0]),
+                )
+                position += int(section.get("step", 1))
+            elif step_type == "variableStep":
+                start = int(words[0]) - 1
+                add_run(section["chrom"], start, start + span, float(words[1]))
+            else:
+                add_run(
+                    words[0], int(words[1]), int(words[2]), float(words[3])
+                )
+    return runs
+
+
+def single_precision(value):
+    """Rounds a number to the nearest single precision float"""
+    return struct.unpack("<f", struct.pack("<f", value))[0]
+
+
+class Summary:
+    """
+    Summarizes the values of the bases of a region: how many bases have a
+    value, their lowest and highest value, and the sum of their values and of
+    their squares. Kept for the whole file, and for each window of each zoom
+    level. As in the UCSC tools, the value of each run of bases is multiplied
+    out in single precision floats, and the sums of a window are kept as
+    single precision floats too.
+    """
+
+    def __init__(self, chrom_id=0, start=0, end=0, window=True):
+        self.chrom_id = chrom_id
+        self.start = start
+        self.end = end
+        self.window = window
+        self.valid_count = 0
+        self.min_val = None
+        self.max_val = None
+        self.sum_data = 0.0
+        self.sum_squares = 0.0
+
+    def add(self, value, bases):
+        """
+        Adds a number of bases with the same value.
+
+        :param value: the value of the bases
+        :param bases: the number of bases
+
+        """
+        self.valid_count += bases
+        if self.min_val is None or value < self.min_val:
+            self.min_val = value
+        if self.max_val is None or value > self.max_val:
+            self.max_val = value
+        self.add_sums(
+            single_precision(value * bases),
+            single_precision(single_precision(value * value) * bases),
+        )
+
+    def merge(self, summary):
+        """
+        Adds the bases of another summary, that comes right after this one.
+
+        :param summary: the Summary instance to add
+
+        """
+        self.end = summary.end
+        self.valid_count += summary.valid_count
+        if self.min_val is None or summary.min_val < self.min_val:
+            self.min_val = summary.min_val
+        if self.max_val is None or summary.max_val > self.max_val:
+            self.max_val = summary.max_val
+        self.add_sums(summary.sum_data, summary.sum_squares)
+
+    def add_sums(self, data, squares):
+        """
+        Adds to the sum of the values and of their squares.
+
+        :param data: the amount to add to the sum of the values
+        :param squares: the amount to add to the sum of their squares
+
+        """
+        self.sum_data += data
+        self.sum_squares += squares
+        if self.window:
+            self.sum_data = single_precision(self.sum_data)
+            self.sum_squares = single_precision(self.sum_squares)
+
+    def total_summary_bytes(self):
+        """Returns the summary as the total summary of a BBI file"""
+        return struct.pack(
+            "<Qdddd",
+            self.valid_count,
+            self.min_val or 0.0,
+            self.max_val or 0.0,
+            self.sum_data,
+            self.sum_squares,
+        )
+
+    def zoom_record_bytes(self):
+        """Returns the summary as a record of a zoom level"""
+        return struct.pack(
+            "<IIIIffff",
+            self.chrom_id,
+            self.start,
+            self.end,
+            self.valid_count,
+            self.min_val,
+            self.max_val,
+            self.sum_data,
+            self.sum_squares,
+        )
+
+
+def coverage_runs(intervals):
+    """
+    Returns the depth of coverage of a number of intervals on one chromosome,
+    as sorted (start, end, depth) runs of bases covered by the same number of
+    intervals (leaving out bases covered by none).
+
+    :param intervals: an iterable of (start, end) intervals
+
+    """
+    events = sorted(
+        event
+        for start, end in intervals
+        if start < end
+        for event in ((start, 1), (end, -1))
+    )
+    runs = []
+    depth = 0
+    position = None
+    for event_position, change in events:
+        if depth and event_position > position:
+            runs.append((position, event_position, depth))
+        depth += change
+        position = event_position
+    return runs
+
+
+def summarize(runs, reduction, chrom_sizes_by_id):
+    """
+    Summarizes runs of bases of the same value over windows of reduction
+    bases, as bedToBigBed and bedGraphToBigWig do for the first zoom level: a
+    window starts at the first base that has a value after the last window
+    ends, and a run that goes on past the end of a window goes on in the
+    window right after it.
+
+    :param runs: sorted (chrom_id, start, end, value) runs of bases
+    :param reduction: the width of the windows
+    :param chrom_sizes_by_id: the size of each chromosome, by id
+
+    """
+    summaries = []
+    summary = None
+    for chrom_id, start, end, value in runs:
+        end = min(end, chrom_sizes_by_id[chrom_id])
+        while start < end:
+            if (
+                summary is None
+                or summary.chrom_id != chrom_id
+                or summary.end <= start
+            ):
+                summary = Summary(
+                    chrom_id,
+                    start,
+                    min(start + reduction, chrom_sizes_by_id[chrom_id]),
+                )
+                summaries.append(summary)
+            overlap = min(end, summary.end) - start
+            summary.add(value, overlap)
+            start += overlap
+    return summaries
+
+
+def reduce_summaries(summaries, reduction):
+    """
+    Summarizes the summaries of a zoom level over wider windows of up to
+    reduction bases, as the UCSC tools do for the levels after the first.
+
+    :param summaries: the summaries of a zoom level, in order
+    :param reduction: the width of the wider windows
+
+    """
+    reduced = []
+    for summary in summaries:
+        last = reduced[-1] if reduced else None
+        if (
+            last is None
+            or last.chrom_id != summary.chrom_id
+            or summary.end > last.start + reduction
+        ):
+            last = Summary(summary.chrom_id, summary.start, summary.end)
+            reduced.append(last)
+        last.merge(summary)
+    return reduced
+
+
+def zoom_window_counts(items, reductions):
+    """
+    Estimates how many summaries the first zoom level would have for each
+    width of windows tried, as the UCSC tools do before summarizing: a
+    window starts at the first item after the last window, and is followed
+    by as many more as the item needs.
+
+    :param items: sorted (chrom_id, start, end, ...) items of the data
+    :param reductions: the widths of windows tried
+
+    """
+    counts = [0] * len(reductions)
+    window_ends = [0] * len(reductions)
+    last_chrom_id = None
+    for chrom_id, start, end, *_ in items:
+        if chrom_id != last_chrom_id:
+            window_ends = [0] * len(reductions)
+            last_chrom_id = chrom_id
+        for i, reduction in enumerate(reductions):
+            if start >= window_ends[i]:
+                counts[i] += 1
+                window_ends[i] = start + reduction
+            while end > window_ends[i]:
+                counts[i] += 1
+                window_ends[i] += reduction
+    return counts
+
+
+def zoom_levels(items, runs, data_size, chrom_sizes_by_id):
+    """
+    Returns the zoom levels of a BBI file as (reduction, summaries) pairs, as
+    the UCSC tools choose them. Windows are tried from the average length of
+    the items up (at least MIN_ZOOM_REDUCTION bases, ZOOM_INCREMENT times
+    wider each try), and the first level has the narrowest windows whose
+    summaries are estimated to take up no more than half as much space as
+    the data (see zoom_window_counts()), or the narrowest tried if none do.
+    Each level after it merges the summaries of the last into windows
+    ZOOM_INCREMENT times wider (see reduce_summaries()), for as long as that
+    leaves fewer summaries.
+
+    :param items: sorted (chrom_id, start, end, ...) items of the data
+    :param runs: sorted (chrom_id, start, end, value) runs of bases
+    :param data_size: the size in bytes of the data, as written to the file
+        (after the count of items, compressed)
+    :param chrom_sizes_by_id: the size of each chromosome, by id
+
+    """
+    if not items:
+        return []
+
+    average_size = sum(item[2] - item[1] for item in items) // len(items)
+    reductions = [max(average_size, MIN_ZOOM_REDUCTION)]
+    while (
+        len(reductions) < MAX_ZOOM_LEVELS
+        and reductions[-1] <= MAX_ZOOM_REDUCTION
+    ):
+        reductions.append(reductions[-1] * ZOOM_INCREMENT)
+    window_counts = zoom_window_counts(items, reductions)
+
+    # Compressed summaries are guessed to take half the space
+    reduction, count = next(
+        (
+            (reduction, count)
+            for reduction, count in zip(reductions, window_counts)
+            if count * ZOOM_RECORD_SIZE // 2 <= data_size // 2
+        ),
+        (reductions[0], window_counts[0]),
+    )
+    levels = [(reduction, summarize(runs, reduction, chrom_sizes_by_id))]
+    while len(levels) < MAX_ZOOM_LEVELS:
+        reduction *= ZOOM_INCREMENT
+        summaries = reduce_summaries(levels[-1][1], reduction)
+        if len(summaries) >= count:
+            break
+        count = len(summaries)
+        levels.append((reduction, summaries))
+    return levels
+
+
+def tree_bytes(
+    items,
+    offset,
+    block_size,
+    leaf_item_size,
+    pack_leaf_item,
+    branch_item_size,
+    pack_branch_item,
+):
+    """
+    Lays out a tree whose nodes have up to block_size children each, with the
+    given items in its leaves, as for both the chromosome B+ tree and the R
+    trees of BBI files: the root first, then each level below it in turn. As
+    in the UCSC tools, every node takes up the space of a full one, except
+    that the empty slots of a leaf are as big as those of a branch node.
+    Returns the bytes of the tree (without its header).
+
+    :param items: the items of the leaves, in order
+    :param offset: the position in the file the tree starts at
+    :param block_size: the most children of a node
+    :param leaf_item_size: the size in bytes of an item in a leaf
+    :param pack_leaf_item: a function returning the bytes of an item in a
+        leaf, given the item
+    :param branch_item_size: the size in bytes of a child of a branch node
+    :param pack_branch_item: a function returning the bytes of a child of a
+        branch node, given the first and the end index of the items under the
+        child, and the position of the child in the file
+
+    """
+    level_sizes = [max(1, -(-len(items) // block_size))]
+    while level_sizes[0] > 1:
+        level_sizes.insert(0, -(-level_sizes[0] // block_size))
+    depth = len(level_sizes)
+    branch_node_size = 4 + block_size * branch_item_size
+    leaf_node_size = 4 + block_size * leaf_item_size
+
+    level_offsets = []
+    for level, level_size in enumerate(level_sizes):
+        level_offsets.append(offset)
+        offset += level_size * (
+            leaf_node_size if level == depth - 1 else branch_node_size
+        )
+
+    chunks = []
+    for level in range(depth - 1):
+        # The number of items under each child of a node of this level
+        child_span = block_size ** (depth - level - 1)
+        child_size = leaf_node_size if level == depth - 2 else branch_node_size
+        for node in range(level_sizes[level]):
+            children = range(
+                node * block_size,
+                min((node + 1) * block_size, level_sizes[level + 1]),
+            )
+            chunks.append(struct.pack("<BBH", 0, 0, len(children)))
+            for child in children:
+                chunks.append(
+                    pack_branch_item(
+                        child * child_span,
+                        min((child + 1) * child_span, len(items)),
+                        level_offsets[level + 1] + child * child_size,
+                    )
+                )
+            chunks.append(
+                bytes((block_size - len(children)) * branch_item_size)
+            )
+
+    for node in range(level_sizes[-1]):
+        node_items = items[node * block_size : (node + 1) * block_size]
+        chunks.append(struct.pack("<BBH", 1, 0, len(node_items)))
+        chunks.extend(pack_leaf_item(item) for item in node_items)
+        chunks.append(bytes((block_size - len(node_items)) * branch_item_size))
+
+    return b"".join(chunks)
+
+
+def chrom_tree_bytes(chroms, offset):
+    """
+    Returns the bytes of the B+ tree mapping chromosome names to their ids and
+    sizes.
+
+    :param chroms: the (name, size) of each chromosome, sorted by name; the
+        id of each is its position in the list
+    :param offset: the position in the file the tree starts at
+
+    """
+    keys = [chrom.encode() for chrom, _ in chroms]
+    key_size = max((len(key) for key in keys), default=1)
+    block_size = max(1, min(len(chroms), BLOCK_SIZE))
+    items = [
+        (key.ljust(key_size, b"\0"), chrom_id, size)
+        for chrom_id, (key, (_, size)) in enumerate(zip(keys, chroms))
+    ]
+    header = struct.pack(
+        "<IIIIQQ", CHROM_TREE_MAGIC, block_size, key_size, 8, len(items), 0
+    )
+    return header + tree_bytes(
+        items,
+        offset + TREE_HEADER_SIZE,
+        block_size,
+        key_size + 8,
+        lambda item: item[0] + struct.pack("<II", item[1], item[2]),
+        key_size + 8,
+        lambda first, _, child_offset: items[first][0]
+        + struct.pack("<Q", child_offset),
+    )
+
+
+def r_tree_bytes(blocks, offset, end_offset, items_per_slot, item_count):
+    """
+    Returns the bytes of the R tree indexing blocks of data (or of summaries)
+    by the region they cover.
+
+    :param blocks: (start_chrom_id, start, end_chrom_id, end, block_offset,
+        block_size) for each block, in order
+    :param offset: the position in the file the tree starts at
+    :param end_offset: the position in the file the blocks end at
+    :param items_per_slot: the number of items indexed by each block, as
+        the UCSC tools count them: 1 for blocks of data, each indexed as one
+        item, and the most summaries in a block for zoom levels
+    :param item_count: the number of items indexed
+
+    """
+    if blocks:
+        bounds = blocks[0][:2] + max(block[2:4] for block in blocks)
+    else:
+        bounds = (0, 0, 0, 0)
+    header = struct.pack(
+        "<IIQIIIIQII",
+        R_TREE_MAGIC,
+        BLOCK_SIZE,
+        item_count,
+        *bounds,
+        end_offset,
+        items_per_slot,
+        0,
+    )
+    return header + tree_bytes(
+        blocks,
+        offset + R_TREE_HEADER_SIZE,
+        BLOCK_SIZE,
+        32,
+        lambda block: struct.pack("<IIIIQQ", *block),
+        24,
+        lambda first, end, child_offset: struct.pack(
+            "<IIIIQ",
+            *blocks[first][:2],
+            *max(block[2:4] for block in blocks[first:end]),
+            child_offset,
+        ),
+    )
+
+
+def chrom_ids(chroms_used, chrom_sizes):
+    """
+    Returns the (name, size) of the chromosomes used, sorted by name, along
+    with a dictionary mapping their names to their ids.
+
+    :param chroms_used: the names of the chromosomes used
+    :param chrom_sizes: a dictionary mapping chromosome names to sizes
+
+    """
+    missing_chroms = set(chroms_used) - set(chrom_sizes)
+    if missing_chroms:
+        raise ValueError(
+            f"Unknown chromosomes: {', '.join(sorted(missing_chroms))}"
+        )
+    chroms = [(chrom, chrom_sizes[chrom]) for chrom in sorted(chroms_used)]
+    return chroms, {
+        chrom: chrom_id for chrom_id, (chrom, _) in enumerate(chroms)
+    }
+
+
+def blocks_of(items, items_per_slot, chrom_id_of=lambda item: item[0]):
+    """
+    Splits items sorted by chromosome id into blocks of up to items_per_slot
+    items on one chromosome each.
+
+    :param items: the items to split
+    :param items_per_slot: the most items in a block
+    :param chrom_id_of: a function returning the chromosome id of an item
+        (Default value = the first element of the item)
+
+    """
+    block = []
+    for item in items:
+        if block and (
+            len(block) == items_per_slot
+            or chrom_id_of(item) != chrom_id_of(block[0])
+        ):
+            yield block
+            block = []
+        block.append(item)
+    if block:
+        yield block
+
+
+def write_bbi(
+    file_path,
+    magic,
+    chroms,
+    data_items,
+    data_blocks,
+    items_per_slot,
+    runs,
+    data_count=None,
+    auto_sql=None,
+    field_count=0,
+    defined_field_count=0,
+):
+    """
+    Writes a BBI file, out of its data blocks and the runs of values its
+    summaries are made from.
+
+    :param file_path: path to the file to write
+    :param magic: BIGBED_MAGIC or BIGWIG_MAGIC
+    :param chroms: the (name, size) of each chromosome, sorted by name
+    :param data_items: the sorted (chrom_id, start, end, ...) items of data,
+        from which the zoom levels are chosen (see zoom_levels())
+    :param data_blocks: a list of the (start_chrom_id, start, end_chrom_id,
+        end, raw bytes) of each block of data, in order
+    :param items_per_slot: the most items in a block of data (or of
+        summaries)
+    :param runs: sorted (chrom_id, start, end, value) runs of bases
+    :param data_count: the number of items (or sections) of data, if not
+        the number of data_items (Default value = None)
+    :param auto_sql: the AutoSql description of the fields (for bigBed files)
+        (Default value = None)
+    :param field_count: the number of fields (for bigBed files)
+        (Default value = 0)
+    :param defined_field_count: the number of standard BED fields (for bigBed
+        files) (Default value = 0)
+
+    """
+    if data_count is None:
+        data_count = len(data_items)
+    chrom_sizes_by_id = [size for _, size in chroms]
+
+    # Sections in file order, with the positions of later sections patched in
+    # once known
+    offset = HEADER_SIZE + ZOOM_HEADER_SIZE * MAX_ZOOM_LEVELS
+    auto_sql_offset = 0
+    auto_sql_bytes = b""
+    if auto_sql is not None:
+        auto_sql_offset = offset
+        auto_sql_bytes = auto_sql.encode() + b"\0"
+        offset += len(auto_sql_bytes)
+    total_summary_offset = offset
+    offset += SUMMARY_SIZE
+
+    extension_offset = 0
+    extension = b""
+    if magic == BIGBED_MAGIC:
+        extension_offset = offset
+        extension = struct.pack("<HHQ", EXTENSION_HEADER_SIZE, 0, 0).ljust(
+            EXTENSION_HEADER_SIZE, b"\0"
+        )
+        offset += len(extension)
+
+    chrom_tree_offset = offset
+    chrom_tree = chrom_tree_bytes(chroms, chrom_tree_offset)
+    offset += len(chrom_tree)
+
+    # Room for a block of data or of summaries, uncompressed
+    uncompress_buf_size = items_per_slot * ZOOM_RECORD_SIZE
+
+    def write_blocks(count, blocks, offset):
+        """
+        Compresses blocks, and returns their bytes (after the count of items),
+        along with the bytes of their R tree
+        """
+        nonlocal uncompress_buf_size
+        chunks = [count]
+        index_items = []
+        offset += len(count)
+        for *bounds, raw in blocks:
+            uncompress_buf_size = max(uncompress_buf_size, len(raw))
+            compressed = zlib.compress(raw)
+            index_items.append((*bounds, offset, len(compressed)))
+            chunks.append(compressed)
+            offset += len(compressed)
+        return b"".join(chunks), index_items, offset
+
+    data_offset = offset
+    data, index_items, offset = write_blocks(
+        struct.pack("<Q", data_count), data_blocks, offset
+    )
+    index_offset = offset
+    index = r_tree_bytes(
+        index_items, index_offset, index_offset, 1, len(index_items)
+    )
+    offset += len(index)
+
+    levels = zoom_levels(
+        data_items, runs, index_offset - data_offset, chrom_sizes_by_id
+    )
+    total_summary = Summary(window=False)
+    for _, start, end, value in runs:
+        total_summary.add(value, end - start)
+
+    zoom_headers = []
+    zoom_chunks = []
+    for reduction, summaries in levels:
+        # Unlike blocks of data, blocks of summaries may span chromosomes
+        zoom_blocks = (
+            (
+                block[0].chrom_id,
+                block[0].start,
+                block[-1].chrom_id,
+                block[-1].end,
+                b"".join(summary.zoom_record_bytes() for summary in block),
+            )
+            for block in blocks_of(summaries, items_per_slot, lambda _: 0)
+        )
+        zoom_data_offset = offset
+        zoom_data, zoom_index_items, offset = write_blocks(
+            struct.pack("<I", len(summaries)), zoom_blocks, offset
+        )
+        zoom_index = r_tree_bytes(
+            zoom_index_items, offset, offset, items_per_slot, len(summaries)
+        )
+        zoom_headers.append(
+            struct.pack("<IIQQ", reduction, 0, zoom_data_offset, offset)
+        )
+        offset += len(zoom_index)
+        zoom_chunks += [zoom_data, zoom_index]
+
+    header = struct.pack(
+        "<IHHQQQHHQQIQ",
+        magic,
+        BBI_VERSION,
+        len(levels),
+        chrom_tree_offset,
+        data_offset,
+        index_offset,
+        field_count,
+        defined_field_count,
+        auto_sql_offset,
+        total_summary_offset,
+        uncompress_buf_size,
+        extension_offset,
+    )
+    with open(file_path, "wb") as handle:
+        handle.write(header)
+        handle.write(
+            b"".join(zoom_headers).ljust(
+                ZOOM_HEADER_SIZE * MAX_ZOOM_LEVELS, b"\0"
+            )
+        )
+        handle.write(auto_sql_bytes)
+        handle.write(total_summary.total_summary_bytes())
+        handle.write(extension)
+        handle.write(chrom_tree)
+        handle.write(data)
+        handle.write(index)
+        handle.writelines(zoom_chunks)
+        handle.write(struct.pack("<I", magic))
+
+
+def auto_sql_field_count(auto_sql):
+    """
+    Returns the number of fields an AutoSql description describes, as the
+    number of declarations (such as 'uint chromStart; "Start"') between its
+    brackets.
+
+    :param auto_sql: the AutoSql description
+
+    """
+    body = auto_sql[auto_sql.index("(") + 1 : auto_sql.rindex(")")]
+    return sum(";" in line.split('"')[0] for line in body.splitlines())
+
+
+def write_bigbed(
+    file_path,
+    bed_rows,
+    chrom_sizes,
+    auto_sql,
+    defined_field_count=9,
+):
+    """
+    Writes a bigBed file out of the rows of a BED file, as bedToBigBed would
+    out of the BED file.
+
+    :param file_path: path to the file to write
+    :param bed_rows: an iterable of (chrom, start, end, fields) rows, where
+        fields is a list of the other fields of the row (as strings), as many
+        as the AutoSql describes.
+    :param chrom_sizes: a dictionary mapping chromosome names to sizes (see
+        read_chrom_sizes())
+    :param auto_sql: the AutoSql description of the fields of the rows (see
+        prepare_auto_sql() in populate_trackhub.py)
+    :param defined_field_count: the number of standard BED fields of the
+        rows (e.g. 9 for the bed9+ rows of populate_binding_sites())
+        (Default value = 9)
+
+    """
+    bed_rows = list(bed_rows)
+    field_count = auto_sql_field_count(auto_sql)
+    for chrom, start, end, fields in bed_rows:
+        if 3 + len(fields) != field_count:
+            raise ValueError(
+                f"{chrom}:{start}-{end} has {3 + len(fields)} fields, but the"
+                f" AutoSql describes {field_count}"
+            )
+
+    chroms, chrom_id_of = chrom_ids(
+        {chrom for chrom, _, _, _ in bed_rows}, chrom_sizes
+    )
+    items = sorted(
+        (
+            (chrom_id_of[chrom], int(start), int(end), "\t".join(fields))
+            for chrom, start, end, fields in bed_rows
+        ),
+        key=lambda item: item[:2],
+    )
+    for chrom_id, start, end, _ in items:
+        if not 0 <= start <= end <= chroms[chrom_id][1]:
+            raise ValueError(
+                f"{chroms[chrom_id][0]}:{start}-{end} does not fit on the"
+                " chromosome"
+            )
+
+    data_blocks = [
+        (
+            block[0][0],
+            block[0][1],
+            block[0][0],
+            max(end for _, _, end, _ in block),
+            b"".join(
+                struct.pack("<III", chrom_id, start, end)
+                + rest.encode()
+                + b"\0"
+                for chrom_id, start, end, rest in block
+            ),
+        )
+        for block in blocks_of(items, BED_ITEMS_PER_SLOT)
+    ]
+
+    runs = []
+    for chrom_id, _ in enumerate(chroms):
+        runs += [
+            (chrom_id, start, end, depth)
+            for start, end, depth in coverage_runs(
+                (start, end)
+                for item_chrom_id, start, end, _ in items
+                if item_chrom_id == chrom_id
+            )
+        ]
+    write_bbi(
+        file_path,
+        BIGBED_MAGIC,
+        chroms,
+        items,
+        data_blocks,
+        BED_ITEMS_PER_SLOT,
+        runs,
+        auto_sql=auto_sql,
+        field_count=field_count,
+        defined_field_count=defined_field_count,
+    )
+
+
+def write_bigwig(file_path, runs, chrom_sizes):
+    """
+    Writes a bigWig file out of runs of bases of the same value, as
+    bedGraphToBigWig would out of the same runs given as a bedGraph file.
+    Values are stored as single precision floats.
+
+    :param file_path: path to the file to write
+    :param runs: an iterable of (chrom, start, end, value) runs of bases,
+        which must not overlap
+    :param chrom_sizes: a dictionary mapping chromosome names to sizes (see
+        read_chrom_sizes())
+
+    """
+    runs = list(runs)
+    chroms, chrom_id_of = chrom_ids(
+        {chrom for chrom, _, _, _ in runs}, chrom_sizes
+    )
+    items = sorted(
+        (chrom_id_of[chrom], int(start), int(end), single_precision(value))
+        for chrom, start, end, value in runs
+    )
+    for (chrom_id, start, end, _), next_item in zip(items, items[1:] + [None]):
+        if not 0 <= start < end <= chroms[chrom_id][1]:
+            raise ValueError(
+                f"{chroms[chrom_id][0]}:{start}-{end} does not fit on the"
+                " chromosome"
+            )
+        if next_item is not None and next_item[:2] < (chrom_id, end):
+            raise ValueError("Runs of a bigWig file must not overlap")
+
+    data_blocks = [
+        (
+            block[0][0],
+            block[0][1],
+            block[0][0],
+            block[-1][2],
+            struct.pack(
+                "<IIIIIBBH",
+                block[0][0],
+                block[0][1],
+                block[-1][2],
+                0,
+                0,
+                BEDGRAPH_SECTION,
+                0,
+                len(block),
+            )
+            + b"".join(
+                struct.pack("<IIf", start, end, value)
+                for _, start, end, value in block
+            ),
+        )
+        for block in blocks_of(items, WIG_ITEMS_PER_SLOT)
+    ]
+
+    write_bbi(
+        file_path,
+        BIGWIG_MAGIC,
+        chroms,
+        items,
+        data_blocks,
+        WIG_ITEMS_PER_SLOT,
+        items,
+        data_count=len(data_blocks),
+    )
@@ -11,15 +11,40 @@ an RBP molecule, within a Storage.
 """
 
 import difflib  # Just to suggest keys when mis-spelt!
+import heapq
+import io
 from operator import itemgetter
 
+import numpy as np
+
 from .binding_analysis_binding_sites import BindingSites
+from .interval_index import IntervalIndex
+from .proximity_matrix import (
+    GapTable,
+    f_measure_pairs,
+    sparse_f_measures,
+    to_nested_dict,
+)
+from .window_join import relation, window_join
 
 firstItem = itemgetter(0)
 secondItem = itemgetter(1)
 thirdItem = itemgetter(2)
 
 
+def same_name(rbp):
+    """
+    The synonym function of a Storage instance by default, which keeps gene
+    names as they are. Defined here rather than as a lambda so that Storage
+    instances can be pickled (e.g. to write output files on worker processes,
+    see output_scheduler.py).
+
+    :param rbp: the name of an RBP
+
+    """
+    return rbp
+
+
 # To-do:
 # Consider the need for synonym_function as an initialization parameter, and
 # think about membership of genes when genes are represented as comma separated
@@ -47,7 +72,9 @@ class Storage:
     BindingSites values)
     """
 
-    def __init__(self, synonym_func=-1, annotation_merge_func=-1):
+    def __init__(
+        self, synonym_func=-1, annotation_merge_func=-1, annotation_table=None
+    ):
 
         # Stores RBP names as keys and Binding Sites as values
         self._rbps = {}
@@ -68,15 +95,50 @@ class Storage:
         # When the analysis was done, what was the base pair stringency used?
         self.corr_bp_threshold = -1
 
+        # Gaps between the binding sites of every pair of RBPs (a GapTable).
+        # Correlations for any base pair stringency are derived from it, so it
+        # is only computed once. The version of the BindingSites of each RBP
+        # in it is kept too, so that the rows of RBPs whose sites changed in
+        # place are brought up to date (see corr_refresh()).
+        self.gap_table = None
+        self.gap_table_versions = {}
+
+        # The correlations computed so far as dense matrices, keyed by base
+        # pair stringency. Each value is a tuple (f_scores, directed), indexed
+        # by the RBPs in self.gap_table. Both the gap table and these matrices
+        # are kept up to date as RBPs are added, replaced or removed.
+        self.corr_matrices = {}
+
+        # An IntervalIndex over the binding sites of all RBPs, labelled with
+        # the position of their RBP in self.site_index_rbps. Built when first
+        # needed (see site_index_query()), and dropped when RBPs change. The
+        # versions of the BindingSites indexed are kept too, so that sites
+        # changed in place are noticed.
+        self.site_index = None
+        self.site_index_rbps = None
+        self.site_index_versions = None
+
+        # The binding sites of all RBPs together (see sum_over_all()), whose
+        # depth of coverage is used for the density of binding. Built when
+        # first needed (see get_summed_sites()), and dropped when RBPs change.
+        # The versions of the BindingSites summed are kept too, so that sites
+        # changed in place are noticed.
+        self.summed_sites = None
+        self.summed_sites_versions = None
+
         # A function that defines how binding site annotations are merged.
         self.merge = annotation_merge_func
 
+        # If binding sites are annotated with ids of rows in an
+        # AnnotationTable (as done by load_data), this is the table.
+        self.annotation_table = annotation_table
+
         # An init argument, synonym_dict, is an optional argument that should be
         # a function mapping gene synonyms to the official symbol, in case
         # multiple data sources have the same gene referred to using different
         # symbols.
         if synonym_func == -1:
-            self.synonym_func = lambda x: x
+            self.synonym_func = same_name
         else:
             self.synonym_func = synonym_func
 
@@ -152,7 +214,7 @@ class Storage:
         try:
             # treat item as a list of rbps and get the subset-slice out to
             # the caller
-            subset_sites = Storage()
+            subset_sites = Storage(annotation_table=self.annotation_table)
             for rbp in item:
                 subset_sites[rbp] = self[rbp]
             return subset_sites
@@ -169,6 +231,80 @@ class Storage:
         In case new data is added, it's a good idea to reset correlation data
         """
         self.corr_table_f_measure = -1
+        self.gap_table = None
+        self.gap_table_versions = {}
+        self.corr_matrices = {}
+        self.site_index = None
+        self.summed_sites = None
+
+    def corr_refresh(self):
+        """
+        Brings the correlation data stored internally up to date with the
+        binding sites of RBPs that were changed in place (e.g. using
+        BindingSites.add()) since it was computed, as corr_update() does for
+        each of them.
+        """
+        if self.gap_table is None:
+            return
+        for rbp, binding_sites in list(self._rbps.items()):
+            if self.gap_table_versions.get(rbp) != binding_sites.version:
+                self.corr_update(rbp)
+
+    def corr_update(self, rbp):
+        """
+        Brings the correlation data stored internally up to date after the
+        binding sites of one RBP were added, replaced or removed. Only the
+        correlations involving that RBP are recomputed.
+
+        :param rbp: the (upper case) name of the RBP that changed
+
+        """
+        # The legacy nested dictionary is cheap to rebuild from the matrices
+        self.corr_table_f_measure = -1
+        self.site_index = None
+        self.summed_sites = None
+
+        if self.gap_table is None:
+            return
+
+        if rbp in self._rbps and self._rbps[rbp].overlap_mode:
+            # Correlations are not defined in overlap mode
+            self.corr_reset()
+            return
+
+        if rbp in self._rbps:
+            k = self.gap_table.update(rbp, self._rbps[rbp])
+            self.gap_table_versions[rbp] = self._rbps[rbp].version
+        elif rbp in self.gap_table:
+            k = self.gap_table.remove(rbp)
+            del self.gap_table_versions[rbp]
+            for bp_threshold, matrices in self.corr_matrices.items():
+                self.corr_matrices[bp_threshold] = tuple(
+                    np.delete(np.delete(matrix, k, axis=0), k, axis=1)
+                    for matrix in matrices
+                )
+            return
+        else:
+            return
+
+        for bp_threshold, (f_scores, directed) in self.corr_matrices.items():
+            if k == len(directed):
+                # A new RBP; make room for its row and column
+                f_scores = np.pad(f_scores, ((0, 1), (0, 1)))
+                directed = np.pad(directed, ((0, 1), (0, 1)))
+            else:
+                # Matrices handed out before should not change under the
+                # caller's feet
+                f_scores = f_scores.copy()
+                directed = directed.copy()
+
+            directed[k, :] = self.gap_table.directed_row(k, bp_threshold)
+            directed[:, k] = self.gap_table.directed_column(k, bp_threshold)
+            f_scores_k = f_measure_pairs(directed[k, :], directed[:, k])
+            f_scores[k, :] = f_scores_k
+            f_scores[:, k] = f_scores_k
+
+            self.corr_matrices[bp_threshold] = f_scores, directed
 
     def __setitem__(self, item, value):
         # Discourage this use mostly, but if the types are right why not
@@ -177,11 +313,17 @@ class Storage:
             item = item.upper()
             item = item.strip()
             self._rbps[item] = value
-            self.corr_reset()
+            self.corr_update(item)
 
         else:
             raise ValueError("Assign gene names to BindingSites please")
 
+    def __delitem__(self, item):
+        item = item.upper()
+        item = item.strip()
+        del self._rbps[item]
+        self.corr_update(item)
+
     def summary(self):
         """
         Allows user to inspect the Storage instance.
@@ -197,10 +339,97 @@ class Storage:
 
         return len(self._rbps), sum([k for (a, k) in summary_info])
 
+    def gap_analysis(self, progress_feedback=False, jobs=1):
+        """
+        Returns a GapTable holding the gaps between the binding sites of every
+        pair of RBPs stored. The table is computed the first time this is
+        called, and the rows of RBPs whose binding sites changed since are
+        brought up to date.
+
+        :param progress_feedback: specifies whether the progress of analysis is
+                                  printed continuously as the gaps are
+                                  calculated
+                                  (Default value = False)
+        :param jobs: number of worker processes over which the gaps are
+                     computed, in tiles of pairs of RBPs (Default value = 1)
+
+        """
+        if self.gap_table is None:
+            self.gap_table = GapTable(
+                self, progress_feedback=progress_feedback, jobs=jobs
+            )
+            self.gap_table_versions = {
+                rbp: binding_sites.version
+                for rbp, binding_sites in self._rbps.items()
+            }
+        else:
+            self.corr_refresh()
+        return self.gap_table
+
+    def self_analysis_matrix(
+        self,
+        bp_threshold=30,
+        progress_feedback=True,
+        jobs=1,
+    ):
+        """
+        Computes the pairwise binding correlation (f-measure) between all the
+        RBPs stored, as a dense matrix.
+
+        :param bp_threshold: number of bases beyond which two RBPs are
+                             considered too far from each other (in terms of
+                             location of their binding sites)
+                             (Default value = 30)
+        :param progress_feedback: specifies whether the progress of analysis is
+                                  printed continuously as the correlations are
+                                  calculated
+                                  (Default value = True)
+        :param jobs: number of worker processes over which the gaps between
+                     binding sites are computed (Default value = 1)
+        :returns: a tuple (matrix, rbps) where matrix[i][j] is the correlation
+                  between rbps[i] and rbps[j].
+
+        """
+        self.self_analysis_thresholds_matrices(
+            [bp_threshold], progress_feedback=progress_feedback, jobs=jobs
+        )
+        f_scores, _ = self.corr_matrices[bp_threshold]
+        return f_scores, list(self.gap_table.rbps)
+
+    def self_analysis_thresholds_matrices(
+        self,
+        bp_thresholds,
+        progress_feedback=True,
+        jobs=1,
+    ):
+        """
+        Makes sure correlation matrices for each of the given base pair
+        stringencies are computed and stored in self.corr_matrices. Matrices
+        computed before are reused.
+
+        :param bp_thresholds: an iterable of base pair thresholds (see the
+                              bp_threshold argument of self_analysis())
+        :param progress_feedback: specifies whether the progress of analysis is
+                                  printed continuously as the correlations are
+                                  calculated
+                                  (Default value = True)
+        :param jobs: number of worker processes over which the gaps between
+                     binding sites are computed (Default value = 1)
+        :returns: self.corr_matrices
+
+        """
+        gap_table = self.gap_analysis(
+            progress_feedback=progress_feedback, jobs=jobs
+        )
+        missing = [t for t in bp_thresholds if t not in self.corr_matrices]
+        self.corr_matrices.update(gap_table.f_measure_matrices(missing))
+        return self.corr_matrices
+
     def self_analysis(
         self,
         bp_threshold=30,
         progress_feedback=True,
+        jobs=1,
     ):
         """
         In case you are looking for fun and want to do a correlation study
@@ -208,76 +437,88 @@ class Storage:
 
         Especially useful if you have real binding data in my opinion.
 
+        The correlations are returned as a nested dictionary, such that
+        table[rbp1][rbp2] is the correlation between rbp1 and rbp2. See
+        self_analysis_matrix() for the same result as a dense matrix.
+
         :param bp_threshold: number of bases beyond which two RBPs are
                              considered too far from each other (in terms of
                              location of their binding sites)
                              (Default value = 30)
-        :param display_threshold: Threshold correlation value below which the
-                                  pairwise RBP correlations are not shown.
-                                  (Default value = 0.8)
         :param progress_feedback: specifies whether the progress of analysis is
                                   printed continuously as the correlations are
                                   calculated
                                   (Default value = True)
+        :param jobs: number of worker processes over which the gaps between
+                     binding sites are computed (Default value = 1)
 
         """
 
+        self.corr_refresh()
         # If analysis hasn't happened yet or different stringency is being used:
         if (
             self.corr_table_f_measure == -1
             or self.corr_bp_threshold != bp_threshold
         ):
-            corr_table = {}  # Stores the correlation table (nested dictionary)
-            prev_num = 0
-            num_j = 0
-            for num_i, i in enumerate(self._rbps):
-                for num_j, j in enumerate(self._rbps):
-                    if i not in corr_table:
-                        corr_table[i] = {}
-                    corr_table[i][j] = self._rbps[i].dist(
-                        self._rbps[j], bp_threshold
-                    )
-
-                # Progress should be printed since this can take some time
-                percentage = (
-                    (num_i * len(self._rbps) + num_j)
-                    / len(self._rbps) ** 2
-                    / 0.01
-                )
-                if progress_feedback:
-                    if (
-                        round(percentage) % 20 == 0
-                        and round(percentage) != prev_num
-                    ):
-                        print(round(percentage), "%" + "complete")
-                        prev_num = percentage
-
-            # Stores the same scores as corr_table above but f-scores instead
-            corr_table_f_score = {}
-
-            tuple_list = []  # Keeps it in a tuple form for easy sorting
-            for num_i, i in enumerate(self._rbps):
-                for num_j, j in enumerate(self._rbps):
-                    score_1 = corr_table[i][j]
-                    score_2 = corr_table[j][i]
-
-                    if i not in corr_table_f_score:
-                        corr_table_f_score[i] = {}
-
-                    if score_1 == 0 and score_2 == 0:
-                        corr_table_f_score[i][j] = 0
-                    else:
-                        corr_table_f_score[i][j] = (
-                            2 * score_1 * score_2 / (score_1 + score_2)
-                        )
-
-                    tuple_list.append((i, j, corr_table_f_score[i][j]))
-
-            self.corr_table_f_measure = corr_table_f_score
+            self.corr_table_f_measure = self.self_analysis_thresholds(
+                [bp_threshold], progress_feedback=progress_feedback, jobs=jobs
+            )[bp_threshold]
             self.corr_bp_threshold = bp_threshold
 
         return self.corr_table_f_measure
 
+    def self_analysis_thresholds(
+        self,
+        bp_thresholds,
+        progress_feedback=True,
+        jobs=1,
+    ):
+        """
+        Same as self_analysis(), but for a number of base pair stringencies at
+        once. The gaps between binding sites are only computed once, so this
+        is much quicker than calling self_analysis() for each stringency.
+
+        :param bp_thresholds: an iterable of base pair thresholds (see the
+                              bp_threshold argument of self_analysis())
+        :param progress_feedback: specifies whether the progress of analysis is
+                                  printed continuously as the correlations are
+                                  calculated
+                                  (Default value = True)
+        :param jobs: number of worker processes over which the gaps between
+                     binding sites are computed (Default value = 1)
+        :returns: a dictionary mapping each threshold to a nested dictionary
+                  of correlations, as returned by self_analysis()
+
+        """
+        corr_matrices = self.self_analysis_thresholds_matrices(
+            bp_thresholds, progress_feedback=progress_feedback, jobs=jobs
+        )
+
+        corr_tables = {}
+        for bp_threshold in bp_thresholds:
+            f_scores, directed = corr_matrices[bp_threshold]
+            corr_tables[bp_threshold] = to_nested_dict(
+                f_scores, self.gap_table.rbps, directed=directed
+            )
+        return corr_tables
+
+    def self_analysis_sparse(self, bp_thresholds):
+        """
+        Same as self_analysis_thresholds(), except that only pairs of RBPs
+        that bind close to each other (and thus have a non-zero correlation)
+        are evaluated and returned. Useful for long transcripts with many
+        RBPs, as the work done grows with the number of RBPs binding close
+        together rather than with the square of the number of RBPs.
+
+        :param bp_thresholds: an iterable of base pair thresholds (see the
+                              bp_threshold argument of self_analysis())
+        :returns: a dictionary mapping each threshold to a list of
+                  (rbp1, rbp2, correlation) tuples, one per pair of distinct
+                  RBPs with a non-zero correlation
+
+        """
+        return sparse_f_measures(self, bp_thresholds)
+
     def binds_near(self, interval_range, bp_threshold=30):
         """
         This function takes a tuple representing an interval that one wants
@@ -288,15 +529,121 @@ class Storage:
         :param bp_threshold:  (Default value = 30)
 
         """
+        rbp_ids, _ = self.site_index_query(interval_range, bp_threshold)
+        return [self.site_index_rbps[i] for i in sorted(set(rbp_ids))]
+
+    def site_index_query(self, interval_range, bp_threshold=0):
+        """
+        Finds the binding sites, of any RBP stored, that overlap an interval
+        (with some leeway, if needed). A position-sorted index of all the
+        sites is built the first time this is called, so that each query takes
+        O(log N + k) time for N sites stored and k sites found.
+
+        :param interval_range: in the form (start, end) or (start, end, _)
+        :param bp_threshold: number of bases away sites are allowed to be from
+                             the interval_range to be found
+                             (Default value = 0)
+        :returns: a tuple (rbp_ids, sites) of two lists, where sites[i] is a
+                  site of the RBP self.site_index_rbps[rbp_ids[i]]. Sites are
+                  in order of their start coordinates.
+
+        """
+        site_index = self.get_site_index()
         start, end, *_ = interval_range
-        extended_range = (start - bp_threshold, end + bp_threshold)
+        positions = site_index.overlap(
+            start - bp_threshold, end + bp_threshold
+        )
+        return (
+            [site_index.labels[i] for i in positions],
+            [site_index.intervals[i] for i in positions],
+        )
 
-        to_return = []
+    def get_site_index(self):
+        """
+        Returns an IntervalIndex over the binding sites of all RBPs stored,
+        labelled with the position of their RBP in self.site_index_rbps. The
+        index is built the first time this is called, and kept until RBPs are
+        added, replaced or removed or their sites change.
+        """
+        versions = [binding_sites.version for binding_sites in self.values()]
+        if self.site_index is None or self.site_index_versions != versions:
+            self.site_index_rbps = list(self._rbps)
+            sites = []
+            rbp_ids = []
+            for rbp_id, binding_sites in enumerate(self._rbps.values()):
+                if binding_sites.overlap_mode:
+                    raise ValueError(
+                        "The site index is not supported for BindingSites"
+                        " with overlap_mode set to True"
+                    )
+                sites.extend(binding_sites)
+                rbp_ids.extend([rbp_id] * len(binding_sites))
+            self.site_index = IntervalIndex(sites, rbp_ids)
+            self.site_index_versions = versions
 
-        for rbp, sites in self._rbps.items():
-            if sites.is_overlap(extended_range):
-                to_return.append(rbp)
+        return self.site_index
 
+    def window_join(self, gene, bp_threshold=0):
+        """
+        Finds, in one sweep, the binding sites of all RBPs that lie within a
+        number of bases of each binding site of an input gene (RBP).
+
+        :param gene: input gene (RBP) of interest
+        :param bp_threshold: number of bases away sites are allowed to be from
+                             a site of the gene
+                             (Default value = 0)
+        :returns: a list of (gene_site, rbp, site, distance) tuples, one for
+                  each site of an RBP (the gene included) that is close to a
+                  site of the gene. Tuples are sorted by gene site, then by
+                  site.
+
+        """
+        gene = self._lookup(gene)
+        gene_sites = list(self[gene])
+        site_index = self.get_site_index()
+        return [
+            (
+                gene_sites[i],
+                self.site_index_rbps[site_index.labels[j]],
+                site_index.intervals[j],
+                distance,
+            )
+            for i, j, distance in window_join(
+                gene_sites, site_index.intervals, bp_threshold=bp_threshold
+            )
+        ]
+
+    def site_relations(
+        self, gene, competitive_threshold_bp, cooperative_threshold_bp
+    ):
+        """
+        Classifies the binding sites stored as competitive or cooperative
+        with respect to the binding sites of an input gene (RBP), based on
+        their distance to the closest binding site of the gene. See
+        window_join.relation().
+
+        :param gene: input gene (RBP) of interest
+        :param competitive_threshold_bp: number of bases below which sites
+                                         compete
+        :param cooperative_threshold_bp: number of bases below which sites
+                                         cooperate
+        :returns: a dictionary mapping sites to COMPETITIVE or COOPERATIVE.
+                  Sites that are independent of the gene are left out.
+
+        """
+        closest = {}
+        for _, _, site, distance in self.window_join(
+            gene, bp_threshold=cooperative_threshold_bp
+        ):
+            closest[site] = min(distance, closest.get(site, distance))
+
+        to_return = {}
+        for site, distance in closest.items():
+            site_relation = relation(
+                distance, competitive_threshold_bp, cooperative_threshold_bp
+            )
+            if site_relation is not None:
+                to_return[site] = site_relation
         return to_return
 
     def filter(self, filter_func):
@@ -309,7 +656,7 @@ class Storage:
                             for keeping or discarding.
 
         """
-        to_return = Storage()
+        to_return = Storage(annotation_table=self.annotation_table)
         for rbp, sites in self._rbps.items():
             if filter_func(rbp):
                 to_return[rbp] = sites
@@ -344,6 +691,39 @@ class Storage:
             site3: Storage( ... all sites close to site 3 by any RBP ... )
         }
 
+        """
+        gene = self._lookup(gene)
+
+        gene_sites = list(self[gene])
+
+        # rbp keys mapping to nearby sites, for each site of the gene
+        sites_by_rbp = [{} for _ in gene_sites]
+
+        site_index = self.get_site_index()
+        for i, j, _ in window_join(
+            gene_sites, site_index.intervals, bp_threshold=bp_threshold
+        ):
+            sites_by_rbp[i].setdefault(site_index.labels[j], []).append(
+                site_index.intervals[j]
+            )
+
+        to_return_dict = {}
+        for gene_site, rbp_sites in zip(gene_sites, sites_by_rbp):
+            nearby_storage = Storage(annotation_table=self.annotation_table)
+            for rbp_id in sorted(rbp_sites):
+                rbp = self.site_index_rbps[rbp_id]
+                nearby_storage[rbp] = BindingSites(rbp_sites[rbp_id])
+            to_return_dict[gene_site] = nearby_storage
+
+        return to_return_dict
+
+    def _lookup(self, gene):
+        """
+        Returns the name under which an input gene (RBP) is stored, trying
+        synonyms of the gene if needed.
+
+        :param gene: input gene (RBP) of interest
+
         """
         gene = gene.upper()
         # sanity check
@@ -351,15 +731,7 @@ class Storage:
             gene = self.synonym_func(gene)
             if gene not in self._rbps:
                 raise KeyError("RBP not found in Storage")
-
-        to_return_dict = {}  # rbp keys mapping to nearest site and distance
-
-        for site in self[gene]:
-            to_return_dict[site] = self.all_sites_in(
-                site, bp_threshold=bp_threshold
-            )
-
-        return to_return_dict
+        return gene
 
     def print(self):
         """
@@ -378,13 +750,19 @@ class Storage:
                              (Default value = 0)
 
         """
-        filtered_storage = Storage()
-        for rbp, binding_sites in self._rbps.items():
-            filtered_rbp = binding_sites.filter_overlap(
-                interval_range, bp_threshold=bp_threshold
+        rbp_ids, sites = self.site_index_query(
+            interval_range, bp_threshold=bp_threshold
+        )
+
+        sites_by_rbp = {}
+        for rbp_id, site in zip(rbp_ids, sites):
+            sites_by_rbp.setdefault(rbp_id, []).append(site)
+
+        filtered_storage = Storage(annotation_table=self.annotation_table)
+        for rbp_id in sorted(sites_by_rbp):
+            filtered_storage[self.site_index_rbps[rbp_id]] = BindingSites(
+                sites_by_rbp[rbp_id]
             )
-            if len(filtered_rbp) > 0:
-                filtered_storage[rbp] = filtered_rbp
         return filtered_storage
 
     def print_bed(
@@ -405,9 +783,55 @@ class Storage:
         annotation_to_additional_columns=None,
     ):
         """
-        Prints the BED files representing the binding sites of all RBPs
-        contained within the Storage instance (RNA molecule).
+        Returns the BED files representing the binding sites of all RBPs
+        contained within the Storage instance (RNA molecule). See write_bed()
+        for the parameters, which writes the same lines to a file instead.
 
+        """
+        bed_file = io.StringIO()
+        self.write_bed(
+            bed_file,
+            chr_n=chr_n,
+            displacement=displacement,
+            end_inclusion=end_inclusion,
+            antisense=antisense,
+            add_annotation=add_annotation,
+            include_score=include_score,
+            score_max=score_max,
+            score_base=score_base,
+            include_color=include_color,
+            conditional_color_func=conditional_color_func,
+            include_header=include_header,
+            is_bar=is_bar,
+            is_additional_columns=is_additional_columns,
+            annotation_to_additional_columns=annotation_to_additional_columns,
+        )
+        return bed_file.getvalue()
+
+    def write_bed(
+        self,
+        bed_file,
+        chr_n=1,
+        displacement=0,
+        end_inclusion=False,
+        antisense=False,
+        add_annotation=False,
+        include_score=False,
+        score_max=1000,
+        score_base=1000,
+        include_color=False,
+        conditional_color_func=-1,
+        include_header=False,
+        is_bar=False,
+        is_additional_columns=False,
+        annotation_to_additional_columns=None,
+    ):
+        """
+        Writes the BED files representing the binding sites of all RBPs
+        contained within the Storage instance (RNA molecule) to an open file,
+        one RBP after the other (see BindingSites.write_bed()).
+
+        :param bed_file: the file to write to
         :param chrN: the chromosome number on which the RNA is on the genome.
                      (Default value = 1)
         :param displacement: the starting base number for the RNA on the
@@ -442,9 +866,27 @@ class Storage:
         :param annotation_to_additional_columns: no idea (Default value = None)
 
         """
-        output_str = ""
+        rbps = list(self.get_rbps())
+        num_rbps = min(len(rbps), 3)
+        rbps = rbps[:num_rbps]
+
+        if include_header:
+            header = (
+                'track name="'
+                + "-".join(rbps)
+                + '" description="A list of binding sites of various RBPs,'
+                + " including "
+                + ",".join(rbps)
+                + '"'
+                + (' itemRgb="On"' if include_color else "")
+                + (' useScore="1"' if include_score else "")
+                + "\n"
+            )
+            bed_file.write(header)
+
         for rbp, binding_sites in self._rbps.items():
-            output_str += binding_sites.print_bed(
+            binding_sites.write_bed(
+                bed_file,
                 name=rbp,
                 chr_n=chr_n,
                 displacement=displacement,
@@ -461,25 +903,46 @@ class Storage:
                 annotation_to_additional_columns=annotation_to_additional_columns,
             )
 
-        rbps = list(self.get_rbps())
-        num_rbps = min(len(rbps), 3)
-        rbps = rbps[:num_rbps]
+    def bed_rows(
+        self,
+        chr_n=1,
+        displacement=0,
+        end_inclusion=False,
+        antisense=False,
+        add_annotation=False,
+        include_score=False,
+        score_max=1000,
+        score_base=1000,
+        include_color=False,
+        conditional_color_func=-1,
+        is_bar=False,
+        is_additional_columns=False,
+        annotation_to_additional_columns=None,
+    ):
+        """
+        Yields the binding sites of all RBPs contained within the Storage
+        instance as the rows of a BED file, one RBP after the other, named by
+        their RBP (see BindingSites.bed_rows() and write_bed() for the
+        parameters).
 
-        if include_header:
-            header = (
-                'track name="'
-                + "-".join(rbps)
-                + '" description="A list of binding sites of various RBPs,'
-                + " including "
-                + ",".join(rbps)
-                + '"'
-                + (' itemRgb="On"' if include_color else "")
-                + (' useScore="1"' if include_score else "")
-                + "\n"
+        """
+        for rbp, binding_sites in self._rbps.items():
+            yield from binding_sites.bed_rows(
+                name=rbp,
+                chr_n=chr_n,
+                displacement=displacement,
+                end_inclusion=end_inclusion,
+                antisense=antisense,
+                add_annotation=add_annotation,
+                include_score=include_score,
+                score_max=score_max,
+                score_base=score_base,
+                include_color=include_color,
+                conditional_color_func=conditional_color_func,
+                is_bar=is_bar,
+                is_additional_columns=is_additional_columns,
+                annotation_to_additional_columns=annotation_to_additional_columns,
             )
-        else:
-            header = ""
-        return header + output_str
 
     def sum_over_all(self):
         """
@@ -487,20 +950,46 @@ class Storage:
         sites across all RBPs stored in the current storage. Overlap mode is set
         to True for the returned binding site object.
 
+        Each site is annotated with (rbp_id, annotation), where rbp_id is the
+        position of its RBP in self.get_rbps() and annotation is the annotation
+        it has in its own RBP. As the sites of every RBP are already sorted,
+        they are merged in order rather than added one by one.
         """
 
-        new_binding_site = BindingSites(overlap_mode=True)
-        for rbp in self:
-            for site in self[rbp]:
-                # print(site)
-                start, end, annotation = site
-                if annotation:
-                    annotation += rbp
-                else:
-                    annotation = rbp
-                site = (start, end, annotation)
-                new_binding_site.add(site)
-        return new_binding_site
+        def tagged_sites(rbp_id, binding_sites):
+            for start, end, annotation in binding_sites:
+                yield start, end, (rbp_id, annotation)
+
+        return BindingSites.from_sites(
+            heapq.merge(
+                *(
+                    tagged_sites(rbp_id, binding_sites)
+                    for rbp_id, binding_sites in enumerate(self.values())
+                )
+            ),
+            overlap_mode=True,
+        )
+
+    def get_summed_sites(self):
+        """
+        Returns the binding sites of all RBPs together, as sum_over_all()
+        does. They are only gathered the first time this is called, and kept
+        until RBPs are added, replaced or removed or their sites change, along
+        with their depth of coverage (see BindingSites.get_depth_runs()). The
+        BindingSites instance returned should not be modified.
+        """
+        versions = [binding_sites.version for binding_sites in self.values()]
+        if self.summed_sites is None or self.summed_sites_versions != versions:
+            self.summed_sites = self.sum_over_all()
+            self.summed_sites_versions = versions
+        return self.summed_sites
+
+    def max_depth(self):
+        """
+        Returns the greatest number of binding sites, across all RBPs, that
+        cover any one base of the RNA molecule (0 if there are none).
+        """
+        return self.get_summed_sites().max_depth()
 
     def print_wig(
         self,
@@ -532,7 +1021,53 @@ class Storage:
 
         """
 
-        return self.sum_over_all().print_wig(
+        return self.get_summed_sites().print_wig(
+            chr_no=chr_no,
+            displacement=displacement,
+            include_name=include_name,
+            include_description=include_description,
+            name=name,
+            description=description,
+            include_header=include_header,
+            antisense=antisense,
+            length=length,
+        )
+
+    def write_bedgraph(
+        self,
+        bedgraph_file,
+        chr_no=1,
+        displacement=0,
+        include_name=False,
+        include_description=False,
+        name="",
+        description="",
+        include_header=True,
+        antisense=False,
+        length=-1,
+    ):
+        """
+        Writes a bedGraph file represeting the density of binding by the RBPs
+        on the RNA molecule (Storage) instance to an open file, with one line
+        per run of bases of the same density rather than one per base as in
+        print_wig(). See BindingSites.write_bedgraph().
+
+        :param bedgraph_file: the file to write to
+        :param chr_no: chromosome number on which the RNA molecule lies
+                             (Default value = 1)
+        :param displacement: base number on which the RNA lies on the chromosome
+                             (Default value = 0)
+        :param include_name:  (Default value = False)
+        :param include_description:  (Default value = False)
+        :param name:  (Default value = "")
+        :param description:  (Default value = "")
+        :param include_header:  (Default value = True)
+        :param antisense:  (Default value = False)
+        :param length:  (Default value = -1)
+
+        """
+        self.get_summed_sites().write_bedgraph(
+            bedgraph_file,
             chr_no=chr_no,
             displacement=displacement,
             include_name=include_name,
@@ -543,3 +1078,26 @@ class Storage:
             antisense=antisense,
             length=length,
         )
+
+    def bedgraph_runs(
+        self, chr_no=1, displacement=0, antisense=False, length=-1
+    ):
+        """
+        Returns the density of binding by the RBPs on the RNA molecule
+        (Storage) instance as (chrom, start, end, depth) runs of bases, the
+        rows write_bedgraph() writes. See BindingSites.bedgraph_runs().
+
+        :param chr_no: chromosome number on which the RNA molecule lies
+                             (Default value = 1)
+        :param displacement: base number on which the RNA lies on the chromosome
+                             (Default value = 0)
+        :param antisense:  (Default value = False)
+        :param length:  (Default value = -1)
+
+        """
+        return self.get_summed_sites().bedgraph_runs(
+            chr_no=chr_no,
+            displacement=displacement,
+            antisense=antisense,
+            length=length,
+        )
@@ -12,12 +12,17 @@ could very well be used in other similar scenarios (like proteins interacting
 with DNA).
 """
 
+import heapq
+import io
 from operator import itemgetter
 
 from sortedcontainers import (  # Allow sorted brackets of binding sites
     SortedSet,
 )
 
+from .config import BED_WRITE_BATCH_SIZE
+from .interval_index import IntervalIndex
+
 firstItem = itemgetter(0)
 secondItem = itemgetter(1)
 firstTwoItems = itemgetter(0, 1)
@@ -111,6 +116,15 @@ class BindingSites:
         self.overlap_mode = overlap_mode
         # Just a sorted set underneath
         self.sorted_sites = SortedSet()
+        # An IntervalIndex over the sites, for queries that have to deal with
+        # overlapping sites, and the depth of coverage of the sites as runs of
+        # bases (see get_depth_runs()). Both are built when first needed, and
+        # dropped whenever sites are added or removed.
+        self.site_index = None
+        self.depth_runs = None
+        # Counts the changes made to the sites, so that what others computed
+        # from them (e.g. Storage.get_summed_sites()) can tell it is stale
+        self.version = 0
         for site in list_of_sites:
             self.add(site)
 
@@ -286,6 +300,8 @@ class BindingSites:
                 " start point!"
             )
 
+        self.sites_changed()
+
         if self.overlap_mode:
             self.sorted_sites.add(new_site)
             return
@@ -313,6 +329,39 @@ class BindingSites:
             BindingSites._collapse(to_merge, user_merge_func)
         )
 
+    def add_many(self, new_sites, user_merge_func=None):
+        """
+        Adds several sites at once. In overlap mode, the sites are inserted
+        together in one step, rather than one by one as add() would; this is
+        quickest when the BindingSites instance is empty to begin with.
+
+        :param new_sites: an iterable of sites in the form
+                          (start, end, metadata)
+        :param user_merge_func: see add() (Default value = None)
+
+        """
+        if not self.overlap_mode:
+            for new_site in new_sites:
+                self.add(new_site, user_merge_func)
+            return
+
+        new_sites = list(new_sites)
+        for start, end, _ in new_sites:
+            if not isinstance(start, int) or not isinstance(end, int):
+                raise ValueError("Please make sure start and end are integers")
+            if start > end:
+                raise ValueError(
+                    "Please make sure the interval end point is greater than"
+                    " the start point!"
+                )
+
+        self.sites_changed()
+        if self.sorted_sites:
+            self.sorted_sites.update(new_sites)
+        else:
+            # Sorted in one go
+            self.sorted_sites = SortedSet(new_sites)
+
     def remove(self, site):
         """
         Removes a binding site from an instance of BindingClass.
@@ -324,6 +373,62 @@ class BindingSites:
 
         """
         self.sorted_sites.remove(site)
+        self.sites_changed()
+
+    def sites_changed(self):
+        """
+        Drops what was computed from the sites stored (the site index and the
+        depth runs), as they changed, and counts the change in self.version.
+        """
+        self.site_index = None
+        self.depth_runs = None
+        self.version += 1
+
+    def get_depth_runs(self):
+        """
+        Returns the depth of coverage of the sites stored, as a sorted list of
+        runs (start, end, depth): every base in [start, end) is covered by
+        depth sites. Runs are as long as possible, and bases not covered by any
+        site are left out. The runs are computed the first time this is
+        called, and kept until sites are added or removed.
+        """
+        if self.depth_runs is None:
+            changes = {}
+            for start, end, *_ in self.sorted_sites:
+                if start < end:
+                    changes[start] = changes.get(start, 0) + 1
+                    changes[end] = changes.get(end, 0) - 1
+
+            depth_runs = []
+            depth = 0
+            run_start = None
+            for position in sorted(changes):
+                if changes[position] == 0:
+                    continue
+                if depth > 0:
+                    depth_runs.append((run_start, position, depth))
+                depth += changes[position]
+                run_start = position
+            self.depth_runs = depth_runs
+        return self.depth_runs
+
+    def max_depth(self):
+        """
+        Returns the greatest depth of coverage of any base by the sites stored
+        (0 if there are no sites).
+        """
+        return max((depth for _, _, depth in self.get_depth_runs()), default=0)
+
+    def get_site_index(self):
+        """
+        Returns an IntervalIndex over the sites stored, which answers overlap
+        queries in O(log n + k) time (for n sites stored and k sites found)
+        whether or not the sites overlap one another. The index is built the
+        first time this is called, and kept until sites are added or removed.
+        """
+        if self.site_index is None:
+            self.site_index = IntervalIndex(self.sorted_sites)
+        return self.site_index
 
     def dist(self, sites, bp_threshold=30):
         """Checks for correlation between binding sites of two BindingSites.
@@ -400,14 +505,11 @@ class BindingSites:
 
         """
 
-        if self.overlap_mode:
-            raise ValueError(
-                "isOverlap() is not supported for BindingSites"
-                " with overlap_mode set to True"
-            )
-
         start, end, *_ = query_site
 
+        if self.overlap_mode:
+            return len(self.get_site_index().overlap(start, end)) > 0
+
         # binary search to find where the query range might lie
         start_pos = self.sorted_sites.bisect_left((start, 0))
         end_pos = self.sorted_sites.bisect_left((end, 0))
@@ -498,18 +600,20 @@ class BindingSites:
         :param bp_threshold:  (Default value = 0)
 
         """
-        if self.overlap_mode:
-            raise ValueError(
-                "filterOverlap() is not supported for BindingSites"
-                " with overlap_mode set to True"
-            )
-
         # Returns all the sites which overlap with the input range query_range
         # given
         start, end, *_ = query_range
         start = start - bp_threshold
         end = end + bp_threshold
         query_range = (start, end)
+
+        if self.overlap_mode:
+            site_index = self.get_site_index()
+            positions = site_index.overlap(start, end)
+            return BindingSites(
+                [site_index.intervals[i] for i in positions], overlap_mode=True
+            )
+
         start_pos = self.sorted_sites.bisect_left((start, 0))
         end_pos = self.sorted_sites.bisect_left((end, 0))
 
@@ -524,6 +628,236 @@ class BindingSites:
                 output_binding_sites.add(site)
         return output_binding_sites
 
+    def sites_at(self, position):
+        """
+        Returns a list of the sites that cover a given nucleotide position
+        (a "stabbing" query), in sorted order. Sites are allowed to overlap
+        (i.e. overlap_mode may be on).
+
+        :param position: the (0-based) position of the nucleotide
+
+        """
+        site_index = self.get_site_index()
+        return [
+            site_index.intervals[i]
+            for i in site_index.overlap(position, position + 1)
+        ]
+
+    def depth_at(self, position):
+        """
+        Returns the 'depth' of binding at a given nucleotide position: the
+        number of sites that cover it. This is the same as
+        self.return_depth()[position], without computing the depth of the
+        whole molecule.
+
+        :param position: the (0-based) position of the nucleotide
+
+        """
+        return len(self.get_site_index().overlap(position, position + 1))
+
+    @staticmethod
+    def from_sites(sites, overlap_mode=False):
+        """
+        Wraps sites in a BindingSites instance in one go, without checking
+        each of them for overlaps as add() would. Unless overlap_mode is on,
+        the sites must not overlap each other.
+
+        :param sites: an iterable of sites in the form (start, end, metadata)
+        :param overlap_mode: whether the BindingSites instance is in overlap
+                             mode (Default value = False)
+
+        """
+        binding_sites = BindingSites(overlap_mode=overlap_mode)
+        binding_sites.sorted_sites = SortedSet(sites)
+        return binding_sites
+
+    def _check_set_operation(self, other, operation):
+        """
+        Internal function that makes sure a set operation can run on the
+        sorted representation of self and other.
+
+        :param other: the other BindingSites instance of the operation, if any
+        :param operation: name of the operation, for the error message
+
+        """
+        for binding_sites in (self, other):
+            if binding_sites is not None and binding_sites.overlap_mode:
+                raise ValueError(
+                    f"{operation}() is not supported for BindingSites"
+                    " with overlap_mode set to True"
+                )
+
+    def union(self, other, annotation_merger=None):
+        """
+        Returns a new BindingSites instance with the union of the sites of self
+        and other. Sites that overlap are merged together, as in add(), in one
+        sweep over both sorted sets, i.e. in O(n + m) steps.
+
+        :param other: a BindingSites instance
+        :param annotation_merger: if specified, this function is used to merge
+                                  the annotations of merged sites (otherwise,
+                                  they are simply joined into a tuple)
+                                  (Default value = None)
+
+        """
+        self._check_set_operation(other, "union")
+
+        output_sites = []
+        group = []
+        group_start = group_end = None
+
+        def close_group():
+            if len(group) == 1:
+                output_sites.append(group[0])
+            elif group:
+                output_sites.append(
+                    (
+                        group_start,
+                        group_end,
+                        BindingSites._merge_meta(
+                            list(map(thirdItem, group)), annotation_merger
+                        ),
+                    )
+                )
+
+        for site in heapq.merge(
+            self.sorted_sites, other.sorted_sites, key=firstItem
+        ):
+            start, end, *_ = site
+            if group and start < group_end and group_start < end:
+                group.append(site)
+                group_end = max(group_end, end)
+            elif group and start < group_end:
+                # An empty site at the very start of the group, which it does
+                # not overlap
+                output_sites.append(site)
+            else:
+                close_group()
+                group = [site]
+                group_start, group_end = start, end
+        close_group()
+
+        return BindingSites.from_sites(output_sites)
+
+    def intersect(self, other, annotation_merger=None):
+        """
+        Returns a new BindingSites instance with the stretches of bases that
+        are covered by both a site of self and a site of other, in one sweep
+        over both sorted sets, i.e. in O(n + m) steps. Each stretch is annotated
+        with the merged annotations of the two sites that cover it.
+
+        :param other: a BindingSites instance
+        :param annotation_merger: if specified, this function is used to merge
+                                  the annotations of the two sites (otherwise,
+                                  they are simply joined into a tuple)
+                                  (Default value = None)
+
+        """
+        self._check_set_operation(other, "intersect")
+
+        sites_1 = self.sorted_sites
+        sites_2 = other.sorted_sites
+        output_sites = []
+        i = j = 0
+        while i < len(sites_1) and j < len(sites_2):
+            site_1 = sites_1[i]
+            site_2 = sites_2[j]
+            if BindingSites.is_overlap_ranges(site_1, site_2):
+                output_sites.append(
+                    (
+                        max(site_1[0], site_2[0]),
+                        min(site_1[1], site_2[1]),
+                        BindingSites._merge_meta(
+                            [site_1[2], site_2[2]], annotation_merger
+                        ),
+                    )
+                )
+            # The site that ends first can not overlap anything further on
+            if site_1[1] < site_2[1]:
+                i += 1
+            elif site_2[1] < site_1[1]:
+                j += 1
+            else:
+                i += 1
+                j += 1
+
+        return BindingSites.from_sites(output_sites)
+
+    def subtract(self, other):
+        """
+        Returns a new BindingSites instance with the stretches of bases of the
+        sites of self that are not covered by any site of other, in one sweep
+        over both sorted sets, i.e. in O(n + m) steps. Each stretch keeps the
+        annotation of the site it was cut from. Sites of length zero are kept if
+        no site of other overlaps them.
+
+        :param other: a BindingSites instance
+
+        """
+        self._check_set_operation(other, "subtract")
+
+        other_sites = other.sorted_sites
+        output_sites = []
+        j = 0
+        for site in self.sorted_sites:
+            start, end, annotation = site
+            # Sites of other that end before this site starts end before any
+            # of the sites that follow starts, too
+            while j < len(other_sites) and other_sites[j][1] <= start:
+                j += 1
+
+            if start == end:
+                if j == len(other_sites) or not BindingSites.is_overlap_ranges(
+                    site, other_sites[j]
+                ):
+                    output_sites.append(site)
+                continue
+
+            cursor = start
+            k = j
+            while k < len(other_sites) and other_sites[k][0] < end:
+                other_start, other_end, *_ = other_sites[k]
+                k += 1
+                if other_start == other_end:
+                    # Covers no bases
+                    continue
+                if other_start > cursor:
+                    output_sites.append((cursor, other_start, annotation))
+                cursor = max(cursor, other_end)
+            if cursor < end:
+                output_sites.append((cursor, end, annotation))
+
+        return BindingSites.from_sites(output_sites)
+
+    def complement(self, length):
+        """
+        Returns a new BindingSites instance with the stretches of bases within
+        [0, length) that are not covered by any site, in one sweep over the
+        sorted set. The stretches are not annotated.
+
+        :param length: the length of the molecule (e.g. RNA) the sites are on
+
+        """
+        self._check_set_operation(None, "complement")
+        if length < 0:
+            raise ValueError("length should not be negative")
+
+        output_sites = []
+        cursor = 0
+        for start, end, *_ in self.sorted_sites:
+            if start >= length:
+                break
+            if start == end:
+                # Covers no bases
+                continue
+            if start > cursor:
+                output_sites.append((cursor, start, None))
+            cursor = max(cursor, end)
+        if cursor < length:
+            output_sites.append((cursor, length, None))
+
+        return BindingSites.from_sites(output_sites)
+
     def print_bed(
         self,
         name="Generic Binding Site",
@@ -542,6 +876,106 @@ class BindingSites:
         annotation_to_additional_columns=None,
     ):
         """
+        Returns the binding sites as the lines of a BED file. See write_bed()
+        for the parameters, which writes the same lines to a file instead.
+
+        """
+        bed_file = io.StringIO()
+        self.write_bed(
+            bed_file,
+            name=name,
+            chr_n=chr_n,
+            displacement=displacement,
+            end_inclusion=end_inclusion,
+            antisense=antisense,
+            add_annotation=add_annotation,
+            include_score=include_score,
+            score_max=score_max,
+            score_base=score_base,
+            include_color=include_color,
+            conditional_color_func=conditional_color_func,
+            is_bar=is_bar,
+            is_additional_columns=is_additional_columns,
+            annotation_to_additional_columns=annotation_to_additional_columns,
+        )
+        return bed_file.getvalue()
+
+    def write_bed(
+        self,
+        bed_file,
+        name="Generic Binding Site",
+        chr_n=1,
+        displacement=0,
+        end_inclusion=False,
+        antisense=False,
+        add_annotation=False,
+        include_score=False,
+        score_max=1000,
+        score_base=1000,
+        include_color=False,
+        conditional_color_func=None,
+        is_bar=False,
+        is_additional_columns=False,
+        annotation_to_additional_columns=None,
+    ):
+        """
+        Writes the binding sites to an open file, as the lines of a BED file
+        (see bed_rows() for the parameters). Lines are written
+        BED_WRITE_BATCH_SIZE at a time, rather than gathered into one string
+        first.
+
+        :param bed_file: the file to write to
+
+        """
+        lines = []
+        for chrom, start, end, fields in self.bed_rows(
+            name=name,
+            chr_n=chr_n,
+            displacement=displacement,
+            end_inclusion=end_inclusion,
+            antisense=antisense,
+            add_annotation=add_annotation,
+            include_score=include_score,
+            score_max=score_max,
+            score_base=score_base,
+            include_color=include_color,
+            conditional_color_func=conditional_color_func,
+            is_bar=is_bar,
+            is_additional_columns=is_additional_columns,
+            annotation_to_additional_columns=annotation_to_additional_columns,
+        ):
+            row = [chrom, str(start), str(end)] + fields
+            lines.append("\t".join(row) + "\n")
+
+            if len(lines) == BED_WRITE_BATCH_SIZE:
+                bed_file.writelines(lines)
+                lines = []
+
+        bed_file.writelines(lines)
+
+    def bed_rows(
+        self,
+        name="Generic Binding Site",
+        chr_n=1,
+        displacement=0,
+        end_inclusion=False,
+        antisense=False,
+        add_annotation=False,
+        include_score=False,
+        score_max=1000,
+        score_base=1000,
+        include_color=False,
+        conditional_color_func=None,
+        is_bar=False,
+        is_additional_columns=False,
+        annotation_to_additional_columns=None,
+    ):
+        """
+        Yields the binding sites as the rows of a BED file, as
+        (chrom, start, end, fields) tuples, where fields are the other columns
+        of the row as strings. write_bed() writes them as lines of text, and
+        write_bigbed() (in bbi_files.py) as a bigBed file, without the text in
+        between.
 
         :param name:  (Default value = "Generic Binding Site")
         :param chr_n:  (Default value = 1)
@@ -566,12 +1000,16 @@ class BindingSites:
 
         # Todo: Possibly remove the functionality for is_bar, it seems
         # misplaced!
-        output_str = ""
         if not isinstance(chr_n, str):
             chr_n = "chr" + str(chr_n)
         else:
             chr_n = ("chr" + chr_n) if chr_n[:3] != "chr" else chr_n
 
+        strand = "+" if not antisense else "-"
+        end_extra = 1 if end_inclusion else 0
+        # Sites mostly share a handful of colors
+        colors = {}
+
         sorted_sites = (
             self.sorted_sites if not antisense else reversed(self.sorted_sites)
         )
@@ -579,17 +1017,12 @@ class BindingSites:
             start, end, annotation = _tuple
             if antisense:
                 start, end = -end, -start
-            start, end = (
-                displacement + start,
-                (displacement + end + (1 if end_inclusion else 0)),
-            )
+            start, end = displacement + start, displacement + end + end_extra
 
-            name_display = name
-            to_join = [chr_n, start, end, name_display]
+            fields = [name]
 
             if include_color and not include_score:
-                score = 1000
-                to_join.append(score)
+                fields.append("1000")
             elif include_score:
 
                 assert len(annotation) == 1
@@ -603,36 +1036,36 @@ class BindingSites:
                     )
                 )
                 score = int(score / score_base * score_max)
-                to_join.append(score)
+                fields.append(str(score))
 
             if include_color and is_bar:
                 raise ValueError("Cant be both color and bar!")
 
-            strand = "+" if not antisense else "-"
             if include_color:
 
                 if conditional_color_func is None:
                     color = "0,0,0"  # black
                 else:
-                    red, green, blue = conditional_color_func(_tuple)
-                    color = ",".join(map(str, [red, green, blue]))
+                    rgb = tuple(conditional_color_func(_tuple))
+                    color = colors.get(rgb)
+                    if color is None:
+                        red, green, blue = rgb
+                        color = colors[rgb] = f"{red},{green},{blue}"
 
-                to_join += [strand, start, end, color]
+                fields += [strand, str(start), str(end), color]
 
             if is_bar and not include_score:
                 raise ValueError("What height for bar?")
             if is_bar:
                 number_of_bars = 1
-                to_join += [strand, name, number_of_bars, score]
+                fields += [strand, name, str(number_of_bars), str(score)]
 
             if is_additional_columns:
-                to_join += [
+                fields += [
                     s.replace(" ", "_") if s else ".'"
                     for s in annotation_to_additional_columns(annotation)
                 ]
-            output_str += "\t".join(map(str, to_join)) + "\n"
-
-        return output_str
+            yield chr_n, start, end, fields
 
     def return_depth(self, length=-1):
         """
@@ -660,15 +1093,14 @@ class BindingSites:
         # molecule in terms of its chances of being a binding site.
         binding_depth = [0] * length
 
-        for site in self:
-
-            start = site[0]
-            end = site[1]
-
-            # TODO: Document coordinate system choice and remain consistent
-            # start inclusive, end exclusive
-            for nucleotide in range(start, end):
-                binding_depth[nucleotide] += 1
+        # start inclusive, end exclusive
+        for start, end, depth in self.get_depth_runs():
+            if end > length:
+                raise ValueError(
+                    "Please make sure length is not smaller than the end point"
+                    " of any site"
+                )
+            binding_depth[start:end] = [depth] * (end - start)
 
         return binding_depth
 
@@ -744,17 +1176,26 @@ class BindingSites:
                 " set to off!"
             )
 
-        depth_array = self.return_depth()
+        if len(self) == 0:
+            raise ValueError("There are no sites to collapse")
 
-        max_depth = max(depth_array)
+        depth_runs = self.get_depth_runs()
+        max_depth = self.max_depth()
 
         if mode == "baseCoverNumber":
+            # Number of bases of each depth, up to the end of the last site
+            bases_by_depth = {0: max(map(secondItem, self))}
+            for start, end, depth in depth_runs:
+                bases_by_depth[depth] = (
+                    bases_by_depth.get(depth, 0) + end - start
+                )
+                bases_by_depth[0] -= end - start
+
             depth_cutoff = -1
-            while (
-                len(list(filter(lambda k: k > depth_cutoff, depth_array)))
-                > number
-            ):
+            bases_above_cutoff = sum(bases_by_depth.values())
+            while bases_above_cutoff > number:
                 depth_cutoff += 1
+                bases_above_cutoff -= bases_by_depth.get(depth_cutoff, 0)
 
             if depth_cutoff == -1:
                 # print("WARNING: your baseCoverNumber is impossible to"
@@ -787,28 +1228,21 @@ class BindingSites:
         if in_place:
             self.overlap_mode = False
             self.sorted_sites = SortedSet()
+            self.sites_changed()
             binding_site_to_add_to = self
         else:
             binding_site_to_add_to = BindingSites()
 
-        in_range = False
-        start_range = 0
-        end_range = 0
-        nucleotide = 0
-        for nucleotide, depth in enumerate(depth_array):
-            if depth > depth_cutoff:
-                if not in_range:
-                    start_range = nucleotide
-                    in_range = True
+        # Stretches of bases deeper than the cutoff
+        ranges = []
+        for start, end, depth in depth_runs:
+            if depth <= depth_cutoff:
+                continue
+            if ranges and ranges[-1][1] == start:
+                ranges[-1][1] = end
             else:
-                if in_range:
-                    end_range = nucleotide
-                    in_range = False
-                    binding_site_to_add_to.add((start_range, end_range))
-
-        if in_range:
-            end_range = nucleotide + 1
-            in_range = False
+                ranges.append([start, end])
+        for start_range, end_range in ranges:
             binding_site_to_add_to.add((start_range, end_range))
 
         if len(binding_site_to_add_to) > 0:
@@ -835,8 +1269,7 @@ class BindingSites:
         (or simply, the length of space covered by the intervals stored in
         BindingSites)
         """
-        depth_array = self.return_depth()
-        return len(list(filter(lambda k: k > 0, depth_array)))
+        return sum(end - start for start, end, _ in self.get_depth_runs())
 
     def print_wig(
         self,
@@ -897,6 +1330,152 @@ class BindingSites:
 
         return output_str
 
+    def print_bedgraph(
+        self,
+        chr_no=1,
+        displacement=0,
+        include_name=False,
+        include_description=False,
+        name="",
+        description="",
+        include_header=True,
+        length=-1,
+        antisense=False,
+    ):
+        """
+        Returns the density of binding sites by the RBP as a bedGraph file.
+        See write_bedgraph() for the parameters, which writes the same lines
+        to a file instead.
+
+        """
+        bedgraph_file = io.StringIO()
+        self.write_bedgraph(
+            bedgraph_file,
+            chr_no=chr_no,
+            displacement=displacement,
+            include_name=include_name,
+            include_description=include_description,
+            name=name,
+            description=description,
+            include_header=include_header,
+            length=length,
+            antisense=antisense,
+        )
+        return bedgraph_file.getvalue()
+
+    def write_bedgraph(
+        self,
+        bedgraph_file,
+        chr_no=1,
+        displacement=0,
+        include_name=False,
+        include_description=False,
+        name="",
+        description="",
+        include_header=True,
+        length=-1,
+        antisense=False,
+    ):
+        """
+        Writes the density of binding sites by the RBP to an open file, as a
+        bedGraph file: one line per run of bases with the same depth (see
+        get_depth_runs()), rather than one per base as in print_wig(). The
+        bases the sites leave uncovered are given a depth of 0, so the same
+        bases are described as by print_wig(), and convert_wig_to_bw() (in
+        populate_trackhub.py) turns either into the same bigWig file.
+
+        :param bedgraph_file: the file to write to
+        :param chr_no:  (Default value = 1)
+        :param displacement: the 0-based position of the first base of the
+                             RNA on the chromosome (the same as for
+                             print_wig()) (Default value = 0)
+        :param include_name:  (Default value = False)
+        :param include_description:  (Default value = False)
+        :param name:  (Default value = "")
+        :param description:  (Default value = "")
+        :param include_header:  (Default value = True)
+        :param length: the length of the RNA, as for return_depth()
+                       (Default value = -1)
+        :param antisense: set to True if position p on the RNA lies at
+                          position length - 1 - p from displacement, as for
+                          print_wig() (Default value = False)
+
+        """
+        runs = self.bedgraph_runs(
+            chr_no=chr_no,
+            displacement=displacement,
+            length=length,
+            antisense=antisense,
+        )
+
+        if include_header:
+            header = "track type=bedGraph "
+            if include_name:
+                header += 'name="' + name + '" '
+            if include_description:
+                header += 'description="' + description + '" '
+            header += "visibility=full\n"
+            bedgraph_file.write(header)
+
+        lines = []
+        for chrom, start, end, depth in runs:
+            lines.append(f"{chrom}\t{start}\t{end}\t{depth}\n")
+            if len(lines) == BED_WRITE_BATCH_SIZE:
+                bedgraph_file.writelines(lines)
+                lines = []
+        bedgraph_file.writelines(lines)
+
+    def bedgraph_runs(
+        self, chr_no=1, displacement=0, length=-1, antisense=False
+    ):
+        """
+        Returns the density of binding sites by the RBP as the rows of a
+        bedGraph file, as (chrom, start, end, depth) runs of bases on the
+        chromosome (see write_bedgraph() for the parameters).
+        write_bedgraph() writes them as lines of text, and write_bigwig() (in
+        bbi_files.py) as a bigWig file, without the text in between.
+
+        :param chr_no:  (Default value = 1)
+        :param displacement:  (Default value = 0)
+        :param length:  (Default value = -1)
+        :param antisense:  (Default value = False)
+
+        """
+        if length == -1:
+            if len(self) == 0:
+                raise ValueError(
+                    "If the BindingSites object is empty, please"
+                    " do not call write_bedgraph without "
+                    "specifying the length parameter."
+                )
+            length = max(map(secondItem, self))
+
+        runs = []
+        position = 0
+        for start, end, depth in self.get_depth_runs():
+            if end > length:
+                raise ValueError(
+                    "Please make sure length is not smaller than the end point"
+                    " of any site"
+                )
+            if start > position:
+                runs.append((position, start, 0))
+            runs.append((start, end, depth))
+            position = end
+        if position < length:
+            runs.append((position, length, 0))
+
+        if antisense:
+            runs = [
+                (length - end, length - start, depth)
+                for start, end, depth in reversed(runs)
+            ]
+
+        chrom = f"chr{chr_no}"
+        return [
+            (chrom, displacement + start, displacement + end, depth)
+            for start, end, depth in runs
+        ]
 
 if __name__ == "__main__":
     # testing return_depth here:
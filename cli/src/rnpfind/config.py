@@ -55,6 +55,13 @@ UCSC_TRACK_VISIBILITY = "dense"
 # Used for csv output format
 DEFAULT_BASE_STRINGENCY = 30
 
+# Binding sites closer than this many bases to a binding site of an RBP of
+# interest are considered to be competing with it (used for per binding site
+# analysis and for coloring BED files)
+COMPETITIVE_THRESHOLD_BP = 15
+# ... and those further away but closer than this many bases to be cooperating
+COOPERATIVE_THRESHOLD_BP = 56
+
 # This should be False normally. Only set to True if you want to make a
 # dedicated directory for your RNA of interest.
 # Note that this flag only affects UCSC browser visualization method.
@@ -76,6 +83,14 @@ PWM_SCAN_CUT_OFF_PERCENTAGE = 0.80
 ANNOTATION_COLUMN_DELIMITER = ",,,,,"
 ANNOTATION_ROW_DELIMITER = ";;;;;"
 
+# Binding sites given one at a time by a data load function are grouped into
+# chunks of this many sites before being stored (see site_batch.py)
+SITE_BATCH_SIZE = 10000
+
+# Lines of BED (and bedGraph) files are written out in batches of this many
+# lines (see BindingSites.write_bed())
+BED_WRITE_BATCH_SIZE = 10000
+
 RO_DATA_TAR_NAME = Path(__file__).parent / "all.tar.gz"
 RO_DATA_URL = "https://rnpfind.com/ro-data/all.tar.gz"
 
@@ -83,6 +98,10 @@ RO_DATA_URL = "https://rnpfind.com/ro-data/all.tar.gz"
 CACHE_PATH = Path(__file__).parent / "cache"
 # Path for pickled data
 PICKLE_PATH = f"{CACHE_PATH}/pickles"
+# Path for the binding sites loaded for each region analysed (see
+# result_cache.py), and the size in bytes this cache is kept under
+RESULT_CACHE_PATH = f"{CACHE_PATH}/results"
+RESULT_CACHE_SIZE_LIMIT = 512 * 2**20
 # Path for all (input) read-only data
 RO_DATA_PATH = Path(__file__).parent / "ro-data"
 # Path for RBPDB data
@@ -93,5 +112,5 @@ ATTRACT_PATH = f"{RO_DATA_PATH}/attract"
 POSTAR_PATH = f"{RO_DATA_PATH}/postar"
 # Path for AutoSQL files
 AUTOSQL_PATH = f"{RO_DATA_PATH}/autosql"
-# Path for UCSC tools
+# Path for UCSC files, such as the chromosome sizes of hg38
 UCSCTOOL_PATH = Path(__file__).parent / "ucsc-tools"
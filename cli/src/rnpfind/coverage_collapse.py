@@ -0,0 +1,300 @@
+"""
+Defines the class CoverageCollapser, which collapses the overlapping binding
+sites of one RBP while they are being loaded, rather than after all of them are
+stored.
+
+load_data collapses the binding sites of each RBP with
+BindingSites.overlap_collapse() in 'baseCoverNumber' mode, which keeps the
+bases whose depth of coverage is above a cutoff. For that, every binding site
+would have to be kept in memory until the whole data source is loaded. When the
+sites of a data source come sorted, a CoverageCollapser instead sweeps over
+them as they come in: each block of overlapping sites is collapsed as soon as
+the sweep moves past it, and only the depth of coverage is kept (as a
+histogram, and if needed, as runs of bases of the same depth along with the
+sites of each block), so the cutoff can still be chosen once every site is in.
+"""
+
+import bisect
+import heapq
+
+from .binding_analysis_binding_sites import BindingSites
+
+# Orders in which a data source may give the binding sites of an RBP
+ASCENDING_STARTS = "ascending starts"
+DESCENDING_ENDS = "descending ends"
+
+
+class CoverageCollapser:
+    """
+    Collapses binding sites of one RBP as they come in sorted, giving the same
+    sites as adding them all to a BindingSites instance in overlap mode and
+    calling overlap_collapse('baseCoverNumber', number, annotation_merger) on
+    it.
+
+    Sites given in DESCENDING_ENDS order are swept from the end of the RNA
+    backwards, by mirroring their coordinates.
+    """
+
+    def __init__(
+        self,
+        order=ASCENDING_STARTS,
+        keep_depth_runs=False,
+        annotation_merger=None,
+    ):
+        """
+        :param order: the order in which sites are given, ASCENDING_STARTS or
+                      DESCENDING_ENDS (Default value = ASCENDING_STARTS)
+        :param keep_depth_runs: whether to keep the depth of coverage of each
+                                base, which is needed to collapse the sites
+                                with a cutoff depth above zero (i.e. when
+                                number is less than base_cover)
+                                (Default value = False)
+        :param annotation_merger: see BindingSites.overlap_collapse()
+                                  (Default value = None)
+
+        """
+        if order not in (ASCENDING_STARTS, DESCENDING_ENDS):
+            raise ValueError(f"Unknown order of sites: {order}")
+        self.mirrored = order == DESCENDING_ENDS
+        self.keep_depth_runs = keep_depth_runs
+        self.annotation_merger = annotation_merger
+
+        # Number of bases covered by exactly d sites, for each depth d > 0
+        self.depth_bases = {}
+        # Runs of bases with the same depth as (start, end, depth), if kept
+        self.depth_runs = []
+        # Collapsed blocks of overlapping sites as (start, end, annotation)
+        self.blocks = []
+        # The sites in each block, if depth runs are kept, so that the sites
+        # kept with a cutoff depth above zero get the annotations of the sites
+        # touching them only
+        self.block_sites = []
+
+        # The sweep happens in mirrored coordinates for DESCENDING_ENDS, so
+        # that sites come in by ascending start either way
+        self._last_start = None
+        self._sites_at_start = set()
+        self._position = None
+        self._active_ends = []
+        self._block = None
+        self._block_sites = []
+        # Empty sites that may touch a block starting at their position
+        self._pending_sites = []
+        self._finished = False
+
+    def base_cover(self):
+        """
+        Returns the number of bases covered by the sites, as
+        BindingSites.base_cover() would. Only bases the sweep has moved past
+        are counted, so call finish() first to count them all.
+        """
+        return sum(self.depth_bases.values())
+
+    def finish(self):
+        """
+        Tells the CoverageCollapser that all sites were given, so the sweep
+        can move past the last of them.
+        """
+        if self._finished:
+            return
+        self._finished = True
+        self._sweep_to(float("inf"))
+        self._close_block()
+        self._pending_sites = []
+
+    def add(self, site):
+        """
+        Adds a site, in the form (start, end, annotation). Sites must be given
+        in the order set at initialization.
+
+        :param site: the site to be added
+
+        """
+        if self._finished:
+            raise ValueError("No sites can be added after finish() is called")
+        start, end, _ = site
+        if start > end:
+            raise ValueError(
+                "Please make sure the interval end point is greater than the"
+                " start point!"
+            )
+        if self.mirrored:
+            start, end = -end, -start
+        if self._last_start is not None and start < self._last_start:
+            raise ValueError(
+                "Sites were not given in the order the CoverageCollapser was"
+                " set up for"
+            )
+        if start != self._last_start:
+            self._last_start = start
+            self._sites_at_start = set()
+        # A site given twice counts once, as in a BindingSites instance
+        if site in self._sites_at_start:
+            return
+        self._sites_at_start.add(site)
+
+        self._sweep_to(start)
+
+        if start == end:
+            # Covers no bases, but carries its annotation to a block it touches
+            if self._block is not None and start <= self._block[1]:
+                self._block_sites.append(site)
+            else:
+                self._pending_sites.append((start, site))
+            return
+
+        heapq.heappush(self._active_ends, end)
+        if self._block is not None and start <= self._block[1]:
+            self._block[1] = max(self._block[1], end)
+        else:
+            self._close_block()
+            self._block = [start, end]
+            self._block_sites = [
+                pending_site
+                for position, pending_site in self._pending_sites
+                if position == start
+            ]
+        self._pending_sites = []
+        self._block_sites.append(site)
+
+    def add_many(self, sites):
+        """
+        Adds several sites, in the order set at initialization.
+
+        :param sites: an iterable of sites in the form (start, end, annotation)
+
+        """
+        for site in sites:
+            self.add(site)
+
+    def _add_depth_run(self, start, end, depth):
+        self.depth_bases[depth] = self.depth_bases.get(depth, 0) + end - start
+        if not self.keep_depth_runs:
+            return
+        if self.depth_runs and self.depth_runs[-1][1:] == [start, depth]:
+            self.depth_runs[-1][1] = end
+        else:
+            self.depth_runs.append([start, end, depth])
+
+    def _sweep_to(self, position):
+        """
+        Records the depth of coverage of every base before position, in the
+        (possibly mirrored) coordinates of the sweep.
+        """
+        while self._active_ends and self._active_ends[0] <= position:
+            end = heapq.heappop(self._active_ends)
+            if end > self._position:
+                self._add_depth_run(
+                    self._position, end, len(self._active_ends) + 1
+                )
+                self._position = end
+        if self._active_ends and position > self._position:
+            self._add_depth_run(
+                self._position, position, len(self._active_ends)
+            )
+        self._position = position
+
+    def _close_block(self):
+        if self._block is None:
+            return
+        # Annotations are merged the way overlap_collapse() merges them: in
+        # reverse order of the sorted sites
+        sites = sorted(self._block_sites, reverse=True)
+        annotation = BindingSites._merge_meta(
+            [site[2] for site in sites], self.annotation_merger
+        )
+        self.blocks.append((self._block[0], self._block[1], annotation))
+        if self.keep_depth_runs:
+            self.block_sites.append(self._block_sites)
+        self._block = None
+        self._block_sites = []
+
+    def _unmirror(self, sites):
+        if not self.mirrored:
+            return sites
+        return [(-end, -start, *rest) for start, end, *rest in reversed(sites)]
+
+    def depth_cutoff(self, number):
+        """
+        Returns the depth above which bases are kept so that at most number
+        bases are covered, as in overlap_collapse('baseCoverNumber', number).
+
+        :param number: the maximum number of bases to cover
+
+        """
+        depth_cutoff = 0
+        bases_above = self.base_cover()
+        while bases_above > number:
+            depth_cutoff += 1
+            bases_above -= self.depth_bases.get(depth_cutoff, 0)
+        return depth_cutoff
+
+    def collapse(self, number):
+        """
+        Finishes the sweep (see finish()), and returns the collapsed sites, as
+        overlap_collapse('baseCoverNumber', number) would, in sorted order.
+
+        If the cutoff depth is above zero, each site kept carries the
+        annotations of the sites that overlap or touch it, as given to
+        overlap_collapse() (a site touching two sites kept is only counted
+        for the one BindingSites.nearest_site() finds).
+
+        :param number: the maximum number of bases the sites returned may
+                       cover
+
+        """
+        self.finish()
+
+        depth_cutoff = self.depth_cutoff(number)
+        if depth_cutoff == 0:
+            return self._unmirror(self.blocks)
+
+        if not self.keep_depth_runs:
+            raise ValueError(
+                "A cutoff depth above zero needs keep_depth_runs to be set"
+            )
+
+        kept_runs = []
+        for start, end, depth in self.depth_runs:
+            if depth <= depth_cutoff:
+                continue
+            if kept_runs and kept_runs[-1][1] == start:
+                kept_runs[-1][1] = end
+            else:
+                kept_runs.append([start, end])
+        kept_runs = self._unmirror(kept_runs)
+        if not kept_runs:
+            return []
+
+        # Each site is matched to a run kept the way overlap_collapse() does
+        # it, with nearest_site(), and annotations are merged in reverse order
+        # of the sorted sites
+        run_starts = [start for start, _ in kept_runs]
+        run_annotations = [[] for _ in kept_runs]
+        for start, end, annotation in sorted(
+            site for sites in self.block_sites for site in sites
+        ):
+            pos = bisect.bisect_left(run_starts, start)
+            dist_start = start - kept_runs[pos - 1][1] if pos > 0 else None
+            dist_end = (
+                kept_runs[pos][0] - end if pos < len(kept_runs) else None
+            )
+            if dist_start is None or (
+                dist_end is not None and dist_start > dist_end
+            ):
+                run, distance = pos, dist_end
+            else:
+                run, distance = pos - 1, dist_start
+            if distance <= 0:
+                run_annotations[run].append(annotation)
+
+        return [
+            (
+                start,
+                end,
+                BindingSites._merge_meta(
+                    annotations[::-1], self.annotation_merger
+                ),
+            )
+            for (start, end), annotations in zip(kept_runs, run_annotations)
+        ]
@@ -35,9 +35,16 @@ example, the function might return a list that looks like
     (rbp_n, star_n, end_n, annotation_n)
 ].
 
-See attract_data_load.py for an example where "yield" was used to make an
-iterator instead that serves the same purpose (more out of a laziness of
-changing code than any demonstrable efficiency).
+See postar_data_load.py for an example where "yield" was used to make an
+iterator instead that serves the same purpose.
+
+A data loading function may also give binding sites in chunks: instead of
+single (rbp, start, end, annotation) tuples, it may yield SiteBatch instances
+(see site_batch.py), each of which holds many binding sites as parallel arrays
+of RBPs, starts, ends and annotations. These are stored in one go, which saves
+time when a data loading function gives many sites at once. For example,
+attract_data_load.py yields the sites found by scanning for one motif as one
+SiteBatch. Tuples and SiteBatch instances can be mixed freely.
 
 Above, for each binding site, "rbp" is the name of an RBP molecule (a string).
 
@@ -67,9 +74,11 @@ following standardization: the data loading function should give a list of
 "features" that it wants to associate with the binding site. For example, a
 binding site may be associated with the features "database id", "binding score",
 and "experiment_type", so the function would return something like
-(rbp_1, start_1, end_1, ["nm00042", 0.9, "clip seq"]). Internally, RNPFind does
-stuff like converting it to a string separated by delimiters, but that's just a
-relic from the past and my lack of firm will in changing the code.
+(rbp_1, start_1, end_1, ("nm00042", "0.9", "clip seq")). Internally, RNPFind
+stores each distinct list of features once per data source (see
+annotation_table.py), and annotates binding sites with references to them.
+Strings with features joined by ANNOTATION_COLUMN_DELIMITER (see config.py) are
+accepted too, as that is how older data loading functions give annotations.
 
 Above, annotation to the binding sites are given just as data, but what about
 the "column headings", so to speak? That's exactly a part of what this file
@@ -85,6 +94,7 @@ from .attract_data_load import (
     attract_column_names,
     attract_data_load,
     attract_default_label_index,
+    attract_max_site_length,
 )
 
 # These imports are more obvious once you see below
@@ -96,6 +106,7 @@ from .postar_data_load import (
     postar_column_names,
     postar_data_load,
     postar_default_label_index,
+    postar_site_order,
 )
 from .rbpdb_data_load import (
     RBPDB_DEFAULT_MOUSE_OVER_INDEX,
@@ -103,6 +114,7 @@ from .rbpdb_data_load import (
     rbpdb_column_names,
     rbpdb_data_load,
     rbpdb_default_label_index,
+    rbpdb_max_site_length,
 )
 
 # First, add a short name for your data source method to this list
@@ -126,6 +138,41 @@ data_load_sources_functions = {
     "custom": custom_data_load,
 }
 
+# If your data loading function mostly waits on reading files (rather than,
+# say, scanning the RNA sequence for motifs), add its short name here. When
+# data sources are loaded concurrently, such functions are run on a thread,
+# while the others are run on worker processes.
+io_bound_data_load_sources = {"postar", "custom"}
+
+# The binding sites loaded for a region are cached on disk (see
+# result_cache.py), on the assumption that they only depend on the region, the
+# read-only data and the settings in config.py. If the binding sites your data
+# loading function gives depend on anything else (e.g. data the user edits),
+# add its short name here so they are loaded every time.
+uncached_data_load_sources = {"custom"}
+
+# If your data loading function gives the binding sites of each RBP sorted, by
+# ascending start or by descending end, map its short name to a function that
+# takes rna_info and returns which of the two (ASCENDING_STARTS or
+# DESCENDING_ENDS, see coverage_collapse.py). The sites are then collapsed
+# while they are loaded, rather than all kept in memory first.
+data_load_sources_site_orders = {"postar": postar_site_order}
+
+# If the binding sites your data loading function gives for a region are always
+# those it gives for any larger region that lie within the region (as for motif
+# hits found by scanning the RNA sequence), the binding sites of a region can be
+# taken from a cached region enclosing it, or from one overlapping it plus a
+# scan of the rest (see result_cache.py). To allow that, map its short name to
+# a function that returns the length of the longest binding site it can give.
+# Your function must then yield one SiteBatch per motif (see
+# SiteBatch.from_sites()), even if the motif is not found, so that it gives the
+# same chunks in the same order for every region. It may give no chunks at all
+# for a region, but then it must give none for any larger region either.
+data_load_sources_max_site_lengths = {
+    "rbpdb": rbpdb_max_site_length,
+    "attract": attract_max_site_length,
+}
+
 # Finally, for the sake of UCSC visualization, give a little bit info about
 # your data source function's annotations. Map the short name of your data load
 # function to another dictionary, which has the following mappings:
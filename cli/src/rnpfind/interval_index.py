@@ -0,0 +1,152 @@
+"""
+An index for answering "which intervals overlap this range" queries over a
+large, static collection of intervals (e.g. the binding sites of all RBPs on a
+transcript) in O(log N + k) time, where k is the number of intervals reported.
+
+The index is an implicit augmented interval tree, as used by cgranges: the
+intervals are sorted by start coordinate and laid out in an array, where the
+array itself is read as a binary search tree (node i is at level l if the l
+lowest bits of i are set, and its children are at i -/+ 2^(l-1)). Each node is
+augmented with the maximum end coordinate in its subtree, which lets a query
+skip every subtree whose intervals all end before the queried range starts.
+
+Intervals may overlap one another, and are treated as half-open, the same way
+as BindingSites.is_overlap_ranges() does.
+"""
+
+import numpy as np
+
+# Subtrees at this level or below are scanned linearly rather than descended,
+# since walking a few nodes is quicker than managing the stack for them
+LINEAR_SCAN_LEVEL = 3
+
+
+class IntervalIndex:
+    """
+    A static index over a collection of intervals, each carrying a label.
+
+    The intervals are kept sorted by start coordinate (ties keep the order in
+    which they were given) in self.intervals, with their labels in
+    self.labels. Queries return positions in these lists, in sorted order.
+    """
+
+    def __init__(self, intervals=(), labels=None):
+        """
+        :param intervals: an iterable of intervals in the form (start, end) or
+                          (start, end, metadata)
+        :param labels: an iterable of labels, one per interval. If None, each
+                       interval is labelled by its position in intervals
+                       (Default value = None)
+
+        """
+        intervals = list(intervals)
+        if labels is None:
+            labels = range(len(intervals))
+        labels = list(labels)
+        if len(labels) != len(intervals):
+            raise ValueError("Please give exactly one label per interval")
+
+        starts = np.array([site[0] for site in intervals], dtype=np.int64)
+        order = np.argsort(starts, kind="stable").tolist()
+
+        self.intervals = [intervals[i] for i in order]
+        self.labels = [labels[i] for i in order]
+        self._starts = [site[0] for site in self.intervals]
+        self._ends = [site[1] for site in self.intervals]
+        self._max_ends, self._root_level = self._augment(
+            self._ends, len(self.intervals)
+        )
+
+    def __len__(self):
+        return len(self.intervals)
+
+    @staticmethod
+    def _augment(ends, num_intervals):
+        """
+        Computes the maximum end coordinate within the subtree of every node
+        of the implicit tree (see module docstring), bottom-up.
+
+        :param ends: end coordinates of the intervals, sorted by start
+        :param num_intervals: the number of intervals
+        :returns: a tuple (max_ends, root_level)
+
+        """
+        max_ends = list(ends)
+        if num_intervals == 0:
+            return max_ends, -1
+
+        # The rightmost node of the tree built so far, and its max end. Nodes
+        # whose right child falls beyond the array take this value instead.
+        last_i = (num_intervals - 1) & ~1
+        last = max_ends[last_i]
+
+        level = 1
+        while 1 << level <= num_intervals:
+            half = 1 << (level - 1)
+            for i in range((half << 1) - 1, num_intervals, half << 2):
+                right = (
+                    max_ends[i + half] if i + half < num_intervals else last
+                )
+                max_ends[i] = max(ends[i], max_ends[i - half], right)
+
+            # Move up to the parent of the rightmost node
+            last_i = last_i - half if last_i >> level & 1 else last_i + half
+            if last_i < num_intervals and max_ends[last_i] > last:
+                last = max_ends[last_i]
+            level += 1
+
+        return max_ends, level - 1
+
+    def overlap(self, start, end):
+        """
+        Returns the positions (in self.intervals) of all the intervals that
+        overlap the half-open range [start, end), in sorted order.
+
+        :param start: start of the query range
+        :param end: end of the query range
+
+        """
+        starts, ends, max_ends = self._starts, self._ends, self._max_ends
+        num_intervals = len(starts)
+        if num_intervals == 0:
+            return []
+
+        hits = []
+        level = self._root_level
+        # Stack of (level, node, whether the left child was processed)
+        stack = [(level, (1 << level) - 1, False)]
+        while stack:
+            level, node, left_done = stack.pop()
+            if level <= LINEAR_SCAN_LEVEL:
+                # Small subtree; check each of its intervals in order
+                first = node >> level << level
+                last = min(first + (1 << (level + 1)) - 1, num_intervals)
+                for i in range(first, last):
+                    if starts[i] >= end:
+                        break
+                    if start < ends[i]:
+                        hits.append(i)
+            elif not left_done:
+                stack.append((level, node, True))
+                # The left child may lie beyond the array, in which case it
+                # has to be descended to reach the nodes that do exist
+                left = node - (1 << (level - 1))
+                if left >= num_intervals or max_ends[left] > start:
+                    stack.append((level - 1, left, False))
+            elif node < num_intervals and starts[node] < end:
+                if start < ends[node]:
+                    hits.append(node)
+                stack.append((level - 1, node + (1 << (level - 1)), False))
+
+        return hits
+
+    def overlap_labels(self, start, end):
+        """
+        Returns the labels of all the intervals that overlap the half-open
+        range [start, end), in the order the intervals are sorted in.
+
+        :param start: start of the query range
+        :param end: end of the query range
+
+        """
+        return [self.labels[i] for i in self.overlap(start, end)]
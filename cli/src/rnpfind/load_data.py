@@ -25,90 +25,681 @@ the template RNA as determined experimentally by postar:
 
 big_storage['postar']['HNRNPC']
 
+The annotations of the binding sites of each data source are stored once, in
+the AnnotationTable big_storage[source].annotation_table, and binding sites are
+annotated with ids of rows in that table.
+
 """
 
 import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
 
+from .annotation_table import AnnotationTable
 from .bind_analysis import BindingSites, Storage
 from .config import (
     ANNOTATION_COLUMN_DELIMITER,
     ANNOTATION_ROW_DELIMITER,
     EXPERIMENTAL_BINDING_SITE_ACCEPTABLE_COVERAGE_RATIO,
 )
-from .data_load_functions import data_load_sources_functions
+from .coverage_collapse import ASCENDING_STARTS, CoverageCollapser
+from .data_load_functions import (
+    data_load_sources_functions,
+    data_load_sources_max_site_lengths,
+    data_load_sources_site_orders,
+    io_bound_data_load_sources,
+    uncached_data_load_sources,
+)
 from .merge_annotation_funcs import generate_merge_func
+from .result_cache import (
+    cache_scanned_batches,
+    cache_storage,
+    join_batches,
+    load_cached_storage,
+    load_sliced_batches,
+    shift_batch,
+    sub_region,
+)
+from .site_batch import batch_sites
+from .site_table import SiteTable
 
 
-def load_data(data_load_sources, rna_info: dict):
+def collect_data(data_load_source, rna_info):
     """
-    Goes over a list of data sources of interest for a particular RNA and
-    populates a Storage instance (for each of the data sources) with binding
-    sites obtained from the data source. Returns a big_storage variable that
-    maps data sources to storage variables that store binding data retrieved
-    from the data source.
+    Runs the data loading function of a data source, and returns the binding
+    sites it gives as a list of SiteBatch instances.
 
-    :param data_load_sources: a list containing data sources, such as 'rbpdb',
-        'postar', etc.
+    :param data_load_source: a data source, such as 'rbpdb', 'postar', etc.
     :param rna_info: dict: a dictionary consisting of information about the RNA
         of interest, such as its name and genomic location.
-    :returns: a dictionary mapping data load source to a Storage instance
-        containing binding sites obtained from that data source.
 
     """
+    load_func = data_load_sources_functions[data_load_source]
+    return list(batch_sites(load_func(rna_info)))
 
-    big_storage = {}
-    for data_load_source in data_load_sources:
-        print(
-            f"Loading binding sites from {data_load_source}", file=sys.stderr
+
+def data_chunks(data_load_source, rna_info, chunk_length=None):
+    """
+    Returns the parts of an RNA that a scanning data source (see
+    data_load_sources_max_site_lengths) is loaded for one at a time, as a list
+    of (start, end) positions on the RNA (0-based, end exclusive), or None if
+    the data source is to be loaded for the RNA as a whole.
+
+    A chunk starts every chunk_length bases, and runs on for max_site_length
+    - 1 bases into the next chunk, so that every binding site lies wholly
+    within the chunk it starts in (see stitch_chunks()).
+
+    :param data_load_source: a data source, such as 'rbpdb', 'postar', etc.
+    :param rna_info: dict: a dictionary consisting of information about the RNA
+        of interest, such as its name and genomic location.
+    :param chunk_length: the number of bases a chunk starts after the one
+        before it. If None, no data source is split. (Default value = None)
+
+    """
+    if (
+        chunk_length is None
+        or data_load_source not in data_load_sources_max_site_lengths
+        or data_load_source in io_bound_data_load_sources
+    ):
+        return None
+    if chunk_length < 1:
+        raise ValueError("The length of chunks must be at least 1")
+
+    length = rna_info["end_coord"] - rna_info["start_coord"] + 1
+    if length <= chunk_length:
+        return None
+    max_site_length = data_load_sources_max_site_lengths[data_load_source]()
+    return [
+        (start, min(length, start + chunk_length + max_site_length - 1))
+        for start in range(0, length, chunk_length)
+    ]
+
+
+def collect_chunk(data_load_source, rna_info, chunk):
+    """
+    Runs the data loading function of a data source on a chunk of an RNA (see
+    data_chunks()), and returns the binding sites it gives as a list of
+    SiteBatch instances. The positions of the sites are on the chunk.
+
+    :param data_load_source: a data source, such as 'rbpdb', 'postar', etc.
+    :param rna_info: dict: a dictionary consisting of information about the RNA
+        of interest, such as its name and genomic location.
+    :param chunk: the (start, end) positions of the chunk on the RNA
+
+    """
+    return collect_data(data_load_source, sub_region(rna_info, *chunk))
+
+
+def stitch_chunks(chunks, chunk_batches):
+    """
+    Returns the binding sites found on the chunks of an RNA (see
+    data_chunks()) as the list of SiteBatch instances the data source would
+    give for the whole RNA, or None if the chunks do not fit together.
+
+    Each site is taken from the chunk it starts in, before the next chunk
+    starts; as it is no longer than max_site_length, it is found there
+    whole. Sites found in the overlap with the next chunk are found again
+    there, so they are left out.
+
+    :param chunks: the (start, end) positions of the chunks on the RNA, in
+        order
+    :param chunk_batches: for each chunk, the list of SiteBatch instances
+        found on it (see collect_chunk())
+
+    """
+    if any(not batches for batches in chunk_batches):
+        # The data source gives nothing for part of the RNA, and so nothing
+        # for the RNA either
+        return []
+
+    first_batches = chunk_batches[0]
+    if any(
+        len(batches) != len(first_batches)
+        or any(
+            (batch.rbps, batch.annotations)
+            != (first_batch.rbps, first_batch.annotations)
+            for batch, first_batch in zip(batches, first_batches)
         )
+        for batches in chunk_batches
+    ):
+        # The data source does not give the same chunks for every region
+        return None
+
+    next_starts = [start for start, _ in chunks[1:]] + [float("inf")]
+    stitched_batches = []
+    for i, _ in enumerate(first_batches):
+        stitched_batch = None
+        for (start, _), next_start, batches in zip(
+            chunks, next_starts, chunk_batches
+        ):
+            batch = shift_batch(
+                batches[i],
+                -start,
+                lambda site_start, _, own_length=next_start - start: (
+                    site_start < own_length
+                ),
+            )
+            stitched_batch = (
+                batch
+                if stitched_batch is None
+                else join_batches(stitched_batch, batch)
+            )
+        stitched_batches.append(stitched_batch)
+    return stitched_batches
+
+
+def collect_chunked_data(data_load_source, rna_info, chunks, chunk_batches):
+    """
+    Returns the binding sites a data source gives for an RNA, as a list of
+    SiteBatch instances, out of those found on its chunks (see
+    stitch_chunks()). If the chunks do not fit together, the RNA is loaded
+    as a whole instead.
 
-        # TODO: is the merge func still relevant?
-        merge_func = generate_merge_func(data_load_source)
+    :param data_load_source: a data source, such as 'rbpdb', 'postar', etc.
+    :param rna_info: dict: a dictionary consisting of information about the RNA
+        of interest, such as its name and genomic location.
+    :param chunks: the (start, end) positions of the chunks on the RNA, as
+        given by data_chunks()
+    :param chunk_batches: for each chunk, the list of SiteBatch instances
+        found on it
 
-        storage_space = Storage(annotation_merge_func=merge_func)
-        big_storage[data_load_source] = storage_space
-        collected_data = data_load_sources_functions[data_load_source](
-            rna_info
+    """
+    collected_data = stitch_chunks(chunks, chunk_batches)
+    if collected_data is None:
+        print(
+            f"Chunks of {data_load_source} did not match, loading it whole",
+            file=sys.stderr,
         )
+        collected_data = collect_data(data_load_source, rna_info)
+    return collected_data
 
-        for rbp, start, end, annotation in collected_data:
-            if rbp not in storage_space:
-                storage_space[rbp] = BindingSites(overlap_mode=True)
-            storage_space[rbp].add((start, end, annotation))
 
-        # Now we merge all the binding sites that overlap.
+def collect_data_concurrently(
+    data_load_sources, rna_info, jobs, source_chunks=None
+):
+    """
+    Starts the data loading functions of several data sources at once: those
+    of I/O bound data sources on a thread, and the others on worker
+    processes. Returns a dictionary mapping each data source to a list of
+    Futures, one per chunk the data source is loaded in (see data_chunks()),
+    or just one if it is loaded whole. Each holds the binding sites given by
+    the data loading function (as a list of SiteBatch instances). The
+    executors that run them are returned too (to be shut down by the caller).
 
-        # TODO: fix the implementation of overlap_collapse so annotations are
-        # not lost
+    :param data_load_sources: a list containing data sources, such as 'rbpdb',
+        'postar', etc.
+    :param rna_info: dict: a dictionary consisting of information about the RNA
+        of interest, such as its name and genomic location.
+    :param jobs: the maximum number of worker processes to use
+    :param source_chunks: a dictionary mapping data sources to the chunks
+        they are loaded in, as given by data_chunks(). Data sources missing
+        from it are loaded whole. (Default value = None)
 
-        if len(storage_space) == 0:
-            continue
+    """
+    io_bound_sources = [
+        source
+        for source in data_load_sources
+        if source in io_bound_data_load_sources
+    ]
+    cpu_bound_sources = [
+        source
+        for source in data_load_sources
+        if source not in io_bound_data_load_sources
+    ]
 
-        # Get max coverage
-        max_coverage = max(
-            [
-                binding_site.base_cover()
-                for rbp, binding_site in storage_space.items()
+    executors = []
+    futures = {}
+    if io_bound_sources:
+        # One thread is enough; I/O bound loaders mostly wait on the disk
+        thread_executor = ThreadPoolExecutor(max_workers=1)
+        executors.append(thread_executor)
+        for source in io_bound_sources:
+            futures[source] = [
+                thread_executor.submit(collect_data, source, rna_info)
             ]
-        )
+    if source_chunks is None:
+        source_chunks = {}
+    no_tasks = sum(
+        len(source_chunks.get(source) or [None])
+        for source in cpu_bound_sources
+    )
+    if no_tasks:
+        process_executor = ProcessPoolExecutor(max_workers=min(jobs, no_tasks))
+        executors.append(process_executor)
+        for source in cpu_bound_sources:
+            chunks = source_chunks.get(source)
+            if chunks is None:
+                futures[source] = [
+                    process_executor.submit(collect_data, source, rna_info)
+                ]
+            else:
+                futures[source] = [
+                    process_executor.submit(
+                        collect_chunk, source, rna_info, chunk
+                    )
+                    for chunk in chunks
+                ]
+
+    return futures, executors
+
+
+def rbp_site_chunks(collected_data, annotation_table):
+    """
+    Generates (rbp, sites) for the sites of each RBP in each of the chunks
+    given by the data loading function of a data source, where sites
+    generates them in the form (start, end, row id), adding their annotations
+    to an AnnotationTable.
+
+    :param collected_data: an iterable of SiteBatch instances, as given by
+        batch_sites() for the data loading function of the data source.
+    :param annotation_table: the AnnotationTable to add annotations to
+
+    """
+    for batch in collected_data:
+        if len(batch) == 0:
+            continue
+
+        # Data load functions may also give annotations in the older,
+        # delimiter-joined string format
+        row_ids = [
+            annotation_table.add(
+                annotation.split(ANNOTATION_COLUMN_DELIMITER)
+                if isinstance(annotation, str)
+                else annotation
+            )
+            for annotation in batch.annotations
+        ]
+
+        for rbp, rows in batch.rbp_rows():
+            yield rbp, (
+                (
+                    batch.starts[row],
+                    batch.ends[row],
+                    row_ids[batch.annotation_ids[row]],
+                )
+                for row in rows
+            )
+
+
+def populate_storage(data_load_source, collected_data, site_order=None):
+    """
+    Makes a Storage instance out of the binding sites given by the data loading
+    function of a data source, merging the binding sites of each RBP that
+    overlap.
+
+    :param data_load_source: a data source, such as 'rbpdb', 'postar', etc.
+    :param collected_data: an iterable of SiteBatch instances, as given by
+        batch_sites() for the data loading function of the data source.
+    :param site_order: if the sites of each RBP are given sorted, the order
+        they are sorted in (ASCENDING_STARTS or DESCENDING_ENDS). The sites
+        are then collapsed while they come in, by a CoverageCollapser for each
+        RBP, rather than all kept until the end. (Default value = None)
 
-        # Filter the allowed amount
-        allowed_coverage = (
-            EXPERIMENTAL_BINDING_SITE_ACCEPTABLE_COVERAGE_RATIO * max_coverage
+    """
+    # TODO: is the merge func still relevant?
+    merge_func = generate_merge_func(data_load_source)
+
+    annotation_table = AnnotationTable()
+    storage_space = Storage(
+        annotation_merge_func=merge_func,
+        annotation_table=annotation_table,
+    )
+
+    # The sites of each RBP are either gathered from all the chunks first, so
+    # they can be stored in one go, or handed to its CoverageCollapser. The
+    # depth of each base is only needed if some bases may be cut off.
+    keep_depth_runs = EXPERIMENTAL_BINDING_SITE_ACCEPTABLE_COVERAGE_RATIO < 1
+    rbp_sites = {}
+    for rbp, sites in rbp_site_chunks(collected_data, annotation_table):
+        if rbp not in rbp_sites:
+            rbp_sites[rbp] = (
+                []
+                if site_order is None
+                else CoverageCollapser(
+                    site_order,
+                    keep_depth_runs=keep_depth_runs,
+                    annotation_merger=AnnotationTable.merge,
+                )
+            )
+        if site_order is None:
+            rbp_sites[rbp].extend(sites)
+        else:
+            rbp_sites[rbp].add_many(sites)
+
+    if site_order is not None:
+        return collapsed_storage(storage_space, rbp_sites)
+
+    for rbp, sites in rbp_sites.items():
+        if rbp not in storage_space:
+            storage_space[rbp] = BindingSites(overlap_mode=True)
+        storage_space[rbp].add_many(sites)
+
+    # Now we merge all the binding sites that overlap.
+
+    # TODO: fix the implementation of overlap_collapse so annotations are
+    # not lost
+
+    if len(storage_space) == 0:
+        return storage_space
+
+    # Get max coverage
+    max_coverage = max(
+        [
+            binding_site.base_cover()
+            for rbp, binding_site in storage_space.items()
+        ]
+    )
+
+    # Filter the allowed amount
+    allowed_coverage = (
+        EXPERIMENTAL_BINDING_SITE_ACCEPTABLE_COVERAGE_RATIO * max_coverage
+    )
+
+    for binding_site in storage_space.values():
+        binding_site.overlap_collapse(
+            "baseCoverNumber",
+            allowed_coverage,
+            in_place=True,
+            annotation_merger=AnnotationTable.merge,
         )
 
-        for binding_site in storage_space.values():
-            binding_site.overlap_collapse(
-                "baseCoverNumber",
-                allowed_coverage,
-                in_place=True,
-                annotation_merger=ANNOTATION_ROW_DELIMITER.join,
+    return storage_space
+
+
+def collapsed_storage(storage_space, collapsers):
+    """
+    Fills a Storage instance with the binding sites collapsed by the
+    CoverageCollapser of each RBP, cutting off bases the same way as
+    populate_storage() does when it collapses stored sites.
+
+    :param storage_space: an empty Storage instance
+    :param collapsers: a dictionary mapping RBPs to CoverageCollapser
+        instances that were given all of their sites
+
+    """
+    for rbp, sites in collapse_sites(collapsers).items():
+        storage_space[rbp] = BindingSites.from_sites(sites)
+
+    return storage_space
+
+
+def collapse_sites(collapsers):
+    """
+    Returns the binding sites collapsed by the CoverageCollapser of each RBP,
+    cutting off bases the same way as populate_storage() does when it
+    collapses stored sites.
+
+    :param collapsers: a dictionary mapping RBPs to CoverageCollapser
+        instances that were given all of their sites
+    :returns: a dictionary mapping the same RBPs to lists of their collapsed
+        sites, sorted
+
+    """
+    if not collapsers:
+        return {}
+
+    for collapser in collapsers.values():
+        collapser.finish()
+
+    max_coverage = max(
+        collapser.base_cover() for collapser in collapsers.values()
+    )
+    allowed_coverage = (
+        EXPERIMENTAL_BINDING_SITE_ACCEPTABLE_COVERAGE_RATIO * max_coverage
+    )
+
+    return {
+        rbp: collapser.collapse(allowed_coverage)
+        for rbp, collapser in collapsers.items()
+    }
+
+
+def populate_site_table(
+    site_table, data_load_source, collected_data, site_order=None
+):
+    """
+    Adds the binding sites given by the data loading function of a data
+    source to a SiteTable, merged as populate_storage() merges them. The
+    columns of the table are filled straight from the chunks of sites, which
+    are collapsed by a CoverageCollapser for each RBP rather than stored in
+    BindingSites instances first.
+
+    :param site_table: the SiteTable to add the sites to
+    :param data_load_source: a data source, such as 'rbpdb', 'postar', etc.
+    :param collected_data: an iterable of SiteBatch instances, as given by
+        batch_sites() for the data loading function of the data source.
+    :param site_order: if the sites of each RBP are given sorted, the order
+        they are sorted in (ASCENDING_STARTS or DESCENDING_ENDS). Otherwise,
+        the coordinates of the sites of each RBP are gathered and sorted
+        before they are collapsed. (Default value = None)
+
+    """
+    annotation_table = AnnotationTable()
+    keep_depth_runs = EXPERIMENTAL_BINDING_SITE_ACCEPTABLE_COVERAGE_RATIO < 1
+    collapsers = {}
+    # The starts, ends and annotation row ids of the sites of each RBP, if
+    # they have to be sorted first
+    rbp_columns = {}
+    for rbp, sites in rbp_site_chunks(collected_data, annotation_table):
+        if rbp not in collapsers:
+            collapsers[rbp] = CoverageCollapser(
+                site_order or ASCENDING_STARTS,
+                keep_depth_runs=keep_depth_runs,
+                annotation_merger=AnnotationTable.merge,
+            )
+            rbp_columns[rbp] = ([], [], [])
+        if site_order is None:
+            starts, ends, row_ids = rbp_columns[rbp]
+            for start, end, row_id in sites:
+                starts.append(start)
+                ends.append(end)
+                row_ids.append(row_id)
+        else:
+            collapsers[rbp].add_many(sites)
+
+    if site_order is None:
+        for rbp, (starts, ends, row_ids) in rbp_columns.items():
+            order = np.argsort(np.array(starts, dtype=np.int64), kind="stable")
+            collapsers[rbp].add_many(
+                (starts[row], ends[row], row_ids[row])
+                for row in order.tolist()
             )
 
+    site_table.add_source(
+        data_load_source,
+        (
+            (rbp, sites, False)
+            for rbp, sites in collapse_sites(collapsers).items()
+        ),
+        annotation_merge_func=generate_merge_func(data_load_source),
+        annotation_table=annotation_table,
+    )
+
+
+def load_data(
+    data_load_sources,
+    rna_info: dict,
+    jobs=1,
+    cache_dir=None,
+    chunk_length=None,
+    as_site_table=False,
+):
+    """
+    Goes over a list of data sources of interest for a particular RNA and
+    populates a Storage instance (for each of the data sources) with binding
+    sites obtained from the data source. Returns a big_storage variable that
+    maps data sources to storage variables that store binding data retrieved
+    from the data source.
+
+    :param data_load_sources: a list containing data sources, such as 'rbpdb',
+        'postar', etc.
+    :param rna_info: dict: a dictionary consisting of information about the RNA
+        of interest, such as its name and genomic location.
+    :param jobs: if more than 1, the data sources are loaded concurrently,
+        using up to this many worker processes. The result is the same either
+        way. (Default value = 1)
+    :param cache_dir: if given, the binding sites loaded from each data source
+        are cached in this directory (see result_cache.py), and taken from
+        there whenever the same region is loaded again (or, for data sources
+        that scan the RNA, a region overlapping a cached one).
+        (Default value = None)
+    :param chunk_length: if given, data sources that scan the RNA are loaded
+        for chunks of about this many bases at a time (over up to jobs worker
+        processes), which are then stitched back together (see
+        data_chunks()). The result is the same either way.
+        (Default value = None)
+    :param as_site_table: if True, the binding sites are returned as a
+        SiteTable instead, whose columns are filled straight from the chunks
+        of binding sites loaded (see populate_site_table()). Its
+        group_by_source() view holds the same Storage instances as the
+        dictionary returned otherwise. (Default value = False)
+    :returns: a dictionary mapping data load source to a Storage instance
+        containing binding sites obtained from that data source, or a
+        SiteTable if as_site_table is set.
+
+    """
+    cached_sources = [
+        data_load_source
+        for data_load_source in data_load_sources
+        if cache_dir is not None
+        and data_load_source not in uncached_data_load_sources
+    ]
+    cached_storages = {}
+    sliced_data = {}
+    for data_load_source in cached_sources:
+        storage = load_cached_storage(data_load_source, rna_info, cache_dir)
+        if storage is not None:
+            cached_storages[data_load_source] = storage
+        elif data_load_source in data_load_sources_max_site_lengths:
+            collected_data = load_sliced_batches(
+                data_load_source,
+                rna_info,
+                cache_dir,
+                data_load_sources_max_site_lengths[data_load_source],
+                collect_data,
+            )
+            if collected_data is not None:
+                sliced_data[data_load_source] = collected_data
+
+    sources_to_load = [
+        data_load_source
+        for data_load_source in data_load_sources
+        if data_load_source not in cached_storages
+        and data_load_source not in sliced_data
+    ]
+    futures = {}
+    executors = []
+    source_chunks = {
+        data_load_source: data_chunks(data_load_source, rna_info, chunk_length)
+        for data_load_source in sources_to_load
+    }
+    if jobs > 1 and (
+        len(sources_to_load) > 1
+        or any(chunks is not None for chunks in source_chunks.values())
+    ):
+        futures, executors = collect_data_concurrently(
+            sources_to_load, rna_info, jobs, source_chunks=source_chunks
+        )
+
+    site_table = SiteTable() if as_site_table else None
+    try:
+        big_storage = {}
+        # Sources are taken in order, however soon their data comes in
+        for data_load_source in data_load_sources:
+            if data_load_source in cached_storages:
+                print(
+                    f"Loading binding sites from {data_load_source} (cached)",
+                    file=sys.stderr,
+                )
+                if as_site_table:
+                    site_table.add_storage(
+                        data_load_source, cached_storages[data_load_source]
+                    )
+                else:
+                    big_storage[data_load_source] = cached_storages[
+                        data_load_source
+                    ]
+                continue
+
+            print(
+                f"Loading binding sites from {data_load_source}",
+                file=sys.stderr,
+            )
+            chunks = source_chunks.get(data_load_source)
+            if data_load_source in sliced_data:
+                collected_data = sliced_data[data_load_source]
+            elif chunks is not None:
+                if data_load_source in futures:
+                    chunk_batches = [
+                        future.result() for future in futures[data_load_source]
+                    ]
+                else:
+                    chunk_batches = [
+                        collect_chunk(data_load_source, rna_info, chunk)
+                        for chunk in chunks
+                    ]
+                collected_data = collect_chunked_data(
+                    data_load_source, rna_info, chunks, chunk_batches
+                )
+            elif data_load_source in futures:
+                (future,) = futures[data_load_source]
+                collected_data = future.result()
+            else:
+                load_func = data_load_sources_functions[data_load_source]
+                collected_data = batch_sites(load_func(rna_info))
+
+            if (
+                data_load_source in cached_sources
+                and data_load_source in data_load_sources_max_site_lengths
+            ):
+                # Kept as found, for regions overlapping this one
+                collected_data = list(collected_data)
+                cache_scanned_batches(
+                    data_load_source, rna_info, collected_data, cache_dir
+                )
+
+            site_order = None
+            if data_load_source in data_load_sources_site_orders:
+                site_order = data_load_sources_site_orders[data_load_source](
+                    rna_info
+                )
+            if as_site_table:
+                populate_site_table(
+                    site_table,
+                    data_load_source,
+                    collected_data,
+                    site_order=site_order,
+                )
+                if data_load_source in cached_sources:
+                    # The collapsed sites are cached as a Storage instance
+                    storage = site_table.storage(data_load_source)
+            else:
+                storage = populate_storage(
+                    data_load_source, collected_data, site_order=site_order
+                )
+                big_storage[data_load_source] = storage
+            if data_load_source in cached_sources:
+                cache_storage(
+                    data_load_source,
+                    rna_info,
+                    storage,
+                    cache_dir,
+                )
+    finally:
+        # Only does anything if loading a data source failed
+        for source_futures in futures.values():
+            for future in source_futures:
+                future.cancel()
+        for executor in executors:
+            executor.shutdown()
+
+    if as_site_table:
+        return site_table
     return big_storage
 
 
-def annotation_to_columns(annotation):
+def annotation_to_columns(annotation, annotation_table=None):
     """
     Defines an annotation-to-columns conversion function for UCSC visualization
     data analysis function. This function takes an annotation as input and
@@ -116,12 +707,21 @@ def annotation_to_columns(annotation):
     of a binding site as a table.
 
     :param annotation: input annotation from a binding site.
+    :param annotation_table: the AnnotationTable that the annotation refers to
+        rows of. If None, the annotation is taken to be a string, with rows
+        and columns joined by ANNOTATION_ROW_DELIMITER and
+        ANNOTATION_COLUMN_DELIMITER. (Default value = None)
 
     """
 
-    rows = annotation.split(ANNOTATION_ROW_DELIMITER)
-    array = [tuple(r.split(ANNOTATION_COLUMN_DELIMITER)) for r in rows]
-    array = list(set(array))
+    if annotation_table is None:
+        rows = annotation.split(ANNOTATION_ROW_DELIMITER)
+        array = [tuple(r.split(ANNOTATION_COLUMN_DELIMITER)) for r in rows]
+    else:
+        array = annotation_table.get_rows(annotation)
+    # Duplicate rows are dropped in the order rows first appear in, rather
+    # than in set order, which depends on the hash seed of the process
+    array = list(dict.fromkeys(array))
     len_row = len(array[0])
     no_of_rows = len(array)
 
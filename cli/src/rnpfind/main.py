@@ -42,10 +42,14 @@ functions that you may be interested in contributing, check out
 
 
 import argparse
+import csv
 import os
+import re
 import shutil
 import sys
+import time
 import urllib.request
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
@@ -55,10 +59,11 @@ from tqdm import tqdm
 # interaction data to get a useful output:
 from .analysis_functions import (
     analysis_method_functions,
-    analysis_methods_supported_short,
+    analysis_methods_default,
 )
 from .config import (
     DEFAULT_BASE_STRINGENCY,
+    RESULT_CACHE_PATH,
     RO_DATA_PATH,
     RO_DATA_TAR_NAME,
     RO_DATA_URL,
@@ -68,9 +73,27 @@ from .data_load_functions import data_load_sources_supported_short
 # Responsible for managing the loading of RNA-RBP interaction data:
 from .load_data import load_data
 
+# Runs the analysis methods, at the same time if there are processes to spare:
+from .output_scheduler import OutputTask, run_output_tasks
+
 # Functions that help with interacting with the user to get their preference:
 from .user_input import get_user_rna_preference
 
+# File written in the output directory in batch mode, with one row per
+# transcript saying how its analysis went
+MANIFEST_FILE_NAME = "manifest.tsv"
+MANIFEST_COLUMNS = [
+    "transcript",
+    "name",
+    "region",
+    "status",
+    "rbps",
+    "sites",
+    "seconds",
+    "out_dir",
+    "error",
+]
+
 
 def rm_folder_contents(folder):
     """
@@ -152,28 +175,12 @@ def download_ro_data():
     print("Done!", file=sys.stderr)
 
 
-def rnpfind(
-    transcript,
-    sources=None,
-    methods=None,
-    base_stringency=None,
-    out_dir=None,
-    is_trackhub=False,
-    is_trackhub_only=False,
-):
+def check_ro_data():
     """
-    Collect binding data of RBPs on RNA.
+    Downloads the read-only data needed for rnpfind, unless the ro-data
+    directory exists already.
 
-      :param transcript: gene name or genomic location to specify transcript
-      :param sources: list of data sources to limit to for data collection
-      :param methods: list of output formats to restrict to
-      :param base_stringency: config option for csv output method
-      :param out_dir: directory to write output files in
-      :param is_trackhub: whether to generate trakchub structure
-      :param is_trackhub_only: wheter to delete BED files in the end
     """
-
-    # First, check if readonly data directory exists
     if not Path(RO_DATA_PATH).is_dir():
         # We assume that if the dir exists the data is fine; otherwise
         # the data needs to be downloaded
@@ -183,9 +190,55 @@ def rnpfind(
         print("Downloading data necessary for rnpfind...", file=sys.stderr)
         download_ro_data()
 
-    # Start by getting the transcript of interest to analyze
-    # Coordinates are 1-based, fully closed.
-    rna_info: dict = get_user_rna_preference(transcript)
+
+def default_out_dir(name):
+    """
+    Creates and returns a directory named name in the current working
+    directory, with the current date and time appended to its name if a
+    directory by that name exists already.
+
+    :param name: name of the directory to create
+
+    """
+    default_path = Path.cwd() / name
+
+    while default_path.is_dir():
+        # The default path already exists, append the folder name with
+        # current date and time
+        time_list = datetime.now().timetuple()
+        time_list = [str(x) for x in time_list]
+        time_date = "-".join(time_list[0:6])  # year to seconds
+        default_path = default_path.parent / f"{default_path.name}-{time_date}"
+
+    default_path.mkdir(parents=True)
+    return str(default_path)
+
+
+def analyse_rna(
+    rna_info,
+    sources=None,
+    methods=None,
+    base_stringency=None,
+    out_dir=None,
+    is_trackhub=False,
+    is_trackhub_only=False,
+    is_sparse=False,
+    jobs=1,
+    main_rbp=None,
+    use_cache=True,
+    chunk_length=None,
+    is_single_track=False,
+):
+    """
+    Collect binding data of RBPs on an RNA molecule whose location on the
+    genome is known. See rnpfind() for the parameters other than rna_info.
+
+      :param rna_info: a dictionary containing the official name of the RNA,
+        along with its chromosome number, start and end coordinates (1-based,
+        fully closed) and strand, as given by get_user_rna_preference()
+      :returns: the number of unique RBPs and the number of binding sites
+        collected
+    """
 
     # what data sources does the user want to collect data from today?
     # (e.g. attract, postar, etc.)
@@ -196,8 +249,18 @@ def rnpfind(
     # load RNA-RBP interaction data using the selected data sources on the RNA
     # molecule of interest big_storage stores data on binding sites of RBPs on
     # the RNA molecule from each data source. For more details on how
-    # big_storage is structured, consult load_data.py!
-    big_storage = load_data(data_load_sources, rna_info)
+    # big_storage is structured, consult load_data.py! The sites are loaded
+    # into a SiteTable, whose Storage instances are only built for the
+    # analysis methods that look at them.
+    site_table = load_data(
+        data_load_sources,
+        rna_info,
+        jobs=jobs,
+        cache_dir=RESULT_CACHE_PATH if use_cache else None,
+        chunk_length=chunk_length,
+        as_site_table=True,
+    )
+    big_storage = site_table.group_by_source()
 
     # BIOGRID is a database that stores information on protein-protein
     # interaction evidence in the literature from experiment. In future versions
@@ -211,15 +274,15 @@ def rnpfind(
     # interest
     no_sites = 0
     uniq_rbps = set()
-    for data_source, storage in big_storage.items():
-        no_rbp, no_site = storage.summary()
+    for data_source in site_table.sources:
+        no_rbp, no_site = site_table.summary(data_source)
         print(
             f"Collected data for {no_rbp} RBPs with {no_site}"
             f" binding sites (from {data_source})",
             file=sys.stderr,
         )
         no_sites += no_site
-        uniq_rbps.update(storage.get_rbps())
+        uniq_rbps.update(site_table.source_rbps(data_source))
 
     print(
         f"Collected data for {len(uniq_rbps)} unique RBPs with {no_sites}"
@@ -229,7 +292,7 @@ def rnpfind(
 
     # We now proceed to perform any number of analysis methods that the user
     # may wish to apply to the data obtained
-    analysis_methods = methods if methods else analysis_methods_supported_short
+    analysis_methods = methods if methods else analysis_methods_default
 
     if out_dir:
         # The user specified an out directory
@@ -238,41 +301,307 @@ def rnpfind(
         Path(out_dir).mkdir(parents=True, exist_ok=True)
     else:
         # The user did not specify an out directory
-        default_path = Path.cwd() / rna_info["official_name"].lower()
-
-        while default_path.is_dir():
-            # The default path already exists, append the folder name with
-            # current date and time
-            time_list = datetime.now().timetuple()
-            time_list = [str(x) for x in time_list]
-            time_date = "-".join(time_list[0:6])  # year to seconds
-            default_path = default_path.parent / (
-                f"{default_path.name}-{time_date}"
-            )
-
-        default_path.mkdir(parents=True)
-        out_dir = str(default_path)
+        out_dir = default_out_dir(rna_info["official_name"].lower())
 
     rm_folder_contents(out_dir)
 
+    # The analysis methods write files of their own, so they are run at the
+    # same time if there are processes to spare, sharing them out
+    method_jobs = max(1, jobs // len(analysis_methods))
+    tasks = []
     for analysis_method in analysis_methods:
         print(f"Generating {analysis_method}", file=sys.stderr)
         analysis_method_function = analysis_method_functions[analysis_method]
 
-        configs = {"out_dir": out_dir}
+        configs = {"out_dir": out_dir, "jobs": method_jobs}
         if analysis_method == "csv":
             configs["base_stringency"] = (
                 base_stringency if base_stringency else DEFAULT_BASE_STRINGENCY
             )
+            configs["sparse"] = is_sparse
         if analysis_method == "bed":
             configs["trackhub"] = is_trackhub
             configs["trackhub-only"] = is_trackhub_only
+            configs["single-track"] = is_single_track
+        if analysis_method == "sites":
+            configs["main_rbp"] = main_rbp
+
+        tasks.append(
+            OutputTask(
+                analysis_method,
+                analysis_method_function,
+                big_storage,
+                rna_info,
+                configs,
+            )
+        )
+    run_output_tasks(tasks, jobs=min(jobs, len(tasks)))
+
+    return len(uniq_rbps), no_sites
+
+
+def rnpfind(
+    transcript,
+    sources=None,
+    methods=None,
+    base_stringency=None,
+    out_dir=None,
+    is_trackhub=False,
+    is_trackhub_only=False,
+    is_sparse=False,
+    jobs=1,
+    main_rbp=None,
+    use_cache=True,
+    chunk_length=None,
+    is_single_track=False,
+):
+    """
+    Collect binding data of RBPs on RNA.
+
+      :param transcript: gene name or genomic location to specify transcript
+      :param sources: list of data sources to limit to for data collection
+      :param methods: list of output formats to restrict to
+      :param base_stringency: config option for csv output method (an int,
+        or a list of ints to generate one csv file per value)
+      :param out_dir: directory to write output files in
+      :param is_trackhub: whether to generate trakchub structure
+      :param is_trackhub_only: wheter to delete BED files in the end
+      :param is_sparse: whether to write csv output in (sparse) long format,
+        only evaluating RBPs that bind close to each other
+      :param jobs: number of worker processes used to load the data sources
+        and to compute the csv output
+      :param main_rbp: RBP of interest for the sites output method; if not
+        given, the sites of every RBP are analysed
+      :param use_cache: whether to reuse the binding sites loaded when the
+        same transcript was last analysed (and to cache them if it was not)
+      :param chunk_length: if given, transcripts longer than this many bases
+        are scanned for motifs in overlapping chunks, over up to jobs worker
+        processes (the binding sites found are the same)
+      :param is_single_track: whether to write the binding sites of all RBPs
+        from a data source into one BED file (and trackhub track, filtered by
+        RBP), rather than one per RBP
+    """
+
+    # First, check if readonly data directory exists
+    check_ro_data()
+
+    # Start by getting the transcript of interest to analyze
+    # Coordinates are 1-based, fully closed.
+    rna_info: dict = get_user_rna_preference(transcript)
 
-        analysis_method_function(big_storage, rna_info, configs=configs)
+    analyse_rna(
+        rna_info,
+        sources,
+        methods,
+        base_stringency,
+        out_dir,
+        is_trackhub,
+        is_trackhub_only,
+        is_sparse,
+        jobs,
+        main_rbp,
+        use_cache,
+        chunk_length,
+        is_single_track,
+    )
 
     print("Done!", file=sys.stderr)
 
 
+def read_batch_file(batch_file):
+    """
+    Reads the transcripts to analyse in batch mode from a file with one gene
+    name or genomic location per line. Blank lines, lines starting with '#'
+    and transcripts given more than once are skipped; transcripts count as the
+    same if their output directories would be (see batch_dir_name()), e.g.
+    Malat1 and MALAT1.
+
+    :param batch_file: path to the file to read
+    :returns: a list of transcripts, in the order they are given
+
+    """
+    transcripts = {}
+    with open(batch_file) as handle:
+        for line in handle:
+            transcript = line.strip()
+            if not transcript or transcript.startswith("#"):
+                continue
+            transcripts.setdefault(batch_dir_name(transcript), transcript)
+    return list(transcripts.values())
+
+
+def batch_dir_name(transcript):
+    """
+    Returns the name of the directory in which the output files of a
+    transcript are written in batch mode (e.g. 'malat1' for Malat1 and
+    '5_4000-14000' for 5:4000-14000).
+
+    :param transcript: gene name or genomic location of the transcript
+
+    """
+    return re.sub(r"[^\w.-]+", "_", transcript).lower()
+
+
+def analyse_batch_rna(transcript, rna_info, out_dir, options):
+    """
+    Runs analyse_rna() on one transcript of a batch, and returns its row of
+    the batch manifest. Errors are recorded in the manifest rather than
+    raised, so that the other transcripts of the batch are still analysed.
+
+    :param transcript: gene name or genomic location of the transcript
+    :param rna_info: the location of the transcript on the genome, as given by
+        get_user_rna_preference()
+    :param out_dir: directory to write the output files of the transcript in
+    :param options: keyword arguments passed on to analyse_rna()
+
+    """
+    start_time = time.perf_counter()
+    row = {
+        "transcript": transcript,
+        "name": rna_info["official_name"],
+        "region": f"{rna_info['chr_n']}:{rna_info['start_coord']}"
+        f"-{rna_info['end_coord']}({rna_info['strand']})",
+        "out_dir": out_dir,
+    }
+    try:
+        no_rbps, no_sites = analyse_rna(rna_info, out_dir=out_dir, **options)
+    except Exception as error:  # pylint: disable=broad-except
+        print(f"Failed to analyse {transcript}: {error!r}", file=sys.stderr)
+        row.update(status="failed", error=repr(error))
+    else:
+        row.update(status="done", rbps=no_rbps, sites=no_sites)
+    row["seconds"] = f"{time.perf_counter() - start_time:.2f}"
+    return row
+
+
+def rnpfind_batch(
+    transcripts,
+    sources=None,
+    methods=None,
+    base_stringency=None,
+    out_dir=None,
+    is_trackhub=False,
+    is_trackhub_only=False,
+    is_sparse=False,
+    jobs=1,
+    main_rbp=None,
+    use_cache=True,
+    chunk_length=None,
+    is_single_track=False,
+):
+    """
+    Collect binding data of RBPs on several RNA molecules. The output files of
+    each are written in a directory of their own under out_dir (named by
+    batch_dir_name()), and a summary of how the analysis of each went is
+    written to MANIFEST_FILE_NAME in out_dir. No two transcripts may have the
+    same directory (e.g. Malat1 and MALAT1), as read_batch_file() makes sure.
+
+    All transcripts are looked up before any is analysed, so that a
+    misspelled gene name is reported straight away. Transcripts are then
+    analysed over up to jobs worker processes, one transcript per process at a
+    time; the data loaded once by a process (e.g. motif matrices) is kept for
+    the next transcript it analyses, and the binding sites cached by one
+    process (see result_cache.py) can be used by all of them.
+
+      :param transcripts: list of gene names or genomic locations
+      :param out_dir: directory to write output files in
+      :param jobs: number of worker processes over which the transcripts are
+        analysed. If only one transcript is to be analysed, its data sources
+        are loaded and its csv output is computed over this many processes
+        instead.
+      :returns: the rows of the batch manifest, one per transcript
+
+    See rnpfind() for the other parameters.
+    """
+    dir_names = [batch_dir_name(transcript) for transcript in transcripts]
+    if len(set(dir_names)) < len(dir_names):
+        raise ValueError(
+            "Transcripts of a batch must be written to different directories,"
+            " but these are not: "
+            + ", ".join(
+                transcript
+                for transcript, dir_name in zip(transcripts, dir_names)
+                if dir_names.count(dir_name) > 1
+            )
+        )
+
+    check_ro_data()
+
+    if not out_dir:
+        out_dir = default_out_dir("rnpfind-batch")
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+
+    rows = [None] * len(transcripts)
+    to_analyse = []
+    for i, transcript in enumerate(transcripts):
+        try:
+            rna_info = get_user_rna_preference(transcript)
+        # get_user_rna_preference() exits if the transcript is not found,
+        # after saying why
+        # pylint: disable-next=broad-except
+        except (Exception, SystemExit) as error:
+            rows[i] = {
+                "transcript": transcript,
+                "status": "not found",
+                "error": repr(error),
+            }
+            continue
+        gene_out_dir = str(Path(out_dir) / batch_dir_name(transcript))
+        to_analyse.append((i, transcript, rna_info, gene_out_dir))
+
+    options = {
+        "sources": sources,
+        "methods": methods,
+        "base_stringency": base_stringency,
+        "is_trackhub": is_trackhub,
+        "is_trackhub_only": is_trackhub_only,
+        "is_sparse": is_sparse,
+        "main_rbp": main_rbp,
+        "use_cache": use_cache,
+        "chunk_length": chunk_length,
+        "is_single_track": is_single_track,
+    }
+    if jobs > 1 and len(to_analyse) > 1:
+        with ProcessPoolExecutor(
+            max_workers=min(jobs, len(to_analyse))
+        ) as executor:
+            futures = [
+                (
+                    i,
+                    executor.submit(
+                        analyse_batch_rna,
+                        transcript,
+                        rna_info,
+                        gene_out_dir,
+                        dict(options, jobs=1),
+                    ),
+                )
+                for i, transcript, rna_info, gene_out_dir in to_analyse
+            ]
+            for i, future in futures:
+                rows[i] = future.result()
+    else:
+        for i, transcript, rna_info, gene_out_dir in to_analyse:
+            rows[i] = analyse_batch_rna(
+                transcript, rna_info, gene_out_dir, dict(options, jobs=jobs)
+            )
+
+    with open(Path(out_dir) / MANIFEST_FILE_NAME, "w", newline="") as handle:
+        writer = csv.DictWriter(
+            handle, MANIFEST_COLUMNS, delimiter="\t", restval=""
+        )
+        writer.writeheader()
+        writer.writerows(rows)
+
+    no_done = sum(row["status"] == "done" for row in rows)
+    print(
+        f"Done! Analysed {no_done} of {len(rows)} transcripts (see"
+        f" {Path(out_dir) / MANIFEST_FILE_NAME})",
+        file=sys.stderr,
+    )
+    return rows
+
+
 def main():
     """
     main function responsible for parsing commandline args
@@ -284,14 +613,25 @@ def main():
         add_help=False,
         description="Get binding sites of RBPs on a given transcript",
     )
-    parser.add_argument(
+    transcript_group = parser.add_mutually_exclusive_group(required=True)
+    transcript_group.add_argument(
         "transcript",
+        nargs="?",
         help="Specify with the name of a gene (e.g. 'Malat1')"
         " or as hg38 chromosome coordinates given as"
         " <chr_no>:<start_coord>-<end_coord> (e.g. 5:4000-14000)"
         ". Note that chromosome number is X, Y, M(T), or a number between"
         " 1 and 22",
     )
+    transcript_group.add_argument(
+        "--batch",
+        metavar="<file>",
+        help="Analyse every transcript listed in a file instead, given one"
+        " per line as a gene name or as chromosome coordinates. The output"
+        " files of each are written in a folder of their own within the"
+        " output directory, along with a summary of each analysis in"
+        f" {MANIFEST_FILE_NAME}.",
+    )
     parser.add_argument(
         "-h",
         "--help",
@@ -324,17 +664,77 @@ def main():
         metavar=("<format 1>", "<format 2>"),
         help="Choose format(s) to store binding site data in. Pick any"
         f" non-empty subset from {{{', '.join(out_formats)}}}."
-        " If unspecified, all formats are created in the output directory.",
+        " If unspecified, the formats"
+        f" {{{', '.join(analysis_methods_default)}}} are created in the"
+        " output directory.",
     )
     parser.add_argument(
         "-b",
         "--base-stringency",
         type=int,
+        nargs="+",
         help="The number of bases beween two RBP-binding-sites before they"
         " are considered to be competing (used only for csv output format)."
-        f" The default value is {DEFAULT_BASE_STRINGENCY}.",
+        " Several values may be given, in which case a csv file is generated"
+        f" for each. The default value is {DEFAULT_BASE_STRINGENCY}.",
         metavar="<N>",
-        default=DEFAULT_BASE_STRINGENCY,
+        default=[DEFAULT_BASE_STRINGENCY],
+    )
+    parser.add_argument(
+        "--sparse",
+        action="store_true",
+        help="If specified, only pairs of RBPs that bind close to each other"
+        " are evaluated, and their correlations are written in long format"
+        " (one row per pair of RBPs; used only for csv output format)",
+        default=False,
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="The number of processes over which the data sources are loaded,"
+        " the output formats are written (along with the files of each data"
+        " source, for bed output format) and the correlations between RBPs"
+        " are computed (for csv output format), or over which the"
+        " transcripts are analysed in batch mode. The default value is 1.",
+        metavar="<N>",
+        default=1,
+    )
+    parser.add_argument(
+        "-r",
+        "--main-rbp",
+        help="An RBP of interest. The binding sites of other RBPs around each"
+        " of its binding sites are listed, along with whether they are likely"
+        " to be competing or cooperating with it (used only for sites output"
+        " format). If unspecified, this is done for the sites of every RBP.",
+        metavar="<RBP>",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="If specified, binding sites are loaded from the data sources"
+        " even if the same transcript was analysed before, and are not"
+        " cached for next time",
+        default=False,
+    )
+    parser.add_argument(
+        "-c",
+        "--chunk-length",
+        type=int,
+        help="If specified, transcripts longer than N bases are scanned for"
+        " motifs (by rbpdb and attract) in overlapping chunks of about N"
+        " bases, spread over the processes given by --jobs. The binding"
+        " sites found are the same.",
+        metavar="<N>",
+    )
+    parser.add_argument(
+        "--single-track",
+        action="store_true",
+        help="If specified, the binding sites of all RBPs from a data source"
+        " are written to one bed file, and shown as one trackhub track that"
+        " can be filtered by RBP, rather than one per RBP (only used for"
+        " 'bed' output format)",
+        default=False,
     )
     group = parser.add_mutually_exclusive_group()
     group.add_argument(
@@ -353,14 +753,24 @@ def main():
     )
 
     args = parser.parse_args()
-    rnpfind(
-        args.transcript,
+    if args.batch is None:
+        run, transcripts = rnpfind, args.transcript
+    else:
+        run, transcripts = rnpfind_batch, read_batch_file(args.batch)
+    run(
+        transcripts,
         args.sources,
         args.out_format,
         args.base_stringency,
         args.out_dir,
         args.trackhub,
         args.trackhub_only,
+        args.sparse,
+        args.jobs,
+        args.main_rbp,
+        not args.no_cache,
+        args.chunk_length,
+        args.single_track,
     )
 
 
@@ -5,10 +5,20 @@ function and file does nothing, and merging is handled in other ways.
 """
 
 
+def keep_annotations(annotations):
+    """
+    The identity function, as a function defined at the top level so that
+    Storage instances using it can be pickled
+    :param annotations: the annotations to merge
+
+    """
+    return annotations
+
+
 def generate_merge_func(_):
     """
     Returns the identity function
     :param _: the inputt paramter is ignored
 
     """
-    return lambda x: x
+    return keep_annotations
@@ -0,0 +1,92 @@
+"""
+Defines a scheduler for the steps that write output files, such as the BED
+files of each data source and the bigBed file written next to each BED file.
+
+Each step is an OutputTask, which names the steps it has to wait for. Steps
+that do not wait for each other are run at the same time on worker
+processes. Each step writes files of its own, so the files written are the
+same whether the steps are run one after the other or at the same time.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+class OutputTask:
+    """
+    A step of writing output files: a call to function with args, to be made
+    once the tasks named in after are done. The function has to be defined at
+    the top level of a module, and its arguments have to be picklable, so that
+    the call can be made on a worker process.
+
+    If given, follow_up is called (on the main process) with the value the
+    function returns, and returns a list of further OutputTask instances to
+    run, such as one per file the function wrote that is to be converted.
+    """
+
+    def __init__(self, name, function, *args, after=(), follow_up=None):
+        self.name = name
+        self.function = function
+        self.args = args
+        self.after = tuple(after)
+        self.follow_up = follow_up
+
+
+def run_output_tasks(tasks, jobs=1):
+    """
+    Runs output tasks, each once the tasks it comes after are done (along
+    with the tasks given by their follow_up). With more than one job, tasks
+    that are ready are run at the same time on up to jobs worker processes.
+    Otherwise, they are run one after the other, in the order they are given
+    in (with the tasks given by a follow_up right after the task).
+
+    :param tasks: a list of OutputTask instances, with unique names
+    :param jobs: the maximum number of worker processes to use
+        (Default value = 1)
+    :returns: a dictionary mapping the name of each task run to the value its
+        function returned
+
+    """
+    results = {}
+    pending = list(tasks)
+
+    def next_ready_task():
+        """Takes the first pending task whose tasks to wait for are done"""
+        for i, task in enumerate(pending):
+            if all(name in results for name in task.after):
+                return pending.pop(i)
+        return None
+
+    def finish(task, result):
+        """Records the result of a task, and queues its follow-up tasks"""
+        results[task.name] = result
+        if task.follow_up is not None:
+            pending[:0] = task.follow_up(result)
+
+    if jobs <= 1:
+        while pending:
+            task = next_ready_task()
+            if task is None:
+                raise ValueError(
+                    "Output tasks wait for tasks that are not given: "
+                    + ", ".join(task.name for task in pending)
+                )
+            finish(task, task.function(*task.args))
+        return results
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        running = {}
+        while pending or running:
+            task = next_ready_task()
+            while task is not None:
+                future = executor.submit(task.function, *task.args)
+                running[future] = task
+                task = next_ready_task()
+            if not running:
+                raise ValueError(
+                    "Output tasks wait for tasks that are not given: "
+                    + ", ".join(task.name for task in pending)
+                )
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                finish(running.pop(future), future.result())
+    return results
@@ -7,6 +7,8 @@ a data analysis function
 import sys
 from pathlib import Path
 
+from .proximity_matrix import sparse_f_measures_of_sites
+
 
 def generate_csv(
     symmetric_corr_table, rna_info, data_load_sources, stringency, out_dir
@@ -24,6 +26,8 @@ def generate_csv(
         'postar', 'rbpdb', etc.
     :param stringency: numerical value representing the base stingency that was
         used in analyzing the correlation coefficient.
+    :param out_dir: directory to write output files in. The CSV file is saved
+        in its csv subdirectory.
     :returns: a filepath to the saved CSV file.
 
     """
@@ -52,6 +56,47 @@ def generate_csv(
     return path_to_save
 
 
+def generate_sparse_csv(
+    sparse_corr_list, rna_info, data_load_sources, stringency, out_dir
+):
+    """
+    Given a list of binding correlations between pairs of RBPs binding to an
+    RNA molecule of interest, generates and saves a CSV file containing the
+    correlation values in long format: one row per pair of RBPs. Pairs of RBPs
+    that are not listed have a correlation of zero.
+    :param sparse_corr_list: A list of (rbp1, rbp2, correlation) tuples.
+    :param rna_info: A dictionary containing 'official_name' as key, with a
+        corresponding value that indicates the name of the RNA under
+        investigation.
+    :param data_load_sources: A list of data sources that were used, such as
+        'postar', 'rbpdb', etc.
+    :param stringency: numerical value representing the base stingency that was
+        used in analyzing the correlation coefficient.
+    :param out_dir: directory to write output files in. The CSV file is saved
+        in its csv subdirectory.
+    :returns: a filepath to the saved CSV file.
+
+    """
+    rna = rna_info["official_name"]
+
+    path_to_save = (
+        Path(out_dir)
+        / "csv"
+        / f"{rna.lower()}-{'-'.join(data_load_sources)}-{stringency}"
+        "-sparse.csv"
+    )
+
+    path_to_save.parent.mkdir(parents=True, exist_ok=True)
+    path_to_save = str(path_to_save)
+
+    with open(path_to_save, "w+") as csv_file:
+        csv_file.write("rbp1,rbp2,correlation\n")
+        for rbp1, rbp2, correlation in sparse_corr_list:
+            csv_file.write(f"{rbp1},{rbp2},{correlation}\n")
+
+    return path_to_save
+
+
 def generate_heat_map(_, rna_info, __, ___):
     """
     Function meant to generate a heatmap using correlation values.
@@ -81,12 +126,24 @@ def overall_correlation_analysis(big_storage, rna_info, configs=None):
     :param config: A dictionary of additional paramters. The following keys are
         useful:
          - 'base_stringency': specifies number of bases to consider to be
-           competing.
+           competing. May also be a list of such numbers, in which case one
+           CSV file is generated per number (per data source).
          - 'out_dir': specifies the directory to write csv files to.
+         - 'sparse': if True, only pairs of RBPs that bind close to each other
+           are evaluated, and written to a long-format csv file (one row per
+           pair of RBPs).
+         - 'jobs': the number of worker processes over which the correlations
+           are computed (1 by default).
 
     """
 
-    threshold = configs["base_stringency"]
+    thresholds = configs["base_stringency"]
+    if isinstance(thresholds, int):
+        thresholds = [thresholds]
+
+    if configs.get("sparse", False):
+        sparse_correlation_analysis(big_storage, rna_info, thresholds, configs)
+        return
 
     symmetric_corr_tables = {}
     data_load_sources = big_storage.keys()
@@ -96,21 +153,64 @@ def overall_correlation_analysis(big_storage, rna_info, configs=None):
 
         storage = big_storage[data_load_source]
 
-        symmetric_corr_table = storage.self_analysis(
-            bp_threshold=threshold, progress_feedback=False
+        # The gaps between binding sites are computed once per source, and
+        # reused for each of the thresholds
+        corr_tables = storage.self_analysis_thresholds(
+            thresholds, progress_feedback=False, jobs=configs.get("jobs", 1)
         )
-        symmetric_corr_tables[data_load_source] = symmetric_corr_table
+        symmetric_corr_tables[data_load_source] = corr_tables
         # print("Done!")
 
     # print("Creating CSV files...")
     for data_load_source in data_load_sources:
-        symmetric_corr_table = symmetric_corr_tables[data_load_source]
-        path_saved = generate_csv(
-            symmetric_corr_table,
-            rna_info,
-            [data_load_source],
-            threshold,
-            configs["out_dir"],
-        )
-        print("A file was saved at", path_saved + ".", file=sys.stderr)
+        for threshold in thresholds:
+            symmetric_corr_table = symmetric_corr_tables[data_load_source][
+                threshold
+            ]
+            path_saved = generate_csv(
+                symmetric_corr_table,
+                rna_info,
+                [data_load_source],
+                threshold,
+                configs["out_dir"],
+            )
+            print("A file was saved at", path_saved + ".", file=sys.stderr)
     # print("Done!")
+
+
+def sparse_correlation_analysis(big_storage, rna_info, thresholds, configs):
+    """
+    The sparse counterpart of overall_correlation_analysis: only pairs of RBPs
+    that bind close to each other are evaluated, and the non-zero correlations
+    are written to long-format CSV files.
+
+    :param big_storage: A dictionary keyed-in by data load source name, with
+        Storage instances as values.
+    :param rna_info: Dictionary containing key "official_name", corresponding
+        to the name of the RNA molecule of interest.
+    :param thresholds: A list of base stringencies, one CSV file is written
+        for each (per data source).
+    :param configs: A dictionary of additional paramters, as passed to
+        overall_correlation_analysis.
+
+    """
+    # A big_storage made from a SiteTable (see load_data()) lets the sites be
+    # taken from its columns, without building a Storage instance per source
+    site_table = getattr(big_storage, "site_table", None)
+    for data_load_source in big_storage:
+        if site_table is not None:
+            sparse_corr_lists = sparse_f_measures_of_sites(
+                site_table.source_columns(data_load_source), thresholds
+            )
+        else:
+            storage = big_storage[data_load_source]
+            sparse_corr_lists = storage.self_analysis_sparse(thresholds)
+        for threshold in thresholds:
+            path_saved = generate_sparse_csv(
+                sparse_corr_lists[threshold],
+                rna_info,
+                [data_load_source],
+                threshold,
+                configs["out_dir"],
+            )
+            print("A file was saved at", path_saved + ".", file=sys.stderr)
@@ -1,301 +1,176 @@
 """
-An old file that I did not integrate into RNPFind. But maybe it has potential?
-(probably not to anyone else)
+This module is dedicated to the per binding site analysis function, a data
+analysis function that lists, for each binding site of an RBP, the binding sites
+of other RBPs around it, and whether they are likely to be competing or
+cooperating with it.
+
 """
 
-# from bind_analysis import BindingSites
-from operator import itemgetter
+import sys
+from pathlib import Path
+
+from .config import COMPETITIVE_THRESHOLD_BP, COOPERATIVE_THRESHOLD_BP
+from .window_join import relation, window_join
 
-# from merge_annotation_funcs import generate_merge_func
-# import statistics  # Standard deviation mostly
-# import operator
 
-firstTwoItems = itemgetter(0, 1)
-firstItem = itemgetter(0)
-secondItem = itemgetter(1)
-thirdItem = itemgetter(2)
+def per_site_rows(
+    storage,
+    main_rbp=None,
+    competitive_threshold_bp=COMPETITIVE_THRESHOLD_BP,
+    cooperative_threshold_bp=COOPERATIVE_THRESHOLD_BP,
+):
+    """
+    Generates one row for every pair of binding sites (of two RBPs) that lie
+    within cooperative_threshold_bp bases of each other. A binding site is not
+    paired with itself.
+
+    :param storage: a Storage instance containing binding sites for RBPs
+    :param main_rbp: if specified, only sites of this RBP are paired with
+        the sites around them. Otherwise, sites of every RBP are.
+        (Default value = None)
+    :param competitive_threshold_bp: number of bases below which sites are
+        considered to be competing (Default value = COMPETITIVE_THRESHOLD_BP)
+    :param cooperative_threshold_bp: number of bases below which sites are
+        considered to be cooperating (Default value = COOPERATIVE_THRESHOLD_BP)
+    :returns: an iterator over tuples (rbp, site, nearby_rbp, nearby_site,
+        distance, relation), in order of rbp, then site, then nearby site.
+        relation is one of COMPETITIVE or COOPERATIVE.
 
+    """
+    site_index = storage.get_site_index()
+    rbps = storage.site_index_rbps
+    sites = site_index.intervals
+    labels = site_index.labels
+
+    # The sites of one RBP are paired up at a time, so that the pairs of all
+    # the RBPs are never held in memory at once
+    focal_rbps = rbps if main_rbp is None else [main_rbp]
+    for rbp in focal_rbps:
+        rbp_id = rbps.index(rbp)
+        focal_sites = list(storage[rbp])
+        for i, j, distance in window_join(
+            focal_sites, sites, bp_threshold=cooperative_threshold_bp
+        ):
+            if rbp_id == labels[j] and focal_sites[i] == sites[j]:
+                continue
+            yield (
+                rbp,
+                focal_sites[i],
+                rbps[labels[j]],
+                sites[j],
+                distance,
+                relation(
+                    distance,
+                    competitive_threshold_bp,
+                    cooperative_threshold_bp,
+                ),
+            )
+
+
+def generate_per_site_csv(
+    rows, rna_info, data_load_sources, main_rbp, out_dir
+):
+    """
+    Given rows of pairs of binding sites (as from per_site_rows()), generates
+    and saves a CSV file containing them. Coordinates are relative to the RNA
+    molecule of interest, 0-based and half-open.
+    :param rows: An iterable of (rbp, site, nearby_rbp, nearby_site, distance,
+        relation) tuples.
+    :param rna_info: A dictionary containing 'official_name' as key, with a
+        corresponding value that indicates the name of the RNA under
+        investigation.
+    :param data_load_sources: A list of data sources that were used, such as
+        'postar', 'rbpdb', etc.
+    :param main_rbp: The RBP whose sites the rows are about, or None if they
+        are about all RBPs.
+    :returns: a filepath to the saved CSV file.
 
-def per_binding_site_analysis(big_storage, rna_info):
+    """
+    rna = rna_info["official_name"]
+    rbp_suffix = f"-{main_rbp.lower()}" if main_rbp else ""
+
+    path_to_save = (
+        Path(out_dir)
+        / "sites"
+        / f"{rna.lower()}-{'-'.join(data_load_sources)}{rbp_suffix}.csv"
+    )
+
+    path_to_save.parent.mkdir(parents=True, exist_ok=True)
+    path_to_save = str(path_to_save)
+
+    with open(path_to_save, "w+") as csv_file:
+        csv_file.write(
+            "rbp,start,end,nearby_rbp,nearby_start,nearby_end,distance,"
+            "relation\n"
+        )
+        for row in rows:
+            rbp, site, nearby_rbp, nearby_site, distance, site_relation = row
+            csv_file.write(
+                ",".join(
+                    map(
+                        str,
+                        [
+                            rbp,
+                            site[0],
+                            site[1],
+                            nearby_rbp,
+                            nearby_site[0],
+                            nearby_site[1],
+                            distance,
+                            site_relation,
+                        ],
+                    )
+                )
+            )
+            csv_file.write("\n")
+
+    return path_to_save
+
+
+def per_binding_site_analysis(big_storage, rna_info, configs=None):
     """
     An analysis function that generates information on each binding site bound
     to on an RNA of interest by an RBP of interest. Information for each binding
-    site includes the binding sites of other RBPs, competitive/cooperative
-    relations, etc.
+    site includes the binding sites of other RBPs around it, their distance,
+    and competitive/cooperative relations.
 
     :param big_storage: a dictionary indexed by data sources that correspond to
         Storage instances containing binding site data extracted from said data
         source.
     :param rna_info: A dictionary containing data on RNA of interest, such as
         its name and location on the human genome.
+    :param configs: A dictionary of additional paramters. The following keys
+        are useful:
+         - 'out_dir': specifies the directory to write csv files to.
+         - 'main_rbp': the RBP of interest. If unspecified (or None), the
+           sites of every RBP are analysed.
+         - 'competitive_threshold_bp' and 'cooperative_threshold_bp': see
+           per_site_rows(). Taken from config.py if unspecified.
 
     """
-    # This function previously required these inputs
-    # bigStorage, AUF1Filter, analysis_per_binding_site_window,
-    # analysis_per_binding_site_competitive_range, analysis_sources
-
-    # Variable that comes useful later.
-    print("unimplemented for now!")
-    print(big_storage, rna_info, "", "")
-
-    # TODO:This function needs to be reconsidered with respect to RNPFind and
-    # generalized for one template
-
-    # binding_info = {}
-    #
-    # # CHECK IF THIS SELECTION IS IMPORTANT OR NOT
-    # # Is this selection important??
-    # # storageSpace = select(bigStorage,analysis_sources)
-    #
-    # # For each lncRNA, we want to analyze the AUF1 binding sites
-    # lncRNA = RNA
-    # lncRNA_storage = storageSpace
-    #
-    # print("")
-    # print("*****************")
-    # print("analysing AUF1 sites on", lncRNA + "...\n")
-    # print("*****************")
-    #
-    # # Get the RBPs that bind close to sites on AUF1
-    # filtered_storage_dict = lncRNA_storage.sites_analysis(
-    #     "AUF1", bp_threshold=analysis_per_binding_site_window
-    # )
-
-    # # Sort AUF1 sites by readCount
-    # auf1_sites = sorted(filtered_storage_dict.keys(),
-    #                     key=lambda k: int(k[2].split()[1]), reverse=True)
-    #
-    # # Variables for later analysis
-    # distance_read_collection = {}
-    #
-    # # Analyse each site
-    # for site in auf1_sites:
-    #
-    #     # Number of times the binding site was detected in RNASeq
-    #     readCount = int(site[2].split()[1])
-    #
-    #     # Get collection of RBPs and their binding sites close to the current
-    #     # AUF1 binding site being considered
-    #     dB_storage = filtered_storage_dict[site]
-    #
-    # print(
-    #     "\nanalysing binding site from",
-    #     str(site[0]) + "bps to " + str(site[1]) + "bps; readCount =",
-    #     readCount, 'from', site[2].split()[0]
-    # )
-
-    #     # We'll collect data in a list then sort them later.
-    #     listOfThingsToPrint = []
-    #
-    #     # For each RBP and its binding sites:
-    # for rbp, binding_sites in dB_storage.items():
-    #     # Get the distances away from the current AUF1 site being considered
-    #     distances = list(
-    #         map(lambda s: BindingSites.distance(s, site), binding_sites)
-    #     )
-
-    #     # Separate binding sites and annotation:
-    #     closest_sites = list(map(firstTwoItems, binding_sites))
-    #     annotations = list(map(thirdItem, binding_sites))
-
-    #     # Check if the RBP has experimental evidence for binding AUF1:
-    #     isBindAUF1 = AUF1Filter(rbp)
-
-    #     listOfThingsToPrint.append(
-    #         (rbp, closest_sites, distances, annotations, isBindAUF1))
-
-    #     # Variables to analyse later
-    #     distance_read_collection[rbp] = (
-    #         distance_read_collection.get(rbp, [])
-    #         + list(map(lambda d: (d, readCount), distances))
-    #     )
-
-    # # Now sort and print!
-    # for toPrint in sorted(listOfThingsToPrint,
-    #                       key=lambda k: min(k[2])):
-
-    #     # Unpack
-    #     rbp, closest_sites, distances, annotations, isBindAUF1 = toPrint
-
-    #     # Modify
-    #     closest_sites = str(closest_sites)[1:-1]
-    #     isBindAUF1 = 'yes' if isBindAUF1 else 'no'
-    #     isAllCompetitive = (
-    #         all(map(
-    #         lambda k: k <= analysis_per_binding_site_competititive_range,
-    #         distances
-    #         ))
-    #     )
-
-    #     isAllCooperative = (
-    #         all(map(
-    #         lambda k: k >= analysis_per_binding_site_competititive_range,
-    #         distances))
-    #     )
-    #     isAllCooperativeORCompetitive = (
-    #         'competitive' if isAllCompetitive else
-    #         ('cooperative' if isAllCooperative else 'neither')
-    #     )
-    #     distances = str(distances)[1:-1]
-
-    #     # TODO: Consider methods of tracking datasources despite multiple
-    #     # source merges
-
-    #     data_load_source = analysis_sources[0]
-    #     merge_func = generate_merge_func(data_load_source)
-
-    #     annotations = merge_func(annotations)
-
-    #     # Repack
-    #     toPrint = (
-    #         rbp, closest_sites, distances, annotations, isBindAUF1,
-    #         isAllCooperativeORCompetitive
-    #     )
-
-    #         if False:
-    #             # Print
-    #             print(";".join(map(str, toPrint)))
-    #
-    #     print("*****************")
-    #     print("*****************")
-    #     print("*****************")
-    #
-    #     if True:
-    #         info_collection = {}
-    #
-    #         def sorter(item):
-    #             rbp = item[0]
-    #             dist_read = item[1]
-    #             flat_read_list = []
-    #             for dist, read in dist_read:
-    #                 flat_read_list += [dist] * read
-    #
-    #             reads = list(map(secondItem, dist_read))
-    #             deviation = (
-    #                 statistics.stdev(flat_read_list) if len(reads) > 1 else 100
-    #             )
-    #             return (
-    #                 -sum(reads) / deviation if deviation != 0 else -sum(reads)
-    #             )
-
-    #             # return (-sum(reads), deviation)
-
-    #         for rbp, dist_read in sorted(
-    #             distance_read_collection.items(), key=sorter
-    #         ):
-
-    #             # Only because weighted sum standard deviation is difficult to
-    #             # calculate:
-    #             flat_read_list = []
-    #             for dist, read in dist_read:
-    #                 flat_read_list += [dist] * read
-
-    #             reads = list(map(secondItem, dist_read))
-    #             distance = list(map(firstItem, dist_read))
-    #             deviation = (
-    #                 statistics.stdev(flat_read_list) if len(reads) > 1 else 100
-    #             )
-
-    #             info_collection[rbp] = (
-    #                 rbp, statistics.median(flat_read_list), deviation,
-    #                 sum(reads), len(set(reads)), len(reads), min(distance),
-    #                 max(distance), ['no', 'yes'][AUF1Filter(rbp)],
-    #                 str(dist_read)[1:-1][:100]
-    #             )
-
-    #             if True:
-    #                 print(";".join(map(str, info_collection[rbp])))
-
-    #     binding_info[lncRNA] = (filtered_storage_dict, auf1_sites,
-    #                             distance_read_collection, info_collection)
-
-    # countofInvolvement = {}
-    # for lncRNA in ["Neat1", "Malat1"]:
-    #     distance_read_collection = binding_info[lncRNA][2]
-    #     for rbp, dist_read in distance_read_collection.items():
-    #         competitiveScore = (
-    #             sum(map(
-    #             lambda t: (
-    #                 t[1] if t[0] < analysis_per_binding_site_competititive_range
-    #                 else 0
-    #             ),
-    #             dist_read
-    #             ))
-    #         )
-
-    #         cooperativeScore = (
-    #             sum(map(
-    #             lambda t: (
-    #                 t[1] if t[0] > analysis_per_binding_site_competititive_range
-    #                 else 0
-    #             ),
-    #             dist_read
-    #             ))
-    #         )
-
-    #         if rbp not in countofInvolvement: countofInvolvement[rbp] = [
-    #             0, 0, 0, 0
-    #         ]
-
-    #         if lncRNA == "Malat1":
-    #             countofInvolvement[rbp][0] += competitiveScore
-    #             countofInvolvement[rbp][1] += cooperativeScore
-    #         elif lncRNA == "Neat1":
-    #             countofInvolvement[rbp][2] += competitiveScore
-    #             countofInvolvement[rbp][3] += cooperativeScore
-    #         else:
-    #             raise ValueError('Fatal Error, please debug')
-
-    # # normalization = [0]*4
-    # # for scores in countofInvolvement.values():
-    # # 	for j in [0,1,2,3]:
-    # # 		normalization[j] = max(scores[j],normalization[j])
-
-    # total_neat1_reads = (
-    #     sum(map(lambda k: int(k[2].split()[1]), storageSpace['Neat1']["AUF1"]))
-    # )
-    # total_malat1_reads = (
-    #     sum(map(lambda k: int(k[2].split()[1]), storageSpace['Malat1']["AUF1"]))
-    # )
-    # normalization = [total_malat1_reads, total_malat1_reads,
-    #                  total_neat1_reads, total_neat1_reads]
-    # print(normalization, "-->normalization")
-
-    # def sorter(item):
-    #     rbp = item[0]
-    #     scores = item[1]
-    #     norm_scores = list(map(operator.truediv, scores, normalization))
-    # What should I prioritize?
-    # scores [a , b, c, d]
-    # 		 ^   ^  ^  ^
-    # 		 |   |  |  |
-    # 		/   /    \  \
-    # 	Malat1 		  Neat1
-    # comp., cooper     comp., cooperative...
-
-    # Presumably, Malat1 and Neat1 have a similar level
-    # of binding to AUF1... In that case, perhaps there isn't
-    #     # as much competitive inhibition, and the thing that
-    #     # destabiilzes Neat1 but not Malat1 is a cooperative helper
-    #     # that's with Neat1 but not on Malat1.
-    #     # Alternatively, if this presumption is wrong, we can expect
-    #     # a competitive RBP to be affecting on Malat1 but not on
-    #     # Neat1.
-    #     # We conclude two ways to evaluate interest:
-    #     #	1. Maximize (Cooperation on Neat1 - Cooperation on Malat1)
-    #     #	2. Maximize (Competitive on Malat1 - Competitive on Neat1)
-    #
-    #     # For now, i've chosen to maximize both at the same time:
-    #
-    #     comp_malat1 = norm_scores[0]
-    #     coOP_malat1 = norm_scores[1]
-    #     comp_neat1 = norm_scores[2]
-    #     coOP_neat1 = norm_scores[3]
-    # return max(abs(coOP_neat1 - coOP_malat1), abs(comp_malat1 - comp_neat1))
-    #
-    # for rbp, scores in sorted(countofInvolvement.items(),
-    #                           key=sorter, reverse=True):
-    #     norm_scores = list(map(operator.truediv, scores, normalization))
-    #     item = ([rbp] + scores + ['yes' if AUF1Filter(rbp) else 'no'] +
-    #             norm_scores)
-    #     print(";".join(map(str, item)))
+    main_rbp = configs.get("main_rbp")
+    if main_rbp:
+        main_rbp = main_rbp.upper().strip()
+
+    for data_load_source, storage in big_storage.items():
+        if main_rbp and main_rbp not in storage.get_rbps():
+            print(
+                f"{main_rbp} has no binding sites in {data_load_source} data.",
+                file=sys.stderr,
+            )
+            continue
+
+        rows = per_site_rows(
+            storage,
+            main_rbp=main_rbp or None,
+            competitive_threshold_bp=configs.get(
+                "competitive_threshold_bp", COMPETITIVE_THRESHOLD_BP
+            ),
+            cooperative_threshold_bp=configs.get(
+                "cooperative_threshold_bp", COOPERATIVE_THRESHOLD_BP
+            ),
+        )
+        path_saved = generate_per_site_csv(
+            rows, rna_info, [data_load_source], main_rbp, configs["out_dir"]
+        )
+        print("A file was saved at", path_saved + ".", file=sys.stderr)
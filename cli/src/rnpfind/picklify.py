@@ -6,6 +6,10 @@ overhead costs, we "picklify" them the first time they are called (save the
 dictionary in a pickle file), and then simply load the dictionary from the
 saved pickle files the next time around.
 
+Dictionaries are also kept in memory once loaded, so a process analysing
+several RNA molecules (see rnpfind_batch() in main.py) only loads each of them
+once.
+
 """
 import pickle
 import sys
@@ -13,6 +17,9 @@ from pathlib import Path
 
 from .config import PICKLE_PATH
 
+# Dictionaries loaded by this process, by the path of their pickle file
+loaded_dicts = {}
+
 
 def picklify(dict_generator, *args, **kwargs):
     """
@@ -35,6 +42,9 @@ def picklify(dict_generator, *args, **kwargs):
     # Danger! Never call picklify with functions that have the same name!
     pickle_path = f"{PICKLE_PATH}/{dict_generator.__name__}.pickle"
 
+    if pickle_path in loaded_dicts:
+        return loaded_dicts[pickle_path]
+
     try:
         with open(pickle_path, "rb") as pickle_handle:
             dict_to_return = pickle.load(pickle_handle)
@@ -52,4 +62,5 @@ def picklify(dict_generator, *args, **kwargs):
             print(
                 "Caching failed due to permission errors...", file=sys.stderr
             )
+    loaded_dicts[pickle_path] = dict_to_return
     return dict_to_return
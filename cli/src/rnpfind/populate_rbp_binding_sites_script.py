@@ -6,12 +6,32 @@ This module is useful for ucsc_visualize data analysis method.
 """
 import os
 import sys
+from functools import partial
 from pathlib import Path
 
+from .bbi_files import write_bigbed
 from .colors import green, red
-from .config import GENOME_VERSION
+from .config import (
+    COMPETITIVE_THRESHOLD_BP,
+    COOPERATIVE_THRESHOLD_BP,
+    GENOME_VERSION,
+)
 from .data_load_functions import data_load_source_colors
 from .load_data import data_source_annotation_to_columns
+from .window_join import COMPETITIVE, COOPERATIVE
+
+
+def single_track_file_name(rna_info, data_load_source):
+    """
+    Returns the name of the BED file holding the binding sites of all RBPs
+    from a data source, as saved by populate_binding_sites(single_track=True)
+
+    :param rna_info: a dictionary containing the official_name of the RNA
+    :param data_load_source: the data source the binding sites are from
+
+    """
+    rna = rna_info["official_name"].lower()
+    return f"{rna}-{data_load_source}-{GENOME_VERSION}-all-sites.bed"
 
 
 def populate_binding_sites(
@@ -20,9 +40,13 @@ def populate_binding_sites(
     data_load_sources,
     overarching_path,
     main_rbp="",
+    single_track=False,
+    auto_sql=None,
+    chrom_sizes=None,
 ):
     """
-    Saves binding sites as BED files
+    Saves binding sites as BED files, and as bigBed files next to them if
+    chrom_sizes is given
     :param big_storage: a Storage instance containing binding sites data for
         RBPs.
     :param rna_info: a dictionary containing the official_name, chr_n, and
@@ -31,6 +55,17 @@ def populate_binding_sites(
         binding sites are populated in the big_storage
     :param main_rbp: one RBP of interest, to allow for deducing competitive
         and cooperative relationships against
+    :param single_track: if True, the binding sites of all RBPs from a data
+        source are saved in one BED file (named by single_track_file_name()),
+        told apart by their name field, rather than in one BED file per RBP
+    :param auto_sql: the AutoSql description of the fields of the BED files
+        of the data source (see read_auto_sql() in populate_trackhub.py), for
+        the bigBed files (Default value = None)
+    :param chrom_sizes: a dictionary mapping chromosome names to sizes (see
+        read_chrom_sizes() in bbi_files.py). If given, each BED file also gets
+        a .bb file written straight from the binding sites by write_bigbed(),
+        as convert_bed_file() would write from the BED file.
+        (Default value = None)
     """
 
     rna_chr_no = rna_info["chr_n"]
@@ -47,8 +82,8 @@ def populate_binding_sites(
 
     comp_color = red
     coop_color = green
-    competitive_threshold_bp = 15
-    cooperative_threshold_bp = 56
+    competitive_threshold_bp = COMPETITIVE_THRESHOLD_BP
+    cooperative_threshold_bp = COOPERATIVE_THRESHOLD_BP
 
     for data_load_source in data_load_sources:
         storage = big_storage[data_load_source]
@@ -56,7 +91,9 @@ def populate_binding_sites(
         folder_path = str(Path(overarching_path) / data_load_source) + "/"
 
         if not os.path.exists(folder_path):
-            os.makedirs(folder_path)
+            # The density plots of the source may be saved in the same
+            # directory at the same time (see ucsc_visualize())
+            os.makedirs(folder_path, exist_ok=True)
             os.chmod(folder_path, 0o777)
             print(f"Directory {folder_path} created...", file=sys.stderr)
         else:
@@ -66,8 +103,20 @@ def populate_binding_sites(
 
         default_color = data_load_source_colors[data_load_source]
 
+        # The relation of every site to the sites of main_rbp, found in one
+        # sweep over the sites
+        site_relations = (
+            storage.site_relations(
+                main_rbp, competitive_threshold_bp, cooperative_threshold_bp
+            )
+            if main_rbp in storage.get_rbps()
+            else {}
+        )
+
         def coloring_func(
-            binding_site, storage=storage, default_color=default_color
+            binding_site,
+            site_relations=site_relations,
+            default_color=default_color,
         ):
             """
             Defines a coloring function for the print_bed function of the
@@ -81,36 +130,61 @@ def populate_binding_sites(
             :param binding_site: binding site under consideration
 
             """
-            competitive = main_rbp in storage.binds_near(
-                binding_site, bp_threshold=competitive_threshold_bp
-            )
-            cooperative = main_rbp in storage.binds_near(
-                binding_site, bp_threshold=cooperative_threshold_bp
-            )
+            site_relation = site_relations.get(binding_site)
             return (
                 comp_color
-                if competitive
+                if site_relation == COMPETITIVE
                 else coop_color
-                if cooperative
+                if site_relation == COOPERATIVE
                 else default_color
             )
 
-        for rbp in storage:
-            total_sites = storage[[rbp]].print_bed(
-                chr_n=rna_chr_no,
-                displacement=displacement,
-                antisense=strand == "-",
-                end_inclusion=False,  # BED files have to be 0-based, half-open.
-                add_annotation=True,
-                include_color=True,
-                include_header=False,
-                conditional_color_func=coloring_func,
-                is_additional_columns=True,
-                annotation_to_additional_columns=data_source_annotation_to_columns[
-                    data_load_source
-                ],
+        # Annotations refer to rows of the storage's annotation table
+        annotation_to_columns = partial(
+            data_source_annotation_to_columns[data_load_source],
+            annotation_table=storage.annotation_table,
+        )
+
+        bed_configs = dict(
+            chr_n=rna_chr_no,
+            displacement=displacement,
+            antisense=strand == "-",
+            # BED files have to be 0-based, half-open.
+            end_inclusion=False,
+            add_annotation=True,
+            include_color=True,
+            conditional_color_func=coloring_func,
+            is_additional_columns=True,
+            annotation_to_additional_columns=annotation_to_columns,
+        )
+
+        def write_files(filepath, sites, bed_configs=bed_configs):
+            """
+            Writes the BED file of some binding sites, and their bigBed file
+            if chrom_sizes is given
+
+            :param filepath: the path to the BED file
+            :param sites: a Storage instance with the binding sites
+
+            """
+            with open(filepath, "w") as bed_file:
+                sites.write_bed(bed_file, include_header=False, **bed_configs)
+            if chrom_sizes is not None:
+                write_bigbed(
+                    Path(filepath).with_suffix(".bb"),
+                    sites.bed_rows(**bed_configs),
+                    chrom_sizes,
+                    auto_sql,
+                )
+
+        if single_track:
+            filepath = folder_path + single_track_file_name(
+                rna_info, data_load_source
             )
+            write_files(filepath, storage)
+            continue
 
+        for rbp in storage:
             # filepath = (
             #     rbp
             #     + "_"
@@ -126,7 +200,6 @@ def populate_binding_sites(
             filepath = folder_path + filepath
 
             Path(folder_path).mkdir(parents=True, exist_ok=True)
-            with open(filepath, "w") as bed_file:
-                bed_file.write(total_sites)
+            write_files(filepath, storage[[rbp]])
 
     return overarching_path
@@ -8,10 +8,16 @@ as simple intervals of sites or as density (dense barchart/histogram) plots.
 import glob
 import os
 from pathlib import Path
-from sys import platform
 
 import trackhub
 
+from .bbi_files import (
+    read_bed_rows,
+    read_chrom_sizes,
+    read_wig_runs,
+    write_bigbed,
+    write_bigwig,
+)
 from .binding_analysis_binding_sites import OVERLAP_CONFLICT
 from .config import (
     AUTOSQL_PATH,
@@ -24,10 +30,58 @@ from .data_load_functions import (
     data_load_sources_supported_long,
     data_load_sources_supported_short,
 )
+from .populate_rbp_binding_sites_script import single_track_file_name
+
+
+class FieldFilterTrack(trackhub.Track):
+    """
+    A bigBed track whose items can be filtered by the values of a field (such
+    as the RBP named in the name field). The trackhub package does not know
+    the per-field filter settings of the UCSC trackDb format, so they are
+    added to the track's settings here without being validated.
+    """
+
+    def __init__(self, *args, field_filters=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.field_filters = field_filters if field_filters else {}
+
+    def __str__(self):
+        return "\n".join(
+            [super().__str__()]
+            + [f"{key} {value}" for key, value in self.field_filters.items()]
+        )
+
+
+def rbp_filters(rbps):
+    """
+    Returns the settings of a FieldFilterTrack filtering binding sites by the
+    RBP in their name field: a list to pick any of the RBPs from, or (as the
+    list is comma-separated) a wildcard search if an RBP name has a comma.
+
+    :param rbps: the RBPs with binding sites in the track
+
+    """
+    if any("," in rbp for rbp in rbps):
+        return {
+            "filterLabel.name": "RBP",
+            "filterText.name": "*",
+            "filterType.name": "wildcard",
+        }
+    return {
+        "filterLabel.name": "RBP",
+        "filterValues.name": ",".join(sorted(rbps)),
+        "filterType.name": "multipleListOr",
+    }
 
 
 def populate_local_track_hub(
-    overarching_path, rna_info, local_stage, rbp_no_dict, rbp_peaks, rbp=""
+    overarching_path,
+    rna_info,
+    local_stage,
+    rbp_no_dict,
+    rbp_peaks,
+    rbp="",
+    rbp_names=None,
 ):
     """
     Populates a local directory with files conforming to structure required by
@@ -44,6 +98,9 @@ def populate_local_track_hub(
         ...
         /<source m>/<rbpnm>.bb
 
+    or, if they were saved with populate_binding_sites(single_track=True), one
+    .bb file per source (named by single_track_file_name()), shown as one
+    track per source that can be filtered by RBP.
 
     This function simply copies the files into a trackhub structure and saves it
     in a specified directory.
@@ -63,6 +120,10 @@ def populate_local_track_hub(
     :param rbp: Name of one RBP of interest, among those binding to the RNA of
         interest (useful only for taking its perspective in competitive /
         cooperative relationship investigation.)
+    :param rbp_names: A dictionary containing data sources as keys and the
+        RBPs discovered by each source as values, used to filter the tracks
+        of .bb files holding the binding sites of all RBPs from a source.
+        (Default value = None)
 
     """
 
@@ -89,9 +150,39 @@ def populate_local_track_hub(
     )
 
     is_track_added = False
-    for filename in glob.iglob(f"{overarching_path}/**/*.bb", recursive=True):
+    for filename in sorted(
+        glob.iglob(f"{overarching_path}/**/*.bb", recursive=True)
+    ):
         category = Path(filename).parent.name
         name = Path(filename).name
+        single_track_name = single_track_file_name(rna_info, category)
+        if name == str(Path(single_track_name).with_suffix(".bb")):
+            rbps = rbp_names[category] if rbp_names else []
+            track = FieldFilterTrack(
+                name=rna.lower() + "-" + category + "-binding-sites",
+                short_label=rna + "-" + category,
+                long_label=(
+                    "Binding sites of "
+                    + str(len(rbps))
+                    + " RBPs on "
+                    + rna
+                    + " derived from "
+                    + data_load_sources_supported_long[
+                        data_load_sources_supported_short.index(category)
+                    ]
+                ),
+                source=filename,
+                tracktype="bigBed 9 +",
+                itemRgb="on",
+                spectrum="on",
+                visibility=UCSC_TRACK_VISIBILITY,
+                chromosomes="chr" + str(rna_chr_no),
+                field_filters=rbp_filters(rbps),
+            )
+            trackdb.add_tracks(track)
+            is_track_added = True
+            continue
+
         # _, _, _, _, _, _, category, name = filename.split("/")
         rbp = name.split("-")[0]
         rbp = rbp.replace(",", "_")
@@ -142,7 +233,9 @@ def populate_local_track_hub(
         trackdb.add_tracks(track)
         is_track_added = True
 
-    for filename in glob.iglob(f"{overarching_path}/**/*.bw", recursive=True):
+    for filename in sorted(
+        glob.iglob(f"{overarching_path}/**/*.bw", recursive=True)
+    ):
         data_load_source = Path(filename).parent.name
         name = Path(filename).name
         # _, _, _, _, _, _, data_load_source, name = filename.split("/")
@@ -246,7 +339,7 @@ def prepare_auto_sql(data_load_source):
 def convert_bed_to_bb(overarching_path, data_load_sources):
     """
     Given a directory containing .bed files, converts them all to .bb files and
-    saves them. Uses the UCSC bedToBigBed tool as a subroutine.
+    saves them, as the UCSC bedToBigBed tool would (see write_bigbed()).
 
     :param overarching_path: Directory containing the .bed files in a layout
         similar to as described in the docstring of populate_local_track_hub.
@@ -255,38 +348,49 @@ def convert_bed_to_bb(overarching_path, data_load_sources):
         desired.
 
     """
-    debug = False
     if GENOME_VERSION != "hg38":
         raise ValueError("Update this function for this genome version!")
 
-    os_folder = ""
-    if platform in ("linux", "linux2"):
-        # linux
-        os_folder = "linux"
-    elif platform == "darwin":
-        # OS X
-        os_folder = "mac-os"
-    assert os_folder
-
-    # starting_working_directory = os.getcwd()
+    chrom_sizes = read_chrom_sizes(UCSCTOOL_PATH / "hg38.chrom.sizes")
     for data_load_source in data_load_sources:
-        no_of_extra_fields, as_file_name = prepare_auto_sql(data_load_source)
-        # os.chdir(overarching_path + data_load_source + "/")
-
-        os.system(
-            f"for file in {Path(overarching_path) / data_load_source}/*.bed;"
-            f" do echo $file; {UCSCTOOL_PATH}/{os_folder}/bedToBigBed"
-            f" -as={AUTOSQL_PATH}/{as_file_name}"
-            + " type=bed9+"
-            + str(no_of_extra_fields)
-            + ' "$file" '
-            + f'{UCSCTOOL_PATH}/hg38.chrom.sizes "${{file%.*}}".bb; done'
-            + (" >/dev/null 2>&1" if not debug else "")
-        )
+        auto_sql = read_auto_sql(data_load_source)
+        source_path = Path(overarching_path) / data_load_source
+        for bed_path in sorted(source_path.glob("*.bed")):
+            convert_bed_file(bed_path, auto_sql, chrom_sizes)
 
-        # os.chdir(starting_working_directory)
 
-    # end of function
+def read_auto_sql(data_load_source):
+    """
+    Returns the AutoSql description of the BED files of a data source, as
+    prepared by prepare_auto_sql().
+
+    :param data_load_source: the data source of the BED files
+
+    """
+    _, as_file_name = prepare_auto_sql(data_load_source)
+    with open(f"{AUTOSQL_PATH}/{as_file_name}") as handle:
+        return handle.read()
+
+
+def convert_bed_file(bed_path, auto_sql, chrom_sizes):
+    """
+    Converts one .bed file to a .bb file next to it (see convert_bed_to_bb()).
+    Only needed for BED files already written, as populate_binding_sites()
+    writes .bb files straight from the binding sites.
+
+    :param bed_path: path to the .bed file
+    :param auto_sql: the AutoSql description of its fields (see
+        read_auto_sql())
+    :param chrom_sizes: a dictionary mapping chromosome names to sizes
+
+    """
+    bed_path = Path(bed_path)
+    write_bigbed(
+        bed_path.with_suffix(".bb"),
+        read_bed_rows(bed_path),
+        chrom_sizes,
+        auto_sql,
+    )
 
 
 def upload_online(local_dir, github_dir):
@@ -307,7 +411,14 @@ def upload_online(local_dir, github_dir):
     os.system("aws s3 sync " + local_dir + " " + github_dir + terminator)
 
 
-def density_plot(big_storage, rna_info, data_load_sources, overarching_path):
+def density_plot(
+    big_storage,
+    rna_info,
+    data_load_sources,
+    overarching_path,
+    run_length=False,
+    chrom_sizes=None,
+):
 
     """
     Generates .wig files containing density information on RBPs binding to RNA
@@ -325,6 +436,17 @@ def density_plot(big_storage, rna_info, data_load_sources, overarching_path):
         should be generated, such as 'rbpdb', 'postar', etc.
     :param overarching_path: the directory in which the .wig files should be
         saved.
+    :param run_length: if True, the .wig files are written in bedGraph format,
+        with one line per run of bases of the same density, which is much
+        shorter. Otherwise, they are written in fixedStep format, with one
+        line per base, as .wig files usually are. Either way,
+        convert_wig_to_bw() makes the same .bw files out of them.
+        (Default value = False)
+    :param chrom_sizes: a dictionary mapping chromosome names to sizes (see
+        read_chrom_sizes()). If given, each .wig file also gets a .wig.bw file
+        written straight from the runs of bases of the same density by
+        write_bigwig(), as convert_wig_file() would write from the .wig file.
+        (Default value = None)
     :returns: a dictionary containing the number of RBPs that were discovered
         by each data source on the RNA of interest.
 
@@ -342,7 +464,7 @@ def density_plot(big_storage, rna_info, data_load_sources, overarching_path):
 
         # TODO: check if displacement needs to be shifted by one for all data
         # sources or just RBPDB
-        wig_string = storage.print_wig(
+        wig_configs = dict(
             chr_no=rna_chr_no,
             displacement=rna_start_chr_coord - 1,
             include_name=True,
@@ -366,7 +488,22 @@ def density_plot(big_storage, rna_info, data_load_sources, overarching_path):
         folder_path.mkdir(parents=True, exist_ok=True)
 
         with open(filepath, "w") as density_plot_wig_file:
-            density_plot_wig_file.write(wig_string)
+            if run_length:
+                storage.write_bedgraph(density_plot_wig_file, **wig_configs)
+            else:
+                density_plot_wig_file.write(storage.print_wig(**wig_configs))
+
+        if chrom_sizes is not None:
+            write_bigwig(
+                f"{filepath}.bw",
+                storage.bedgraph_runs(
+                    chr_no=rna_chr_no,
+                    displacement=rna_start_chr_coord - 1,
+                    antisense=rna_info["strand"] == "-",
+                    length=wig_configs["length"],
+                ),
+                chrom_sizes,
+            )
 
     return rbp_no_dict
 
@@ -374,7 +511,7 @@ def density_plot(big_storage, rna_info, data_load_sources, overarching_path):
 def convert_wig_to_bw(overarching_path, data_load_sources):
     """
     Given a directory containing .wig files, converts them all to .bw files and
-    saves them. Uses the UCSC wigToBigWig tool as a subroutine.
+    saves them, as the UCSC bedGraphToBigWig tool would (see write_bigwig()).
 
     :param overarching_path: Directory containing the .wig files in a layout
         similar to as described in the docstring of populate_local_track_hub.
@@ -386,24 +523,21 @@ def convert_wig_to_bw(overarching_path, data_load_sources):
     if GENOME_VERSION != "hg38":
         raise ValueError("Update this function for this genome version!")
 
-    os_folder = ""
-    if platform in ("linux", "linux2"):
-        # linux
-        os_folder = "linux"
-    elif platform == "darwin":
-        # OS X
-        os_folder = "mac-os"
-    assert os_folder
-
-    # starting_working_directory = os.getcwd()
+    chrom_sizes = read_chrom_sizes(UCSCTOOL_PATH / "hg38.chrom.sizes")
     for data_load_source in data_load_sources:
-        # os.chdir(overarching_path + data_load_source + "/")
+        source_path = Path(overarching_path) / data_load_source
+        for wig_path in sorted(source_path.glob("*.wig")):
+            convert_wig_file(wig_path, chrom_sizes)
 
-        os.system(
-            f"for file in {Path(overarching_path) / data_load_source}/*.wig;"
-            f" do echo $file; {UCSCTOOL_PATH}/{os_folder}/wigToBigWig"
-            f' "$file" {UCSCTOOL_PATH}/hg38.chrom.sizes '
-            '"$file.bw"; done >/dev/null 2>&1'
-        )
 
-        # os.chdir(starting_working_directory)
+def convert_wig_file(wig_path, chrom_sizes):
+    """
+    Converts one .wig file to a .wig.bw file next to it (see
+    convert_wig_to_bw()). Only needed for .wig files already written, as
+    density_plot() writes .wig.bw files straight from the binding sites.
+
+    :param wig_path: path to the .wig file
+    :param chrom_sizes: a dictionary mapping chromosome names to sizes
+
+    """
+    write_bigwig(f"{wig_path}.bw", read_wig_runs(wig_path), chrom_sizes)
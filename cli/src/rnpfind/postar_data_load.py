@@ -6,7 +6,8 @@ This module contains functions for loading data from the postar database.
 import bisect
 import os
 
-from .config import ANNOTATION_COLUMN_DELIMITER, POSTAR_PATH
+from .config import POSTAR_PATH
+from .coverage_collapse import ASCENDING_STARTS, DESCENDING_ENDS
 
 postar_all_column_names = [
     "chrom",
@@ -162,11 +163,9 @@ def binary_search_populate(file_path, rna_info, debug=False):
                         ), rna_end_chr_coord - int(start)
 
                     # TODO: Consider reformatting the annotation for visual appeal
-                    annotation = ANNOTATION_COLUMN_DELIMITER.join(
-                        [
-                            postar_line_parts[i]
-                            for i in postar_columns_of_interest
-                        ]
+                    annotation = tuple(
+                        postar_line_parts[i]
+                        for i in postar_columns_of_interest
                     )
                     yield rbp, start, end, annotation
 
@@ -179,6 +178,21 @@ def binary_search_populate(file_path, rna_info, debug=False):
             postar_line_parts = postar_data_file.readline().split()
 
 
+def postar_site_order(rna_info):
+    """
+    Returns the order in which postar_data_load() gives the binding sites of
+    each RBP. The POSTAR file is sorted by genomic coordinates, so the sites
+    come by ascending start on an RNA on the forward strand, and by
+    descending end on one on the reverse strand.
+    :param rna_info: dictionary containing input RNA information, such as
+        its strand.
+
+    """
+    if rna_info["strand"] == "+":
+        return ASCENDING_STARTS
+    return DESCENDING_ENDS
+
+
 def postar_data_load(rna_info):
     """
     Returns a generator containing binding sites on input RNA molecule, as
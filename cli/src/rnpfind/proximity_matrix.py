@@ -0,0 +1,763 @@
+"""
+Vectorized computation of the binding "correlation" (proximity) scores between
+every pair of RBPs stored in a Storage instance.
+
+BindingSites.dist() scores how close the sites of one RBP are to the sites of
+another, one site at a time. Doing that for every pair of RBPs on a transcript
+means hundreds of thousands of Python-level calls. Instead, the functions here
+lay the (non-overlapping, sorted) binding sites of all RBPs out as flat NumPy
+arrays and, for each RBP, gather the distance to its nearest site at the
+boundaries of every other RBP's sites in one go. The scores produced are
+identical to those of BindingSites.dist().
+
+The gaps between every pair of RBPs are computed once and kept in a GapTable,
+from which correlation matrices for any base pair threshold can be derived.
+Results are given as dense matrices along with a list of RBPs that index their
+rows and columns. For many RBPs, the table can be split into tiles of pairs of
+RBPs and computed by a pool of processes (see parallel_gaps()), which read the
+site coordinates from, and write the gaps to, shared memory.
+
+Most pairs of RBPs on a long transcript never bind close to each other, and so
+have a correlation of zero. sparse_f_measures() finds the pairs that do in one
+sweep over all sites, and only evaluates those.
+"""
+
+import heapq
+import math
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Gap reported for query sites when the RBP thrown against has no sites at all
+# (so that the proximity score comes out as zero)
+NO_SITE_GAP = np.iinfo(np.int64).max
+
+# Gaps are stored in a GapTable with this (smaller) type. Anything larger than
+# its maximum is far beyond any sensible threshold anyway.
+GAP_DTYPE = np.int32
+
+# Number of tiles the gap matrix is split into per worker process when it is
+# computed in parallel
+TILES_PER_JOB = 4
+
+
+def site_arrays(binding_sites):
+    """
+    Returns the start and end coordinates of the sites stored in a
+    BindingSites instance as two sorted NumPy arrays.
+
+    :param binding_sites: a BindingSites instance with overlap_mode off.
+
+    """
+    if binding_sites.overlap_mode:
+        raise ValueError(
+            "site_arrays() is not supported for BindingSites with"
+            " overlap_mode set to True"
+        )
+
+    starts = np.fromiter(
+        (site[0] for site in binding_sites),
+        dtype=np.int64,
+        count=len(binding_sites),
+    )
+    ends = np.fromiter(
+        (site[1] for site in binding_sites),
+        dtype=np.int64,
+        count=len(binding_sites),
+    )
+    return starts, ends
+
+
+def concatenate_sites(storage):
+    """
+    Lays out the binding sites of all the RBPs in a Storage instance as flat
+    arrays.
+
+    :param storage: a Storage instance.
+    :returns: a tuple (rbps, starts, ends, rbp_ids), where rbps is a list of
+        the RBPs in storage, and starts[k], ends[k] is a site of the RBP
+        rbps[rbp_ids[k]]. Sites of each RBP are contiguous and sorted.
+
+    """
+    rbps = list(storage.get_rbps())
+    all_starts = []
+    all_ends = []
+    all_ids = []
+    for rbp_id, rbp in enumerate(rbps):
+        starts, ends = site_arrays(storage[rbp])
+        all_starts.append(starts)
+        all_ends.append(ends)
+        all_ids.append(np.full(len(starts), rbp_id, dtype=np.int64))
+
+    if not rbps:
+        empty = np.zeros(0, dtype=np.int64)
+        return rbps, empty, empty.copy(), empty.copy()
+
+    return (
+        rbps,
+        np.concatenate(all_starts),
+        np.concatenate(all_ends),
+        np.concatenate(all_ids),
+    )
+
+
+def nearest_gaps(starts, ends, query_starts, query_ends):
+    """
+    For each query site, returns the number of bases between it and the
+    nearest of the sites given by (starts, ends). Overlapping sites are zero
+    bases apart.
+
+    The nearest site is looked up exactly like BindingSites.dist() does, i.e.
+    by bisecting on the query site's start coordinate, so that the resulting
+    scores are the same.
+
+    :param starts: sorted start coordinates of non-overlapping sites
+    :param ends: end coordinates corresponding to starts
+    :param query_starts: start coordinates of the query sites
+    :param query_ends: end coordinates of the query sites
+    :returns: an integer array with one gap per query site. NO_SITE_GAP is
+        used if there are no sites to compare against.
+
+    """
+    num_sites = len(starts)
+    if num_sites == 0:
+        return np.full(len(query_starts), NO_SITE_GAP, dtype=np.int64)
+
+    pos = np.searchsorted(starts, query_starts, side="left")
+
+    # Distance to the site just before (if any)
+    prev_end = ends[np.maximum(pos - 1, 0)]
+    gap_before = np.where(
+        pos > 0, np.maximum(0, query_starts - prev_end), NO_SITE_GAP
+    )
+
+    # Distance to the site just after (if any)
+    next_start = starts[np.minimum(pos, num_sites - 1)]
+    gap_after = np.where(
+        pos < num_sites, np.maximum(0, next_start - query_ends), NO_SITE_GAP
+    )
+
+    return np.minimum(gap_before, gap_after)
+
+
+def clip_gaps(gaps):
+    """
+    Converts gaps to GAP_DTYPE for compact storage, clipping large gaps.
+
+    :param gaps: an array of gaps, as given by nearest_gaps()
+
+    """
+    return np.minimum(gaps, np.iinfo(GAP_DTYPE).max).astype(GAP_DTYPE)
+
+
+def proximity_scores(gaps, bp_threshold):
+    """
+    Converts gaps (in bases) to proximity scores between 0 and 1, where 1
+    means overlapping and 0 means at least bp_threshold bases apart.
+
+    :param gaps: an array of gaps, as given by nearest_gaps()
+    :param bp_threshold: distance beyond which sites are considered too far
+
+    """
+    # If the threshold is lower than one it's the same as being one
+    bp_threshold = max(1, bp_threshold)
+    return np.maximum(0, 1 - gaps / bp_threshold)
+
+
+def fill_gap_tile(
+    gaps,
+    starts,
+    ends,
+    offsets,
+    rbp_range,
+    query_range,
+    progress_feedback=False,
+):
+    """
+    Fills one tile of a gap matrix: the gaps from the sites of the RBPs in
+    query_range to the nearest sites of each of the RBPs in rbp_range.
+
+    :param gaps: an array of shape (number of sites, number of RBPs), such
+                 that gaps[s, i] is the gap between site s and the nearest
+                 site of RBP i. It is filled in place.
+    :param starts: start coordinates of all sites, as from concatenate_sites()
+    :param ends: end coordinates of all sites, as from concatenate_sites()
+    :param offsets: offsets[i] is the index of the first site of RBP i in
+                    starts and ends, and offsets[-1] is the number of sites
+    :param rbp_range: a (first, last + 1) range of the RBPs thrown against
+    :param query_range: a (first, last + 1) range of the RBPs whose sites are
+                        thrown
+    :param progress_feedback: whether the progress is printed as the RBPs in
+                              rbp_range are done (Default value = False)
+
+    """
+    first, last = rbp_range
+    query_lower = offsets[query_range[0]]
+    query_upper = offsets[query_range[1]]
+    query_starts = starts[query_lower:query_upper]
+    query_ends = ends[query_lower:query_upper]
+
+    prev_num = 0
+    for i in range(first, last):
+        lower, upper = offsets[i], offsets[i + 1]
+        gaps[query_lower:query_upper, i] = clip_gaps(
+            nearest_gaps(
+                starts[lower:upper],
+                ends[lower:upper],
+                query_starts,
+                query_ends,
+            )
+        )
+
+        # Progress should be printed since this can take some time
+        percentage = round((i + 1 - first) / (last - first) / 0.01)
+        if (
+            progress_feedback
+            and percentage % 20 == 0
+            and percentage != prev_num
+        ):
+            print(percentage, "%" + "complete")
+            prev_num = percentage
+
+
+def split_rbps(offsets, num_parts, by_sites=False):
+    """
+    Splits the RBPs indexed by offsets (see fill_gap_tile()) into at most
+    num_parts contiguous ranges.
+
+    :param offsets: offsets of each RBP's sites, as in fill_gap_tile()
+    :param num_parts: the number of ranges to split into
+    :param by_sites: if True, ranges hold roughly the same number of sites
+                     rather than the same number of RBPs
+                     (Default value = False)
+    :returns: a list of (first, last + 1) ranges of RBP indices
+
+    """
+    num_rbps = len(offsets) - 1
+    if by_sites:
+        targets = np.linspace(0, offsets[-1], num_parts + 1)[1:-1]
+        inner = np.searchsorted(offsets, targets)
+    else:
+        inner = np.linspace(0, num_rbps, num_parts + 1)[1:-1].round()
+    bounds = np.unique(
+        np.concatenate([[0], inner, [num_rbps]]).astype(np.int64)
+    ).tolist()
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+# Arrays shared with the worker processes of parallel_gaps(), by name. Each
+# worker attaches to the shared memory blocks once, when it starts.
+_shared_arrays = {}
+
+
+def _attach_shared_arrays(array_specs):
+    """
+    Initializer of the worker processes of parallel_gaps(): attaches to the
+    shared memory blocks holding the site coordinates and the gap matrix.
+
+    :param array_specs: a dictionary mapping array names to a tuple
+                        (shared memory name, shape, dtype)
+
+    """
+    for name, (shm_name, shape, dtype) in array_specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _shared_arrays[name] = (
+            shm,
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf),
+        )
+
+
+def _fill_shared_gap_tile(rbp_range, query_range):
+    """
+    Fills one tile of the shared gap matrix (run by the worker processes of
+    parallel_gaps()).
+
+    :param rbp_range: see fill_gap_tile()
+    :param query_range: see fill_gap_tile()
+
+    """
+    arrays = {name: array for name, (_, array) in _shared_arrays.items()}
+    fill_gap_tile(
+        arrays["gaps"],
+        arrays["starts"],
+        arrays["ends"],
+        arrays["offsets"],
+        rbp_range,
+        query_range,
+    )
+
+
+def parallel_gaps(starts, ends, offsets, jobs, progress_feedback=False):
+    """
+    Computes the gap matrix filled by fill_gap_tile() for all pairs of RBPs,
+    split into tiles that are computed by a pool of worker processes.
+
+    The site coordinates and the gap matrix are placed in shared memory, so
+    each task only carries the ranges of its tile. The result is identical to
+    filling the whole matrix in one process.
+
+    :param starts: start coordinates of all sites, as from concatenate_sites()
+    :param ends: end coordinates of all sites, as from concatenate_sites()
+    :param offsets: offsets of each RBP's sites, as in fill_gap_tile()
+    :param jobs: the number of worker processes to use
+    :param progress_feedback: whether the progress is printed as tiles are
+                              done (Default value = False)
+    :returns: an array of shape (number of sites, number of RBPs) of gaps
+
+    """
+    num_rbps = len(offsets) - 1
+    arrays = {
+        "starts": starts,
+        "ends": ends,
+        "offsets": offsets,
+        "gaps": np.zeros((len(starts), num_rbps), dtype=GAP_DTYPE),
+    }
+
+    # A few tiles per worker, so that uneven tiles balance out
+    num_parts = math.ceil(math.sqrt(TILES_PER_JOB * jobs))
+    tiles = [
+        (rbp_range, query_range)
+        for rbp_range in split_rbps(offsets, num_parts)
+        for query_range in split_rbps(offsets, num_parts, by_sites=True)
+    ]
+
+    shms = []
+    try:
+        array_specs = {}
+        for name, array in arrays.items():
+            # Shared memory blocks can't be empty
+            shm = shared_memory.SharedMemory(
+                create=True, size=max(1, array.nbytes)
+            )
+            shms.append(shm)
+            shared = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+            shared[...] = array
+            arrays[name] = shared
+            array_specs[name] = (shm.name, array.shape, array.dtype.str)
+
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_attach_shared_arrays,
+            initargs=(array_specs,),
+        ) as executor:
+            futures = [
+                executor.submit(_fill_shared_gap_tile, *tile) for tile in tiles
+            ]
+            prev_num = 0
+            for num_done, future in enumerate(as_completed(futures), 1):
+                future.result()
+                # There may be few tiles, so report every 20% passed
+                percentage = num_done * 100 // len(tiles) // 20 * 20
+                if progress_feedback and percentage > prev_num:
+                    print(percentage, "%" + "complete")
+                    prev_num = percentage
+
+        gaps = arrays["gaps"].copy()
+    finally:
+        arrays.clear()
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+    return gaps
+
+
+class GapTable:
+    """
+    Stores the nearest-gap distributions between every pair of RBPs in a
+    Storage instance: for every site of RBP j, the number of bases to the
+    nearest site of RBP i.
+
+    Proximity scores only depend on these gaps and on the base pair threshold,
+    so once the table is built, correlation matrices for any number of
+    thresholds can be derived from it without looking at the sites again.
+
+    The gaps are kept in one block per RBP j, of shape (sites of j, RBPs),
+    so that column i of block j holds the gaps of j's sites to RBP i.
+    """
+
+    def __init__(self, storage, progress_feedback=False, jobs=1):
+        rbps, starts, ends, rbp_ids = concatenate_sites(storage)
+        num_rbps = len(rbps)
+
+        # Offsets of each RBP's block of sites within the flat arrays
+        offsets = np.searchsorted(rbp_ids, np.arange(num_rbps + 1))
+
+        if jobs > 1 and num_rbps > 1:
+            gaps = parallel_gaps(
+                starts, ends, offsets, jobs, progress_feedback
+            )
+        else:
+            gaps = np.zeros((len(starts), num_rbps), dtype=GAP_DTYPE)
+            fill_gap_tile(
+                gaps,
+                starts,
+                ends,
+                offsets,
+                (0, num_rbps),
+                (0, num_rbps),
+                progress_feedback,
+            )
+
+        self.rbps = rbps
+        self.sites = [
+            (
+                starts[offsets[j] : offsets[j + 1]],
+                ends[offsets[j] : offsets[j + 1]],
+            )
+            for j in range(num_rbps)
+        ]
+        self.blocks = [
+            gaps[offsets[j] : offsets[j + 1]] for j in range(num_rbps)
+        ]
+
+    def __len__(self):
+        return len(self.rbps)
+
+    def __contains__(self, rbp):
+        return rbp in self.rbps
+
+    def index(self, rbp):
+        """
+        Returns the row (and column) number of an RBP in the matrices derived
+        from this table.
+
+        :param rbp: name of an RBP in the table
+
+        """
+        return self.rbps.index(rbp)
+
+    def update(self, rbp, binding_sites):
+        """
+        Adds an RBP to the table, or replaces its binding sites if it is
+        already there. Only the gaps involving this RBP are computed.
+
+        :param rbp: name of the RBP
+        :param binding_sites: a BindingSites instance (overlap_mode off)
+        :returns: the index of the RBP in the table
+
+        """
+        starts, ends = site_arrays(binding_sites)
+
+        if rbp in self.rbps:
+            k = self.index(rbp)
+            self.sites[k] = starts, ends
+        else:
+            k = len(self.rbps)
+            self.rbps.append(rbp)
+            self.sites.append((starts, ends))
+            self.blocks = [
+                np.hstack([block, np.zeros((len(block), 1), GAP_DTYPE)])
+                for block in self.blocks
+            ]
+            self.blocks.append(None)
+
+        # Gaps from every RBP's sites to this RBP (column k of each block)
+        for j, (query_starts, query_ends) in enumerate(self.sites):
+            if j != k:
+                self.blocks[j][:, k] = clip_gaps(
+                    nearest_gaps(starts, ends, query_starts, query_ends)
+                )
+
+        # Gaps from this RBP's sites to every RBP (all of block k)
+        block = np.zeros((len(starts), len(self.rbps)), dtype=GAP_DTYPE)
+        for i, (rbp_starts, rbp_ends) in enumerate(self.sites):
+            block[:, i] = clip_gaps(
+                nearest_gaps(rbp_starts, rbp_ends, starts, ends)
+            )
+        self.blocks[k] = block
+
+        return k
+
+    def remove(self, rbp):
+        """
+        Removes an RBP from the table.
+
+        :param rbp: name of an RBP in the table
+        :returns: the index the RBP had in the table
+
+        """
+        k = self.index(rbp)
+        del self.rbps[k]
+        del self.sites[k]
+        del self.blocks[k]
+        self.blocks = [np.delete(block, k, axis=1) for block in self.blocks]
+        return k
+
+    def directed_matrix(self, bp_threshold=30):
+        """
+        Returns matrix[i][j] = storage[rbps[i]].dist(storage[rbps[j]]) for
+        every pair of RBPs, as it was when the table was built.
+
+        Summing along the first axis adds the sites' scores one by one, so the
+        result matches BindingSites.dist() exactly.
+
+        :param bp_threshold: number of bases beyond which two sites are
+            considered too far from each other (Default value = 30)
+
+        """
+        num_rbps = len(self.rbps)
+        matrix = np.zeros((num_rbps, num_rbps))
+        for j, block in enumerate(self.blocks):
+            if len(block) > 0:
+                scores = proximity_scores(block, bp_threshold)
+                matrix[:, j] = scores.sum(axis=0) / len(block)
+        return matrix
+
+    def directed_row(self, k, bp_threshold=30):
+        """
+        Returns row k of directed_matrix(bp_threshold), i.e. how close the
+        sites of every RBP are to those of RBP k.
+
+        :param k: index of an RBP in the table
+        :param bp_threshold: number of bases beyond which two sites are
+            considered too far from each other (Default value = 30)
+
+        """
+        gaps = np.concatenate([block[:, k] for block in self.blocks])
+        rbp_ids = np.repeat(
+            np.arange(len(self.blocks)), [len(block) for block in self.blocks]
+        )
+        return segment_means(
+            proximity_scores(gaps, bp_threshold), rbp_ids, len(self.blocks)
+        )
+
+    def directed_column(self, k, bp_threshold=30):
+        """
+        Returns column k of directed_matrix(bp_threshold), i.e. how close the
+        sites of RBP k are to those of every RBP.
+
+        :param k: index of an RBP in the table
+        :param bp_threshold: number of bases beyond which two sites are
+            considered too far from each other (Default value = 30)
+
+        """
+        block = self.blocks[k]
+        if len(block) == 0:
+            return np.zeros(len(self.rbps))
+        scores = proximity_scores(block, bp_threshold)
+        return scores.sum(axis=0) / len(block)
+
+    def f_measure_matrices(self, bp_thresholds):
+        """
+        Computes the symmetric (f-measure) correlation matrix for each of a
+        number of thresholds.
+
+        :param bp_thresholds: an iterable of base pair thresholds
+        :returns: a dictionary mapping each threshold to a tuple
+            (f_scores, directed) of the symmetric matrix and the directed
+            matrix it was derived from.
+
+        """
+        matrices = {}
+        for bp_threshold in bp_thresholds:
+            directed = self.directed_matrix(bp_threshold)
+            matrices[bp_threshold] = f_measure(directed), directed
+        return matrices
+
+
+def segment_means(values, segment_ids, num_segments):
+    """
+    Averages values over segments. Empty segments average to 0.
+
+    np.bincount sums in order, so the result matches a plain Python loop that
+    accumulates the values one by one.
+
+    :param values: array of values to average
+    :param segment_ids: the segment each value belongs to
+    :param num_segments: total number of segments
+
+    """
+    sums = np.bincount(segment_ids, weights=values, minlength=num_segments)
+    counts = np.bincount(segment_ids, minlength=num_segments)
+    means = np.zeros(num_segments)
+    np.divide(sums, counts, out=means, where=counts > 0)
+    return means
+
+
+def f_measure_pairs(forward, backward):
+    """
+    Combines directed scores into symmetric ones using the f-measure
+    2pq/(p+q), element by element. Pairs where both scores are zero get a
+    score of zero.
+
+    :param forward: array of scores p
+    :param backward: array of scores q, of the same shape
+
+    """
+    denominator = forward + backward
+    f_scores = np.zeros(np.shape(forward))
+    np.divide(
+        2 * forward * backward,
+        denominator,
+        out=f_scores,
+        where=denominator != 0,
+    )
+    return f_scores
+
+
+def f_measure(matrix):
+    """
+    Symmetrizes a directed score matrix using the f-measure 2pq/(p+q), where
+    p = matrix[i][j] and q = matrix[j][i].
+
+    :param matrix: a square matrix, e.g. as returned by directed_matrix()
+
+    """
+    return f_measure_pairs(matrix, matrix.T)
+
+
+def to_nested_dict(f_scores, rbps, directed=None):
+    """
+    Converts a dense score matrix to the nested dictionary format used by
+    Storage.self_analysis(), such that table[rbp1][rbp2] = score.
+
+    :param f_scores: a square matrix indexed by rbps
+    :param rbps: list of RBPs labelling the rows and columns of f_scores
+    :param directed: if given, the directed matrix f_scores was derived from.
+        Used to report pairs with no proximity in either direction as the
+        integer 0, as Storage.self_analysis() always has.
+        (Default value = None)
+
+    """
+    rows = f_scores.tolist()
+    if directed is not None:
+        unrelated = (directed + directed.T) == 0
+        for i, j in zip(*np.nonzero(unrelated)):
+            rows[i][j] = 0
+
+    return {rbp_1: dict(zip(rbps, row)) for rbp_1, row in zip(rbps, rows)}
+
+
+def candidate_pairs(starts, ends, rbp_ids, bp_threshold=30):
+    """
+    Finds the pairs of RBPs with at least one pair of sites less than
+    bp_threshold bases apart, in one sweep over all sites ordered by position.
+    All other pairs of RBPs have a correlation of zero.
+
+    :param starts: start coordinates of all sites (e.g. from
+        concatenate_sites())
+    :param ends: end coordinates corresponding to starts
+    :param rbp_ids: RBP id of each site
+    :param bp_threshold: distance beyond which sites are considered too far
+        (Default value = 30)
+    :returns: a set of (rbp_id_1, rbp_id_2) tuples, with rbp_id_1 < rbp_id_2
+
+    """
+    # If the threshold is lower than one it's the same as being one
+    bp_threshold = max(1, bp_threshold)
+
+    order = np.argsort(starts, kind="stable")
+
+    # Sites seen so far that may still be close to sites further along, as a
+    # heap of (end, rbp_id), along with the furthest end reached by each RBP
+    # among them
+    active = []
+    furthest_ends = {}
+
+    pairs = set()
+    for start, end, rbp_id in zip(
+        starts[order].tolist(), ends[order].tolist(), rbp_ids[order].tolist()
+    ):
+        # Sites ending too far to the left are not close to this one (or any
+        # of the ones to follow)
+        while active and active[0][0] <= start - bp_threshold:
+            old_end, old_id = heapq.heappop(active)
+            if furthest_ends[old_id] == old_end:
+                del furthest_ends[old_id]
+
+        for other_id in furthest_ends:
+            if other_id < rbp_id:
+                pairs.add((other_id, rbp_id))
+            elif other_id > rbp_id:
+                pairs.add((rbp_id, other_id))
+
+        if end > furthest_ends.get(rbp_id, end - 1):
+            furthest_ends[rbp_id] = end
+        heapq.heappush(active, (end, rbp_id))
+
+    return pairs
+
+
+def sparse_f_measures(storage, bp_thresholds):
+    """
+    Computes the symmetric (f-measure) correlation between the RBPs in a
+    Storage instance, only for pairs of RBPs that bind close to each other.
+    Pairs left out have a correlation of zero. The scores that are computed
+    are identical to those of Storage.self_analysis().
+
+    :param storage: a Storage instance
+    :param bp_thresholds: an iterable of base pair thresholds
+    :returns: a dictionary mapping each threshold to a list of
+        (rbp_1, rbp_2, correlation) tuples with non-zero correlation. Each
+        pair of distinct RBPs is listed once, following the order of RBPs in
+        the Storage.
+
+    """
+    return sparse_f_measures_of_sites(
+        concatenate_sites(storage), bp_thresholds
+    )
+
+
+def sparse_f_measures_of_sites(sites, bp_thresholds):
+    """
+    Same as sparse_f_measures(), for sites already laid out as flat arrays
+    (e.g. by SiteTable.source_columns()).
+
+    :param sites: a tuple (rbps, starts, ends, rbp_ids), as given by
+        concatenate_sites()
+    :param bp_thresholds: an iterable of base pair thresholds
+
+    """
+    bp_thresholds = list(bp_thresholds)
+    rbps, starts, ends, rbp_ids = sites
+    offsets = np.searchsorted(rbp_ids, np.arange(len(rbps) + 1))
+
+    # Pairs close at the largest threshold include those close at any other
+    pairs = candidate_pairs(starts, ends, rbp_ids, max(bp_thresholds + [1]))
+
+    partners = {}
+    for rbp_id_1, rbp_id_2 in pairs:
+        partners.setdefault(rbp_id_1, []).append(rbp_id_2)
+        partners.setdefault(rbp_id_2, []).append(rbp_id_1)
+
+    # directed[bp_threshold][(i, j)] is storage[rbps[i]].dist(...[rbps[j]])
+    directed = {bp_threshold: {} for bp_threshold in bp_thresholds}
+    for i, partner_ids in partners.items():
+        partner_ids = sorted(partner_ids)
+        query = np.concatenate(
+            [np.arange(offsets[j], offsets[j + 1]) for j in partner_ids]
+        )
+        segment_ids = np.repeat(
+            np.arange(len(partner_ids)),
+            [offsets[j + 1] - offsets[j] for j in partner_ids],
+        )
+        gaps = nearest_gaps(
+            starts[offsets[i] : offsets[i + 1]],
+            ends[offsets[i] : offsets[i + 1]],
+            starts[query],
+            ends[query],
+        )
+        for bp_threshold in bp_thresholds:
+            means = segment_means(
+                proximity_scores(gaps, bp_threshold),
+                segment_ids,
+                len(partner_ids),
+            )
+            for j, mean in zip(partner_ids, means.tolist()):
+                directed[bp_threshold][(i, j)] = mean
+
+    correlations = {}
+    for bp_threshold in bp_thresholds:
+        scores = directed[bp_threshold]
+        correlations[bp_threshold] = []
+        for i, j in sorted(pairs):
+            forward, backward = scores[(i, j)], scores[(j, i)]
+            if forward == 0 and backward == 0:
+                continue
+            f_score = 2 * forward * backward / (forward + backward)
+            if f_score > 0:
+                correlations[bp_threshold].append((rbps[i], rbps[j], f_score))
+
+    return correlations
@@ -6,7 +6,6 @@ This file contains functions for loading data from the rbpdb database.
 import math
 
 from .config import (
-    ANNOTATION_COLUMN_DELIMITER,
     RBPDB_MOTIF_N_REPEAT_REQ,
     RBPDB_MOTIF_PWM_LETTER_STRENGTH,
     RBPDB_PATH,
@@ -21,6 +20,7 @@ from .pwm_scan import (
     pwm_scan_naive_brute_force,
     str_to_pwm,
 )
+from .site_batch import SiteBatch
 
 rbpdb_all_column_names = [
     "protein_id",
@@ -269,10 +269,29 @@ def generate_rbpdb_experimental_to_pwm(letter_strength, n_repeat_req):
     return experimental_to_pwm_dict
 
 
+def rbpdb_max_site_length():
+    """
+    Returns the length of the longest motif scanned for by rbpdb_data_load(),
+    which is that of the longest binding site it gives.
+    """
+    experiment_id_to_pwm_dict = picklify(
+        generate_rbpdb_experimental_to_pwm,
+        RBPDB_MOTIF_PWM_LETTER_STRENGTH,
+        RBPDB_MOTIF_N_REPEAT_REQ,
+    )
+    return max(
+        len(pwm["A"])
+        for pwms in experiment_id_to_pwm_dict.values()
+        for pwm in pwms
+    )
+
+
 def rbpdb_data_load(rna_info):
     """
     Returns a Generator(/Iterator?) that represent binding sites loaded from the
-    RBPDB database on an RNA molecule of interest.
+    RBPDB database on an RNA molecule of interest, as one SiteBatch per motif
+    scanned for (empty if the motif is not found). Nothing is given if the
+    sequence of the RNA has bases other than A, C, G and T.
     :param rna_info: a dictionaru containing the chromosome number, start, and
         end coordinate of the RNA molecule of interest (in hg38).
     :param out: if specified, redirects progress status to the specified
@@ -341,8 +360,8 @@ def rbpdb_data_load(rna_info):
                     ]
                     assert len(experimental_columns) == 15
                     total_columns = protein_columns + experimental_columns
-                    annotation = ANNOTATION_COLUMN_DELIMITER.join(
-                        [total_columns[i] for i in rbpdb_columns_of_interest]
+                    annotation = tuple(
+                        total_columns[i] for i in rbpdb_columns_of_interest
                     )
 
                     if pwm_degree_of_freedom(pwm) >= 2048:
@@ -353,10 +372,8 @@ def rbpdb_data_load(rna_info):
                     else:
                         sites = pwm_scan(rna_seq, pwm)
 
-                    if not sites:
-                        continue
-
-                    for start, end in sites:
-                        yield rbp, start, end, annotation
+                    # Yielded even if empty, so every region gets the same
+                    # chunks (see data_load_sources_max_site_lengths)
+                    yield SiteBatch.from_sites(rbp, annotation, sites)
 
             protein_columns = handle.readline().replace("\n", "").split("\t")
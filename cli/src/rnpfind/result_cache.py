@@ -0,0 +1,615 @@
+"""
+Caches the binding sites loaded from a data source for a region of the genome
+on disk, so that analysing the same RNA again (e.g. to get another output
+format) does not load, scan and collapse its binding sites all over again.
+
+Much like picklify.py, but the binding sites depend on more than the name of a
+function: each cached Storage instance is keyed by the region (chromosome,
+start, end and strand), the data source, the version of the read-only data and
+the configuration of the data loading functions. Storage instances are written
+column-wise (see storage_to_columns()) and compressed, and the least recently
+used ones are evicted once the cache grows over RESULT_CACHE_SIZE_LIMIT bytes.
+
+For data sources that find binding sites by scanning the RNA sequence (see
+data_load_sources_max_site_lengths in data_load_functions.py), the sites found
+are cached too, before they are collapsed. A region that lies within a cached
+region then takes its sites from there (see load_sliced_batches()), and so
+does the part of a region that a cached region overlaps, leaving only the rest
+to be scanned.
+"""
+
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from .annotation_table import AnnotationTable
+from .bind_analysis import BindingSites, Storage
+from .config import (
+    EXPERIMENTAL_BINDING_SITE_ACCEPTABLE_COVERAGE_RATIO,
+    GENOME_VERSION,
+    PWM_SCAN_CUT_OFF_PERCENTAGE,
+    RBPDB_MOTIF_N_REPEAT_REQ,
+    RBPDB_MOTIF_PWM_LETTER_STRENGTH,
+    RESULT_CACHE_SIZE_LIMIT,
+    RO_DATA_PATH,
+)
+from .merge_annotation_funcs import generate_merge_func
+from .site_batch import SiteBatch
+
+# Bump this whenever the binding sites loaded for a region could change for
+# reasons the cache key does not capture (e.g. a fix in a data loading
+# function), or when the format of cached files changes
+RESULT_CACHE_FORMAT = 1
+
+
+def ro_data_version():
+    """
+    Returns a fingerprint of the read-only data (see download_ro_data() in
+    main.py). The read-only data is replaced as a whole rather than edited, so
+    the modification times and sizes of its top level entries are enough to
+    tell versions apart.
+    """
+    try:
+        entries = sorted(os.scandir(RO_DATA_PATH), key=lambda e: e.name)
+    except FileNotFoundError:
+        return None
+    return [
+        (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+        for entry in entries
+    ]
+
+
+def cache_key(data_load_source, rna_info):
+    """
+    Returns the name under which the binding sites loaded from a data source
+    for RNAs on the same chromosome and strand as the RNA given are cached.
+    The start and end of each region cached are added to the name of its
+    files (see cache_file_path()).
+
+    :param data_load_source: a data source, such as 'rbpdb', 'postar', etc.
+    :param rna_info: dict: a dictionary consisting of information about the RNA
+        of interest, such as its name and genomic location.
+
+    """
+    key = (
+        RESULT_CACHE_FORMAT,
+        data_load_source,
+        str(rna_info["chr_n"]),
+        rna_info["strand"],
+        ro_data_version(),
+        GENOME_VERSION,
+        PWM_SCAN_CUT_OFF_PERCENTAGE,
+        RBPDB_MOTIF_PWM_LETTER_STRENGTH,
+        RBPDB_MOTIF_N_REPEAT_REQ,
+        EXPERIMENTAL_BINDING_SITE_ACCEPTABLE_COVERAGE_RATIO,
+    )
+    return hashlib.sha256(repr(key).encode()).hexdigest()
+
+
+def cache_file_path(data_load_source, rna_info, cache_dir, kind="storage"):
+    """
+    Returns the path of the file the binding sites loaded from a data source
+    for an RNA are cached in.
+
+    :param data_load_source: a data source, such as 'rbpdb', 'postar', etc.
+    :param rna_info: dict: a dictionary consisting of information about the RNA
+        of interest, such as its name and genomic location.
+    :param cache_dir: the directory the cache is kept in
+    :param kind: 'storage' for the Storage instance made out of the binding
+        sites, or 'sites' for the binding sites found by scanning the RNA
+        (Default value = 'storage')
+
+    """
+    return Path(cache_dir) / (
+        f"{cache_key(data_load_source, rna_info)}"
+        f"-{rna_info['start_coord']}-{rna_info['end_coord']}-{kind}.pickle"
+    )
+
+
+def cached_regions(data_load_source, rna_info, cache_dir, kind="sites"):
+    """
+    Returns the regions, as (start, end) genomic coordinates, for which
+    binding sites loaded from a data source are cached, on the same chromosome
+    and strand as the RNA given.
+
+    :param data_load_source: a data source, such as 'rbpdb', 'postar', etc.
+    :param rna_info: dict: a dictionary consisting of information about the RNA
+        of interest, such as its name and genomic location.
+    :param cache_dir: the directory the cache is kept in
+    :param kind: see cache_file_path() (Default value = 'sites')
+
+    """
+    prefix = f"{cache_key(data_load_source, rna_info)}-"
+    suffix = f"-{kind}.pickle"
+    try:
+        names = os.listdir(cache_dir)
+    except FileNotFoundError:
+        return []
+    regions = []
+    for name in names:
+        if name.startswith(prefix) and name.endswith(suffix):
+            start, end = name[len(prefix) : -len(suffix)].split("-")
+            regions.append((int(start), int(end)))
+    return regions
+
+
+def read_cache_file(cache_path):
+    """
+    Returns the object pickled in a cache file, or None if there is no such
+    file (or it cannot be read).
+
+    :param cache_path: the path of the cache file
+
+    """
+    try:
+        with open(cache_path, "rb") as cache_handle:
+            cached = pickle.loads(zlib.decompress(cache_handle.read()))
+    except (OSError, EOFError, pickle.UnpicklingError, zlib.error):
+        return None
+
+    try:
+        # Marks the file as recently used, for evict_cache()
+        os.utime(cache_path)
+    except OSError:
+        pass
+    return cached
+
+
+def write_cache_file(cache_path, to_cache, size_limit=RESULT_CACHE_SIZE_LIMIT):
+    """
+    Pickles an object into a cache file, evicting the least recently used
+    files if the cache grows too large.
+
+    :param cache_path: the path of the cache file
+    :param to_cache: the object to pickle
+    :param size_limit: the maximum total size of the cached files, in bytes
+                       (Default value = RESULT_CACHE_SIZE_LIMIT)
+
+    """
+    cache_dir = Path(cache_path).parent
+    temp_path = None
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        # Written to a temporary file first, so that no other process ever
+        # reads a half written one
+        with tempfile.NamedTemporaryFile(
+            dir=cache_dir, suffix=".tmp", delete=False
+        ) as cache_handle:
+            temp_path = cache_handle.name
+            cache_handle.write(
+                zlib.compress(
+                    pickle.dumps(to_cache, protocol=pickle.HIGHEST_PROTOCOL)
+                )
+            )
+        os.replace(temp_path, cache_path)
+        temp_path = None
+        evict_cache(cache_dir, size_limit)
+    except OSError as err:
+        print(f"Caching failed ({err})...", file=sys.stderr)
+    finally:
+        if temp_path is not None:
+            Path(temp_path).unlink(missing_ok=True)
+
+
+def storage_to_columns(storage):
+    """
+    Lays out a Storage instance made by load_data() as a dictionary of lists
+    and numpy arrays, which compresses far better than its binding sites do
+    one by one.
+
+    The sites of all RBPs are stored one after the other. As sites are sorted,
+    each start is stored as its distance from the start before it (in
+    start_steps), and each end as the length of its site (in lengths). The
+    annotation of a site is either one row id of the AnnotationTable of the
+    Storage instance (if its annotation_lengths entry is -1) or a tuple of
+    that many row ids, taken in turn from annotation_ids.
+
+    :param storage: a Storage instance whose binding sites are annotated with
+                    row ids of its AnnotationTable
+
+    """
+    starts = []
+    ends = []
+    annotation_lengths = []
+    annotation_ids = []
+    for binding_sites in storage.values():
+        for start, end, annotation in binding_sites:
+            starts.append(start)
+            ends.append(end)
+            if isinstance(annotation, tuple):
+                annotation_lengths.append(len(annotation))
+                annotation_ids.extend(annotation)
+            else:
+                annotation_lengths.append(-1)
+                annotation_ids.append(annotation)
+
+    starts = np.array(starts, dtype=np.int64)
+    ends = np.array(ends, dtype=np.int64)
+    return {
+        "rows": storage.annotation_table.rows,
+        "rbps": list(storage.get_rbps()),
+        "overlap_modes": [
+            binding_sites.overlap_mode for binding_sites in storage.values()
+        ],
+        "site_counts": np.array(
+            [len(binding_sites) for binding_sites in storage.values()],
+            dtype=np.int64,
+        ),
+        "start_steps": np.diff(starts, prepend=0).astype(np.int32),
+        "lengths": (ends - starts).astype(np.int32),
+        "annotation_lengths": np.array(annotation_lengths, dtype=np.int32),
+        "annotation_ids": np.array(annotation_ids, dtype=np.int32),
+    }
+
+
+def storage_from_columns(data_load_source, columns):
+    """
+    Makes a Storage instance out of the columns given by storage_to_columns(),
+    as populate_storage() in load_data.py would have made it.
+
+    :param data_load_source: the data source the binding sites came from
+    :param columns: a dictionary given by storage_to_columns()
+
+    """
+    annotation_table = AnnotationTable()
+    for row in columns["rows"]:
+        annotation_table.add(row)
+    storage = Storage(
+        annotation_merge_func=generate_merge_func(data_load_source),
+        annotation_table=annotation_table,
+    )
+
+    starts = np.cumsum(columns["start_steps"], dtype=np.int64)
+    ends = (starts + columns["lengths"]).tolist()
+    starts = starts.tolist()
+    annotation_ids = iter(columns["annotation_ids"].tolist())
+    annotations = [
+        (
+            next(annotation_ids)
+            if length == -1
+            else tuple(next(annotation_ids) for _ in range(length))
+        )
+        for length in columns["annotation_lengths"].tolist()
+    ]
+
+    site = 0
+    for rbp, overlap_mode, site_count in zip(
+        columns["rbps"],
+        columns["overlap_modes"],
+        columns["site_counts"].tolist(),
+    ):
+        sites = slice(site, site + site_count)
+        storage[rbp] = BindingSites.from_sites(
+            zip(starts[sites], ends[sites], annotations[sites]),
+            overlap_mode=overlap_mode,
+        )
+        site += site_count
+    return storage
+
+
+def evict_cache(cache_dir, size_limit=RESULT_CACHE_SIZE_LIMIT):
+    """
+    Removes the least recently used files from the cache until it takes up no
+    more than size_limit bytes.
+
+    :param cache_dir: the directory the cache is kept in
+    :param size_limit: the maximum total size of the cached files, in bytes
+                       (Default value = RESULT_CACHE_SIZE_LIMIT)
+
+    """
+    cached_files = []
+    for entry in os.scandir(cache_dir):
+        if not entry.name.endswith(".pickle"):
+            # e.g. a file another process is still writing
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        cached_files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+    total_size = sum(size for _, size, _ in cached_files)
+    for _, size, path in sorted(cached_files):
+        if total_size <= size_limit:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+
+
+def load_cached_storage(data_load_source, rna_info, cache_dir):
+    """
+    Returns the Storage instance cached for a data source and an RNA, or None
+    if there is none.
+
+    :param data_load_source: a data source, such as 'rbpdb', 'postar', etc.
+    :param rna_info: dict: a dictionary consisting of information about the RNA
+        of interest, such as its name and genomic location.
+    :param cache_dir: the directory the cache is kept in
+
+    """
+    columns = read_cache_file(
+        cache_file_path(data_load_source, rna_info, cache_dir)
+    )
+    if columns is None:
+        return None
+    return storage_from_columns(data_load_source, columns)
+
+
+def cache_storage(
+    data_load_source,
+    rna_info,
+    storage,
+    cache_dir,
+    size_limit=RESULT_CACHE_SIZE_LIMIT,
+):
+    """
+    Caches the Storage instance loaded from a data source for an RNA, evicting
+    the least recently used files if the cache grows too large.
+
+    :param data_load_source: a data source, such as 'rbpdb', 'postar', etc.
+    :param rna_info: dict: a dictionary consisting of information about the RNA
+        of interest, such as its name and genomic location.
+    :param storage: the Storage instance made by load_data()
+    :param cache_dir: the directory the cache is kept in
+    :param size_limit: the maximum total size of the cached files, in bytes
+                       (Default value = RESULT_CACHE_SIZE_LIMIT)
+
+    """
+    write_cache_file(
+        cache_file_path(data_load_source, rna_info, cache_dir),
+        storage_to_columns(storage),
+        size_limit,
+    )
+
+
+def cache_scanned_batches(
+    data_load_source,
+    rna_info,
+    batches,
+    cache_dir,
+    size_limit=RESULT_CACHE_SIZE_LIMIT,
+):
+    """
+    Caches the binding sites found by a scanning data source (see
+    data_load_sources_max_site_lengths) for an RNA, as it gave them, so they
+    can be sliced for regions within it.
+
+    :param data_load_source: a data source, such as 'rbpdb', 'attract', etc.
+    :param rna_info: dict: a dictionary consisting of information about the RNA
+        of interest, such as its name and genomic location.
+    :param batches: the list of SiteBatch instances given by the data source
+    :param cache_dir: the directory the cache is kept in
+    :param size_limit: the maximum total size of the cached files, in bytes
+                       (Default value = RESULT_CACHE_SIZE_LIMIT)
+
+    """
+    write_cache_file(
+        cache_file_path(data_load_source, rna_info, cache_dir, kind="sites"),
+        batches,
+        size_limit,
+    )
+
+
+def region_offset(rna_info, inner_rna_info):
+    """
+    Returns the position of the first base of an RNA within another RNA on the
+    same chromosome and strand, so that position p on the inner RNA is
+    position p + offset on the other. The offset is negative if the inner RNA
+    starts before the other.
+
+    :param rna_info: the RNA whose positions are sought
+    :param inner_rna_info: the RNA whose first base is sought
+
+    """
+    if rna_info["strand"] == "-":
+        return rna_info["end_coord"] - inner_rna_info["end_coord"]
+    return inner_rna_info["start_coord"] - rna_info["start_coord"]
+
+
+def sub_region(rna_info, start, end):
+    """
+    Returns the rna_info of the part of an RNA between two positions on it.
+
+    :param rna_info: dict: a dictionary consisting of information about the RNA
+        of interest, such as its name and genomic location.
+    :param start: the position the part starts at (0-based)
+    :param end: the position the part ends at (0-based, exclusive)
+
+    """
+    if rna_info["strand"] == "-":
+        return dict(
+            rna_info,
+            start_coord=rna_info["end_coord"] - end + 1,
+            end_coord=rna_info["end_coord"] - start,
+        )
+    return dict(
+        rna_info,
+        start_coord=rna_info["start_coord"] + start,
+        end_coord=rna_info["start_coord"] + end - 1,
+    )
+
+
+def shift_batch(batch, offset, keep):
+    """
+    Returns the sites of a SiteBatch that keep() holds true for, as a SiteBatch
+    for the same RBPs and annotations, with offset subtracted from their
+    positions.
+
+    :param batch: a SiteBatch instance
+    :param offset: the number to subtract from the start and end of each site
+    :param keep: a function taking the start and the end of a site (before
+                 it is shifted) that tells whether to keep it
+
+    """
+    rows = [
+        row
+        for row, (start, end) in enumerate(zip(batch.starts, batch.ends))
+        if keep(start, end)
+    ]
+    return SiteBatch(
+        batch.rbps,
+        batch.annotations,
+        [batch.rbp_ids[row] for row in rows],
+        [batch.starts[row] - offset for row in rows],
+        [batch.ends[row] - offset for row in rows],
+        [batch.annotation_ids[row] for row in rows],
+    )
+
+
+def join_batches(batch, other_batch):
+    """
+    Returns a SiteBatch with the sites of two SiteBatch instances for the same
+    RBPs and annotations.
+
+    :param batch: a SiteBatch instance
+    :param other_batch: a SiteBatch instance with the same RBPs and
+                        annotations as batch
+
+    """
+    return SiteBatch(
+        batch.rbps,
+        batch.annotations,
+        batch.rbp_ids + other_batch.rbp_ids,
+        batch.starts + other_batch.starts,
+        batch.ends + other_batch.ends,
+        batch.annotation_ids + other_batch.annotation_ids,
+    )
+
+
+def load_sliced_batches(
+    data_load_source, rna_info, cache_dir, max_site_length_func, collect_func
+):
+    """
+    Returns the binding sites a scanning data source (see
+    data_load_sources_max_site_lengths) gives for an RNA, as a list of
+    SiteBatch instances, taken from the sites cached for another region. None
+    is returned if no cached region can be used.
+
+    If a cached region encloses the RNA, the sites within the RNA are taken.
+    Otherwise, if a cached region overlaps the start or the end of the RNA,
+    the sites within the overlap are taken, and the rest of the RNA is scanned
+    (with collect_func). So that sites crossing the edge of the overlap are
+    found, the max_site_length - 1 bases of the overlap next to the rest are
+    scanned again, and sites found there that lie within the overlap are left
+    out, as they were taken from the cache. Either way, the sites are exactly
+    those a scan of the whole RNA gives.
+
+    :param data_load_source: a data source, such as 'rbpdb', 'attract', etc.
+    :param rna_info: dict: a dictionary consisting of information about the RNA
+        of interest, such as its name and genomic location.
+    :param cache_dir: the directory the cache is kept in
+    :param max_site_length_func: a function that returns max_site_length,
+        the length of the longest binding site the data source can give (see
+        data_load_sources_max_site_lengths)
+    :param collect_func: a function taking a data source and an rna_info, that
+        returns the list of SiteBatch instances the data source gives for it
+        (such as collect_data() in load_data.py)
+
+    """
+    start = rna_info["start_coord"]
+    end = rna_info["end_coord"]
+    length = end - start + 1
+
+    regions = cached_regions(data_load_source, rna_info, cache_dir)
+    if not regions:
+        return None
+    max_site_length = max_site_length_func()
+
+    # The cached region that leaves the fewest bases to scan
+    best_region = None
+    best_scan_length = length
+    for cached_start, cached_end in regions:
+        if cached_start > end or cached_end < start:
+            continue
+        if cached_start > start and cached_end < end:
+            # It would leave bases on both sides to scan
+            continue
+        overlap_length = min(cached_end, end) - max(cached_start, start) + 1
+        scan_length = 0
+        if overlap_length < length:
+            scan_length = min(
+                length, length - overlap_length + max_site_length - 1
+            )
+        if scan_length < best_scan_length:
+            best_region = (cached_start, cached_end)
+            best_scan_length = scan_length
+
+    if best_region is None:
+        return None
+    cached_rna_info = dict(
+        rna_info, start_coord=best_region[0], end_coord=best_region[1]
+    )
+    cached_batches = read_cache_file(
+        cache_file_path(
+            data_load_source, cached_rna_info, cache_dir, kind="sites"
+        )
+    )
+    if not cached_batches:
+        # Either evicted, or the data source gave nothing for the cached
+        # region, which need not hold for the RNA
+        return None
+
+    # The overlap, as positions on the RNA
+    offset = region_offset(cached_rna_info, rna_info)
+    overlap_start = max(0, -offset)
+    overlap_end = min(length, best_region[1] - best_region[0] + 1 - offset)
+    sliced_batches = [
+        shift_batch(
+            batch,
+            offset,
+            lambda site_start, site_end: overlap_start <= site_start - offset
+            and site_end - offset <= overlap_end,
+        )
+        for batch in cached_batches
+    ]
+    if best_scan_length == 0:
+        return sliced_batches
+
+    # The rest of the RNA, along with the last bases of the overlap that a
+    # site crossing into the rest could start at (or the first ones it could
+    # end at)
+    if overlap_start == 0:
+        scan_start = max(0, overlap_end - max_site_length + 1)
+        scan_end = length
+    else:
+        scan_start = 0
+        scan_end = min(length, overlap_start + max_site_length - 1)
+    scanned_batches = collect_func(
+        data_load_source, sub_region(rna_info, scan_start, scan_end)
+    )
+    if not scanned_batches:
+        # The data source gives nothing for part of the RNA, and so nothing
+        # for the RNA either
+        return []
+
+    if len(scanned_batches) != len(sliced_batches) or any(
+        (batch.rbps, batch.annotations)
+        != (scanned_batch.rbps, scanned_batch.annotations)
+        for batch, scanned_batch in zip(sliced_batches, scanned_batches)
+    ):
+        # The data source does not give the same chunks for every region
+        return None
+
+    return [
+        join_batches(
+            batch,
+            shift_batch(
+                scanned_batch,
+                -scan_start,
+                lambda site_start, site_end: not (
+                    overlap_start <= site_start + scan_start
+                    and site_end + scan_start <= overlap_end
+                ),
+            ),
+        )
+        for batch, scanned_batch in zip(sliced_batches, scanned_batches)
+    ]
@@ -0,0 +1,131 @@
+"""
+Defines the class SiteBatch, a chunk of binding sites given by a data loading
+function as parallel arrays, rather than as one (rbp, start, end, annotation)
+tuple per binding site.
+
+A data loading function may yield SiteBatch instances instead of tuples (see
+data_load_functions.py). That way load_data can insert the sites of each RBP
+in a chunk in one go, instead of making a few Python function calls per
+binding site. Data loading functions that yield tuples are turned into ones
+that yield SiteBatch instances by batch_sites().
+"""
+
+from .config import SITE_BATCH_SIZE
+
+
+class SiteBatch:
+    """
+    A chunk of binding sites, as parallel arrays: binding site i is the site
+    (starts[i], ends[i]) of the RBP rbps[rbp_ids[i]], with the annotation
+    annotations[annotation_ids[i]].
+
+    The arrays are lists of Python ints. RBPs and annotations are listed in
+    the order they first appear in the chunk, and each of them appears in the
+    chunk at least once, unless the chunk is empty (see from_sites()).
+    """
+
+    def __init__(
+        self, rbps, annotations, rbp_ids, starts, ends, annotation_ids
+    ):
+        if not len(rbp_ids) == len(starts) == len(ends) == len(annotation_ids):
+            raise ValueError("Please give arrays of the same length")
+        self.rbps = rbps
+        self.annotations = annotations
+        self.rbp_ids = rbp_ids
+        self.starts = starts
+        self.ends = ends
+        self.annotation_ids = annotation_ids
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        """
+        Iterates over the binding sites in the chunk as (rbp, start, end,
+        annotation) tuples, as a tuple-yielding data loading function would.
+        """
+        for rbp_id, start, end, annotation_id in zip(
+            self.rbp_ids, self.starts, self.ends, self.annotation_ids
+        ):
+            yield (
+                self.rbps[rbp_id],
+                start,
+                end,
+                self.annotations[annotation_id],
+            )
+
+    def rbp_rows(self):
+        """
+        Generates (rbp, rows) for each RBP in the chunk, in order, where rows
+        is the list of the positions of its binding sites in the chunk.
+        """
+        rows_by_rbp_id = [[] for _ in self.rbps]
+        for row, rbp_id in enumerate(self.rbp_ids):
+            rows_by_rbp_id[rbp_id].append(row)
+        return zip(self.rbps, rows_by_rbp_id)
+
+    @staticmethod
+    def from_sites(rbp, annotation, sites):
+        """
+        Makes a SiteBatch out of binding sites of one RBP that share an
+        annotation, such as the sites found by scanning the RNA for a motif.
+        There may be no sites, in which case the chunk is empty but still
+        tells which RBP and annotation it is for.
+
+        :param rbp: the name of the RBP
+        :param annotation: the annotation of the binding sites
+        :param sites: a list of (start, end) tuples
+
+        """
+        starts = [start for start, _ in sites]
+        ends = [end for _, end in sites]
+        zeros = [0] * len(sites)
+        return SiteBatch([rbp], [annotation], zeros, starts, ends, zeros)
+
+
+def batch_sites(sites, batch_size=SITE_BATCH_SIZE):
+    """
+    Groups the binding sites given by a tuple-yielding data loading function
+    into SiteBatch instances. Any SiteBatch instances among the sites are
+    passed on as they are, so this can be applied to the output of any data
+    loading function.
+
+    :param sites: an iterable of (rbp, start, end, annotation) tuples or
+                  SiteBatch instances
+    :param batch_size: the maximum number of binding sites in a chunk
+                       (Default value = SITE_BATCH_SIZE)
+
+    """
+    rbp_ids = {}
+    annotation_ids = {}
+    columns = ([], [], [], [])
+
+    def make_batch():
+        return SiteBatch(list(rbp_ids), list(annotation_ids), *columns)
+
+    for site in sites:
+        if isinstance(site, SiteBatch):
+            if columns[0]:
+                yield make_batch()
+                rbp_ids, annotation_ids = {}, {}
+                columns = ([], [], [], [])
+            yield site
+            continue
+
+        rbp, start, end, annotation = site
+        if isinstance(annotation, list):
+            annotation = tuple(annotation)
+        columns[0].append(rbp_ids.setdefault(rbp, len(rbp_ids)))
+        columns[1].append(start)
+        columns[2].append(end)
+        columns[3].append(
+            annotation_ids.setdefault(annotation, len(annotation_ids))
+        )
+
+        if len(columns[0]) == batch_size:
+            yield make_batch()
+            rbp_ids, annotation_ids = {}, {}
+            columns = ([], [], [], [])
+
+    if columns[0]:
+        yield make_batch()
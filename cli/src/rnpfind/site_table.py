@@ -0,0 +1,372 @@
+"""
+Defines the class SiteTable, a columnar representation of a big_storage (see
+load_data.py).
+
+A big_storage is a dictionary of Storage instances, each a dictionary of
+BindingSites instances, each a sorted set of (start, end, annotation) tuples.
+That makes for millions of small Python objects on large genes. A SiteTable
+instead keeps every binding site of every data source as one row of a few
+numpy arrays: the source id, the RBP id, the start, the end and the annotation
+id of the site. Analyses can then work on contiguous arrays, while the
+group-by-source and group-by-RBP views still hand out Storage and BindingSites
+instances (built only when they are looked at) to code that expects them.
+
+load_data(..., as_site_table=True) fills a SiteTable straight from the chunks
+of binding sites given by the data loading functions, without making Storage
+instances for them.
+"""
+
+from collections.abc import Mapping
+
+import numpy as np
+
+from .bind_analysis import BindingSites, Storage
+
+
+class _LazyGroups(Mapping):
+    """
+    A read-only mapping with a fixed set of keys, whose values are built by a
+    function the first time they are looked up.
+    """
+
+    def __init__(self, keys, build_func):
+        self._keys = list(keys)
+        self._build_func = build_func
+        self._built = {}
+
+    def __getitem__(self, key):
+        if key not in self._built:
+            if key not in self._keys:
+                raise KeyError(key)
+            self._built[key] = self._build_func(key)
+        return self._built[key]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+
+class _SourceGroups(_LazyGroups):
+    """
+    The group-by-source view of a SiteTable, which can be used as a
+    big_storage. Analyses that can work on the columns of the table directly
+    find it in site_table.
+    """
+
+    def __init__(self, site_table):
+        super().__init__(site_table.sources, site_table.storage)
+        self.site_table = site_table
+
+
+class SiteTable:
+    """
+    The binding sites of all RBPs from all data sources, stored column-wise.
+
+    Row i is the site (starts[i], ends[i], annotations[annotation_ids[i]]) of
+    the RBP rbps[rbp_ids[i]], from the data source sources[source_ids[i]].
+    Rows are grouped by data source, then by RBP (in the order of the
+    big_storage the table was made from), then sorted by site, so the sites
+    of one data source, and of one RBP within it, are contiguous slices of the
+    arrays.
+    """
+
+    def __init__(self):
+        # Names of the data sources and RBPs, indexed by their ids. RBP ids
+        # are shared between data sources.
+        self.sources = []
+        self.rbps = []
+        self._rbp_ids = {}
+
+        # Distinct annotations, indexed by annotation id
+        self.annotations = []
+        self._annotation_ids = {}
+
+        # The columns, one entry per binding site
+        self.source_ids = np.zeros(0, dtype=np.int32)
+        self.rbp_ids = np.zeros(0, dtype=np.int32)
+        self.starts = np.zeros(0, dtype=np.int64)
+        self.ends = np.zeros(0, dtype=np.int64)
+        self.annotation_ids = np.zeros(0, dtype=np.int64)
+
+        # Rows of each (source id, RBP id) group as (first row, last row + 1,
+        # overlap_mode), and of each source id as (first row, last row + 1)
+        self._groups = {}
+        self._source_rows = []
+
+        # What each source's Storage was made with, to hand out alike ones
+        self._storage_args = []
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _annotation_id(self, annotation):
+        annotation_id = self._annotation_ids.get(annotation)
+        if annotation_id is None:
+            annotation_id = len(self.annotations)
+            self.annotations.append(annotation)
+            self._annotation_ids[annotation] = annotation_id
+        return annotation_id
+
+    def _rbp_id(self, rbp):
+        rbp_id = self._rbp_ids.get(rbp)
+        if rbp_id is None:
+            rbp_id = len(self.rbps)
+            self.rbps.append(rbp)
+            self._rbp_ids[rbp] = rbp_id
+        return rbp_id
+
+    @staticmethod
+    def from_big_storage(big_storage):
+        """
+        Makes a SiteTable out of a big_storage.
+
+        :param big_storage: a dictionary mapping data sources to Storage
+                            instances (as returned by load_data())
+
+        """
+        table = SiteTable()
+        for source, storage in big_storage.items():
+            table.add_storage(source, storage)
+        return table
+
+    def add_storage(self, source, storage):
+        """
+        Adds the sites of all RBPs in a Storage instance to the table, as
+        those of a data source.
+
+        :param source: name of the data source, e.g. 'postar'
+        :param storage: a Storage instance
+
+        """
+        self.add_source(
+            source,
+            (
+                (rbp, binding_sites, binding_sites.overlap_mode)
+                for rbp, binding_sites in storage.items()
+            ),
+            synonym_func=storage.synonym_func,
+            annotation_merge_func=storage.merge,
+            annotation_table=storage.annotation_table,
+        )
+
+    def add_source(
+        self,
+        source,
+        rbp_sites,
+        synonym_func=-1,
+        annotation_merge_func=-1,
+        annotation_table=None,
+    ):
+        """
+        Adds the sites of a data source to the table.
+
+        :param source: name of the data source, e.g. 'postar'
+        :param rbp_sites: an iterable of (rbp, sites, overlap_mode) tuples,
+                          where sites is an iterable of the sites of the RBP
+                          in the form (start, end, annotation), sorted
+        :param synonym_func: see Storage (Default value = -1)
+        :param annotation_merge_func: see Storage (Default value = -1)
+        :param annotation_table: see Storage (Default value = None)
+
+        """
+        if source in self.sources:
+            raise ValueError(f"The table already holds sites from {source}")
+        source_id = len(self.sources)
+        self.sources.append(source)
+        self._storage_args.append(
+            {
+                "synonym_func": synonym_func,
+                "annotation_merge_func": annotation_merge_func,
+                "annotation_table": annotation_table,
+            }
+        )
+        source_start = len(self)
+
+        rbp_ids = []
+        starts = []
+        ends = []
+        annotation_ids = []
+        for rbp, sites, overlap_mode in rbp_sites:
+            rbp_id = self._rbp_id(rbp)
+            group_start = len(starts)
+            for start, end, annotation in sites:
+                starts.append(start)
+                ends.append(end)
+                annotation_ids.append(self._annotation_id(annotation))
+            rbp_ids.extend([rbp_id] * (len(starts) - group_start))
+            self._groups[source_id, rbp_id] = (
+                source_start + group_start,
+                source_start + len(starts),
+                overlap_mode,
+            )
+        self._source_rows.append((source_start, source_start + len(starts)))
+
+        self.source_ids = np.concatenate(
+            [self.source_ids, np.full(len(starts), source_id, np.int32)]
+        )
+        self.rbp_ids = np.concatenate(
+            [self.rbp_ids, np.array(rbp_ids, dtype=np.int32)]
+        )
+        self.starts = np.concatenate(
+            [self.starts, np.array(starts, dtype=np.int64)]
+        )
+        self.ends = np.concatenate([self.ends, np.array(ends, dtype=np.int64)])
+        self.annotation_ids = np.concatenate(
+            [self.annotation_ids, np.array(annotation_ids, dtype=np.int64)]
+        )
+
+    def to_big_storage(self):
+        """
+        Makes a big_storage (a dictionary mapping data sources to Storage
+        instances) out of the table.
+        """
+        return {source: self.storage(source) for source in self.sources}
+
+    def source_slice(self, source):
+        """
+        Returns the slice of rows holding the sites of a data source.
+
+        :param source: name of the data source, e.g. 'postar'
+
+        """
+        return slice(*self._source_rows[self._source_id(source)])
+
+    def _source_id(self, source):
+        try:
+            return self.sources.index(source)
+        except ValueError:
+            raise KeyError(source) from None
+
+    def _group(self, source, rbp):
+        group = self._groups.get(
+            (self._source_id(source), self._rbp_ids.get(rbp))
+        )
+        if group is None:
+            raise KeyError((source, rbp))
+        return group
+
+    def source_rbps(self, source):
+        """
+        Returns the RBPs with sites from a data source (including RBPs listed
+        with no sites), in order.
+
+        :param source: name of the data source, e.g. 'postar'
+
+        """
+        source_id = self._source_id(source)
+        return [
+            self.rbps[rbp_id]
+            for group_source_id, rbp_id in self._groups
+            if group_source_id == source_id
+        ]
+
+    def summary(self, source):
+        """
+        Returns the number of RBPs and the number of binding sites from a data
+        source, as Storage.summary() would for its Storage instance.
+
+        :param source: name of the data source, e.g. 'postar'
+
+        """
+        rows = self.source_slice(source)
+        return len(self.source_rbps(source)), rows.stop - rows.start
+
+    def source_columns(self, source):
+        """
+        Returns the sites of all RBPs from a data source as flat arrays, as
+        proximity_matrix.concatenate_sites() does for its Storage instance.
+
+        :param source: name of the data source, e.g. 'postar'
+        :returns: a tuple (rbps, starts, ends, rbp_ids), where starts[k],
+            ends[k] is a site of the RBP rbps[rbp_ids[k]]. Sites of each RBP
+            are contiguous and sorted.
+
+        """
+        rbps = self.source_rbps(source)
+        rows = self.source_slice(source)
+        rbp_ids = np.zeros(rows.stop - rows.start, dtype=np.int64)
+        for i, rbp in enumerate(rbps):
+            group_start, group_end, overlap_mode = self._group(source, rbp)
+            if overlap_mode:
+                raise ValueError(
+                    "source_columns() is not supported for BindingSites with"
+                    " overlap_mode set to True"
+                )
+            rbp_ids[group_start - rows.start : group_end - rows.start] = i
+        return rbps, self.starts[rows], self.ends[rows], rbp_ids
+
+    def group_slice(self, source, rbp):
+        """
+        Returns the slice of rows holding the sites of an RBP from a data
+        source.
+
+        :param source: name of the data source, e.g. 'postar'
+        :param rbp: name of the RBP, e.g. 'HNRNPC'
+
+        """
+        group_start, group_end, _ = self._group(source, rbp)
+        return slice(group_start, group_end)
+
+    def binding_sites(self, source, rbp):
+        """
+        Builds a BindingSites instance with the sites of an RBP from a data
+        source.
+
+        :param source: name of the data source, e.g. 'postar'
+        :param rbp: name of the RBP, e.g. 'HNRNPC'
+
+        """
+        group_start, group_end, overlap_mode = self._group(source, rbp)
+        rows = slice(group_start, group_end)
+        sites = zip(
+            self.starts[rows].tolist(),
+            self.ends[rows].tolist(),
+            [self.annotations[i] for i in self.annotation_ids[rows]],
+        )
+        return BindingSites.from_sites(sites, overlap_mode=overlap_mode)
+
+    def storage(self, source):
+        """
+        Builds a Storage instance with the sites of all RBPs from a data
+        source.
+
+        :param source: name of the data source, e.g. 'postar'
+
+        """
+        storage = Storage(**self._storage_args[self._source_id(source)])
+        for rbp in self.source_rbps(source):
+            storage[rbp] = self.binding_sites(source, rbp)
+        return storage
+
+    def group_by_source(self):
+        """
+        Returns a mapping from data sources to Storage instances holding their
+        sites, like a big_storage. Each Storage instance is built when it is
+        first looked up.
+        """
+        return _SourceGroups(self)
+
+    def group_by_rbp(self):
+        """
+        Returns a mapping from RBPs to mappings from data sources to the
+        BindingSites instances holding the sites of the RBP from that source.
+        Each BindingSites instance is built when it is first looked up.
+        """
+
+        def sources_of(rbp):
+            rbp_id = self._rbp_ids[rbp]
+            sources = [
+                self.sources[source_id]
+                for source_id, group_rbp_id in self._groups
+                if group_rbp_id == rbp_id
+            ]
+            return _LazyGroups(
+                sources, lambda source: self.binding_sites(source, rbp)
+            )
+
+        return _LazyGroups(self.rbps, sources_of)
@@ -11,12 +11,14 @@ import shutil
 import sys
 from pathlib import Path
 
+from .bbi_files import read_chrom_sizes
+from .config import UCSCTOOL_PATH
+from .output_scheduler import OutputTask, run_output_tasks
 from .populate_rbp_binding_sites_script import populate_binding_sites
 from .populate_trackhub import (
-    convert_bed_to_bb,
-    convert_wig_to_bw,
     density_plot,
     populate_local_track_hub,
+    read_auto_sql,
 )
 
 
@@ -42,40 +44,87 @@ def ucsc_visualize(big_storage, rna_info, configs=None):
                         (Default value = 7)
     :param configs: gives additional configurations. Supported keys include:
         - out_dir: the directory to write files to
+        - single-track: whether to write the binding sites of all RBPs from a
+          data source to one BED file (and trackhub track), rather than one
+          per RBP
+        - jobs: the number of processes over which the files of the data
+          sources are written
 
     """
 
     data_load_sources = big_storage.keys()
 
     overarching_path = str(Path(configs["out_dir"]) / "bed")
-    populate_binding_sites(
-        big_storage, rna_info, data_load_sources, overarching_path
+    single_track = configs.get("single-track", False)
+    is_trackhub = configs["trackhub"] or configs["trackhub-only"]
+
+    # The BED file and the density plot of each data source are written at
+    # the same time over up to configs["jobs"] processes, along with their
+    # bigBed and bigWig files, written straight from the binding sites
+    chrom_sizes = (
+        read_chrom_sizes(UCSCTOOL_PATH / "hg38.chrom.sizes")
+        if is_trackhub
+        else None
     )
-
-    if not configs["trackhub"] and not configs["trackhub-only"]:
+    tasks = []
+    for data_load_source in data_load_sources:
+        source_storage = {data_load_source: big_storage[data_load_source]}
+        tasks.append(
+            OutputTask(
+                f"bed-{data_load_source}",
+                populate_binding_sites,
+                source_storage,
+                rna_info,
+                [data_load_source],
+                overarching_path,
+                "",
+                single_track,
+                read_auto_sql(data_load_source) if is_trackhub else None,
+                chrom_sizes,
+            )
+        )
+        if is_trackhub:
+            tasks.append(
+                OutputTask(
+                    f"density-{data_load_source}",
+                    density_plot,
+                    source_storage,
+                    rna_info,
+                    [data_load_source],
+                    overarching_path,
+                    False,
+                    chrom_sizes,
+                )
+            )
+    results = run_output_tasks(tasks, jobs=configs.get("jobs", 1))
+
+    if not is_trackhub:
         # Trackhub is not needed at all...
         return
 
-    convert_bed_to_bb(overarching_path, data_load_sources)
-
-    rbp_no_dict = density_plot(
-        big_storage, rna_info, data_load_sources, overarching_path
-    )
-
-    convert_wig_to_bw(overarching_path, data_load_sources)
+    rbp_no_dict = {}
+    for data_load_source in data_load_sources:
+        rbp_no_dict.update(results[f"density-{data_load_source}"])
 
     print("Generating trackhub structure...", file=sys.stderr)
 
     local_dir = Path(overarching_path).parent / "trackhub"
 
     rbp_peaks = {
-        k: max(big_storage[k].sum_over_all().return_depth())
+        k: big_storage[k].max_depth()
         for k in big_storage
         if len(big_storage[k]) > 0
     }
 
+    rbp_names = {k: list(big_storage[k].get_rbps()) for k in big_storage}
+
     if populate_local_track_hub(
-        overarching_path, rna_info, local_dir, rbp_no_dict, rbp_peaks
+        overarching_path,
+        rna_info,
+        local_dir,
+        rbp_no_dict,
+        rbp_peaks,
+        rbp_names=rbp_names,
     ):
         # Resolving links
         shutil.copytree(local_dir, f"{local_dir}-copy")
@@ -0,0 +1,87 @@
+"""
+A window join between binding sites: for each site of an RBP of interest (a
+"focal" site), finds every binding site that lies within a number of bases of
+it, in one sweep over sites sorted by start coordinate.
+
+This is the building block for analyses that look at what binds around each
+binding site of an RBP, e.g. Storage.sites_analysis(), the per binding site
+analysis, and competitive/cooperative relations between RBPs.
+"""
+
+import heapq
+
+from .binding_analysis_binding_sites import BindingSites
+
+COMPETITIVE = "competitive"
+COOPERATIVE = "cooperative"
+
+
+def window_join(focal_sites, sites, bp_threshold=0):
+    """
+    Generates a tuple (i, j, distance) for every pair of a focal site
+    focal_sites[i] and a site sites[j] that lies within bp_threshold bases of
+    it. A site is within bp_threshold bases of a focal site if it overlaps the
+    focal site extended by bp_threshold bases on both sides, as in
+    BindingSites.filter_overlap().
+
+    Tuples are generated in order of the focal sites, then in order of the
+    sites.
+
+    :param focal_sites: a list of sites in the form (start, end, ...), sorted
+                        by start coordinate
+    :param sites: a list of sites in the form (start, end, ...), sorted by
+                  start coordinate (e.g. IntervalIndex.intervals)
+    :param bp_threshold: number of bases away sites are allowed to be from a
+                         focal site (Default value = 0)
+
+    """
+    num_sites = len(sites)
+    next_pos = 0
+
+    # Sites that start before the window of the current focal site ends, and
+    # that have not ended before any window so far started. Positions are
+    # added in increasing order, so the dictionary stays sorted.
+    active = {}
+    # (end, position) of the active sites, to retire them by end coordinate
+    active_ends = []
+
+    for i, focal_site in enumerate(focal_sites):
+        window_start = focal_site[0] - bp_threshold
+        window_end = focal_site[1] + bp_threshold
+
+        while next_pos < num_sites and sites[next_pos][0] < window_end:
+            active[next_pos] = sites[next_pos]
+            heapq.heappush(active_ends, (sites[next_pos][1], next_pos))
+            next_pos += 1
+
+        # Windows only start later from here on, so these are done with
+        while active_ends and active_ends[0][0] <= window_start:
+            del active[heapq.heappop(active_ends)[1]]
+
+        for j, site in active.items():
+            # A longer focal site before this one may have let in sites that
+            # start past this window
+            if site[0] < window_end:
+                yield i, j, BindingSites.distance(focal_site, site)
+
+
+def relation(distance, competitive_threshold_bp, cooperative_threshold_bp):
+    """
+    Classifies the relation between two binding sites by their distance.
+    Sites closer than competitive_threshold_bp bases are considered to be
+    competing, and those further away but closer than cooperative_threshold_bp
+    bases to be cooperating.
+
+    :param distance: distance between the sites, as from
+                     BindingSites.distance()
+    :param competitive_threshold_bp: number of bases below which sites compete
+    :param cooperative_threshold_bp: number of bases below which sites
+                                     cooperate
+    :returns: COMPETITIVE, COOPERATIVE, or None if the sites are independent
+
+    """
+    if distance < competitive_threshold_bp:
+        return COMPETITIVE
+    if distance < cooperative_threshold_bp:
+        return COOPERATIVE
+    return None
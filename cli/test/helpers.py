@@ -0,0 +1,59 @@
+"""
+Data load functions and Storage instances made up for testing, shared by
+several test modules.
+
+"""
+
+import random
+
+from src.rnpfind.annotation_table import AnnotationTable
+from src.rnpfind.bind_analysis import Storage
+from src.rnpfind.binding_analysis_binding_sites import BindingSites
+from src.rnpfind.pwm_scan import motif_to_pwm, pwm_scan, reverse_complement
+from src.rnpfind.site_batch import SiteBatch
+
+RNA_INFO = {
+    "official_name": "TEST",
+    "chr_n": 5,
+    "start_coord": 1001,
+    "end_coord": 2000,
+    "strand": "-",
+}
+
+random.seed(7)
+GENOME = "".join(random.choice("ACGT") for _ in range(600))
+# Scanning gives nothing for regions with an unknown base, as for RBPDB
+GENOME = GENOME[:450] + "N" + GENOME[451:]
+MOTIFS = [("PUM2", "TGTA"), ("QKI", "ACTAAY"), ("PUM2", "TGTANATA")]
+MOTIFS += [("HNRNPC", "TTTT"), ("SRSF1", "GGANGA"), ("QKI", "NNCNN")]
+
+
+def scan_data_load(rna_info):
+    """A data load function scanning a made up genome, for testing"""
+    seq = GENOME[rna_info["start_coord"] - 1 : rna_info["end_coord"]]
+    if "N" in seq:
+        return
+    if rna_info["strand"] == "-":
+        seq = reverse_complement(seq)
+    for rbp, motif in MOTIFS:
+        sites = pwm_scan(seq, motif_to_pwm(motif))
+        yield SiteBatch.from_sites(rbp, (motif, "scan"), sites)
+
+
+def scan_max_site_length():
+    """The length of the longest site scan_data_load() gives"""
+    return max(len(motif) for _, motif in MOTIFS)
+
+
+def make_storage():
+    """Makes a small Storage instance, as load_data() would"""
+    annotation_table = AnnotationTable()
+    for row in [("id1", "clip"), ("id2", "clip"), ("id3", "scan")]:
+        annotation_table.add(row)
+    storage = Storage(annotation_table=annotation_table)
+    storage["HNRNPC"] = BindingSites([(10, 20, 0), (30, 40, (1, 2))])
+    storage["PUM2"] = BindingSites(
+        [(5, 8, 2), (6, 9, 2), (7, 7, (0, 1, 2))], overlap_mode=True
+    )
+    storage["QKI"] = BindingSites()
+    return storage
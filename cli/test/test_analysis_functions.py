@@ -7,6 +7,7 @@ import unittest
 
 from src.rnpfind.analysis_functions import (
     analysis_method_functions,
+    analysis_methods_default,
     analysis_methods_supported_long,
     analysis_methods_supported_short,
 )
@@ -56,6 +57,16 @@ class TestAnalysisMethods(unittest.TestCase):
         for method in analysis_methods_supported_short:
             self.assertIn(method, analysis_method_functions)
 
+    def test_default_methods(self):
+        """
+        Checks that the methods run by default are supported ones, and that
+        the per binding site csv is not among them.
+
+        """
+        for method in analysis_methods_default:
+            self.assertIn(method, analysis_methods_supported_short)
+        self.assertNotIn("sites", analysis_methods_default)
+
     def test_appropriate_method_type(self):
         """
         Checks that each of the analysis methods have a consistent type
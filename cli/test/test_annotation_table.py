@@ -0,0 +1,81 @@
+"""
+Tests the annotation table module for correctness.
+
+"""
+
+import unittest
+
+from src.rnpfind.annotation_table import AnnotationTable
+from src.rnpfind.binding_analysis_binding_sites import BindingSites
+from src.rnpfind.config import (
+    ANNOTATION_COLUMN_DELIMITER,
+    ANNOTATION_ROW_DELIMITER,
+)
+from src.rnpfind.load_data import annotation_to_columns
+
+
+class TestAnnotationTable(unittest.TestCase):
+    """
+    Check if the AnnotationTable class functions correctly
+    """
+
+    def test_add(self):
+        """Check that rows are stored once and given ids"""
+        table = AnnotationTable()
+        self.assertEqual(table.add(["id1", "clip seq"]), 0)
+        self.assertEqual(table.add(("id2", "clip seq")), 1)
+        self.assertEqual(table.add(("id1", "clip seq")), 0)
+        self.assertEqual(len(table), 2)
+        self.assertEqual(table[1], ("id2", "clip seq"))
+        self.assertEqual(table.get_rows(1), [("id2", "clip seq")])
+        self.assertEqual(
+            table.get_rows((1, 0)), [("id2", "clip seq"), ("id1", "clip seq")]
+        )
+
+    def test_overlap_collapse(self):
+        """
+        Check that merged sites refer to the rows of all the sites merged, in
+        the same way as merging delimiter-joined annotation strings does
+        """
+        rows = [("id1", "0.9"), ("id2", "0.5"), ("id3", "0.7")]
+        table = AnnotationTable()
+        table_sites = BindingSites(overlap_mode=True)
+        string_sites = BindingSites(overlap_mode=True)
+        for (start, end), row in zip([(10, 30), (20, 40), (60, 70)], rows):
+            table_sites.add((start, end, table.add(row)))
+            string_sites.add(
+                (start, end, ANNOTATION_COLUMN_DELIMITER.join(row))
+            )
+
+        table_sites.overlap_collapse(
+            "baseCoverNumber",
+            100,
+            in_place=True,
+            annotation_merger=AnnotationTable.merge,
+        )
+        string_sites.overlap_collapse(
+            "baseCoverNumber",
+            100,
+            in_place=True,
+            annotation_merger=ANNOTATION_ROW_DELIMITER.join,
+        )
+
+        self.assertEqual(
+            [site[:2] for site in table_sites], [(10, 40), (60, 70)]
+        )
+        for table_site, string_site in zip(table_sites, string_sites):
+            self.assertEqual(
+                sorted(table.get_rows(table_site[2])),
+                sorted(
+                    tuple(row.split(ANNOTATION_COLUMN_DELIMITER))
+                    for row in string_site[2].split(ANNOTATION_ROW_DELIMITER)
+                ),
+            )
+            self.assertEqual(
+                annotation_to_columns(table_site[2], table),
+                annotation_to_columns(string_site[2]),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
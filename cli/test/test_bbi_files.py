@@ -0,0 +1,427 @@
+"""
+Tests the bbi files module for correctness.
+
+"""
+
+import os
+import random
+import struct
+import tempfile
+import unittest
+import zlib
+
+from src.rnpfind.bbi_files import (
+    BIGBED_MAGIC,
+    BIGWIG_MAGIC,
+    CHROM_TREE_MAGIC,
+    R_TREE_MAGIC,
+    coverage_runs,
+    read_bed_rows,
+    read_wig_runs,
+    write_bigbed,
+    write_bigwig,
+)
+
+CHROM_SIZES = {"chr1": 5000, "chr2": 3000, "chr10": 800}
+
+AUTO_SQL = """table test
+"Sites for testing"
+(
+string chrom; "Chromosome"
+uint chromStart; "Start"
+uint chromEnd; "End"
+string name; "Name"
+)
+"""
+
+
+class BbiReader:
+    """Reads back BBI files by following their trees, for testing"""
+
+    def __init__(self, file_path):
+        with open(file_path, "rb") as handle:
+            self.data = handle.read()
+        (
+            self.magic,
+            self.version,
+            zoom_level_count,
+            chrom_tree_offset,
+            _,
+            self.index_offset,
+            self.field_count,
+            self.defined_field_count,
+            auto_sql_offset,
+            _,
+            self.uncompress_buf_size,
+            _,
+        ) = struct.unpack_from("<IHHQQQHHQQIQ", self.data)
+        self.zoom_levels = [
+            struct.unpack_from("<IIQQ", self.data, 64 + 24 * level)
+            for level in range(zoom_level_count)
+        ]
+        self.auto_sql = None
+        if auto_sql_offset:
+            end = self.data.index(b"\0", auto_sql_offset)
+            self.auto_sql = self.data[auto_sql_offset:end].decode()
+
+        magic, _, key_size, _, _, _ = struct.unpack_from(
+            "<IIIIQQ", self.data, chrom_tree_offset
+        )
+        assert magic == CHROM_TREE_MAGIC
+        self.chroms = {}
+        self.read_chrom_node(chrom_tree_offset + 32, key_size)
+
+    def read_chrom_node(self, offset, key_size):
+        """Reads the chromosomes under a node of the chromosome tree"""
+        is_leaf, _, count = struct.unpack_from("<BBH", self.data, offset)
+        offset += 4
+        for _ in range(count):
+            key = self.data[offset : offset + key_size].rstrip(b"\0")
+            offset += key_size
+            if is_leaf:
+                chrom_id, size = struct.unpack_from("<II", self.data, offset)
+                self.chroms[key.decode()] = (chrom_id, size)
+                offset += 8
+            else:
+                (child,) = struct.unpack_from("<Q", self.data, offset)
+                self.read_chrom_node(child, key_size)
+                offset += 8
+
+    def blocks(self, index_offset, chrom_id, start, end):
+        """Returns the blocks an R tree gives for a region, uncompressed"""
+        assert struct.unpack_from("<I", self.data, index_offset)[0] == (
+            R_TREE_MAGIC
+        )
+        found = []
+        nodes = [index_offset + 48]
+        while nodes:
+            offset = nodes.pop()
+            is_leaf, _, count = struct.unpack_from("<BBH", self.data, offset)
+            offset += 4
+            for _ in range(count):
+                bounds = struct.unpack_from("<IIII", self.data, offset)
+                overlaps = (bounds[0], bounds[1]) < (chrom_id, end) and (
+                    chrom_id,
+                    start,
+                ) < (bounds[2], bounds[3])
+                if is_leaf:
+                    block_offset, size = struct.unpack_from(
+                        "<QQ", self.data, offset + 16
+                    )
+                    if overlaps:
+                        found.append(
+                            zlib.decompress(
+                                self.data[block_offset : block_offset + size]
+                            )
+                        )
+                    offset += 32
+                else:
+                    if overlaps:
+                        nodes.append(
+                            struct.unpack_from("<Q", self.data, offset + 16)[0]
+                        )
+                    offset += 24
+        for block in found:
+            assert len(block) <= self.uncompress_buf_size
+        return found
+
+    def bed_rows(self, chrom, start, end):
+        """Returns the rows of a bigBed file overlapping a region"""
+        chrom_id = self.chroms[chrom][0]
+        rows = []
+        for block in self.blocks(self.index_offset, chrom_id, start, end):
+            offset = 0
+            while offset < len(block):
+                row_chrom_id, row_start, row_end = struct.unpack_from(
+                    "<III", block, offset
+                )
+                rest_end = block.index(b"\0", offset + 12)
+                rest = block[offset + 12 : rest_end].decode()
+                offset = rest_end + 1
+                if (
+                    row_chrom_id == chrom_id
+                    and row_start < end
+                    and start < row_end
+                ):
+                    rows.append((chrom, row_start, row_end, rest.split("\t")))
+        return sorted(rows)
+
+    def wig_runs(self, chrom):
+        """Returns the runs of values of a chromosome of a bigWig file"""
+        chrom_id, size = self.chroms[chrom]
+        runs = []
+        for block in self.blocks(self.index_offset, chrom_id, 0, size):
+            section = struct.unpack_from("<IIIIIBBH", block)
+            assert section[0] == chrom_id and section[5] == 1
+            for item in range(section[7]):
+                runs.append(
+                    (chrom,)
+                    + struct.unpack_from("<IIf", block, 24 + 12 * item)
+                )
+        return sorted(runs)
+
+    def zoom_records(self, level, chrom):
+        """Returns the summaries of a chromosome at a zoom level"""
+        _, _, data_offset, index_offset = self.zoom_levels[level]
+        chrom_id, size = self.chroms[chrom]
+        assert struct.unpack_from("<I", self.data, data_offset)[0] > 0
+        records = []
+        for block in self.blocks(index_offset, chrom_id, 0, size):
+            records += [
+                record
+                for record in struct.iter_unpack("<IIIIffff", block)
+                if record[0] == chrom_id
+            ]
+        return sorted(records)
+
+
+def random_bed_rows(count):
+    """Makes up rows of a BED file"""
+    rows = []
+    for i in range(count):
+        chrom = random.choice(list(CHROM_SIZES))
+        start = random.randint(0, CHROM_SIZES[chrom] - 40)
+        rows.append((chrom, start, start + random.randint(0, 40), [f"R{i}"]))
+    return rows
+
+
+class TestBbiFiles(unittest.TestCase):
+    """
+    Check if bigBed and bigWig files are written correctly
+    """
+
+    def test_coverage_runs(self):
+        """Check that the depth of coverage of intervals is found"""
+        self.assertEqual(
+            coverage_runs([(5, 10), (0, 3), (7, 12), (9, 9), (12, 14)]),
+            [(0, 3, 1), (5, 7, 1), (7, 10, 2), (10, 12, 1), (12, 14, 1)],
+        )
+        self.assertEqual(coverage_runs([]), [])
+
+    def test_write_bigbed(self):
+        """
+        Check that the rows of a bigBed file are found again by region, with
+        zoom levels summarizing their depth of coverage
+        """
+        random.seed(11)
+        with tempfile.TemporaryDirectory() as out_dir:
+            file_path = os.path.join(out_dir, "sites.bb")
+            for count in [0, 1, 50, 2000]:
+                rows = random_bed_rows(count)
+                write_bigbed(file_path, rows, CHROM_SIZES, AUTO_SQL, 3)
+                reader = BbiReader(file_path)
+
+                self.assertEqual(reader.magic, BIGBED_MAGIC)
+                self.assertEqual(reader.version, 4)
+                self.assertEqual(reader.auto_sql, AUTO_SQL)
+                self.assertEqual(reader.defined_field_count, 3)
+                self.assertEqual(reader.field_count, 4)
+                self.assertEqual(
+                    set(reader.chroms), {chrom for chrom, *_ in rows}
+                )
+                for _ in range(20):
+                    chrom = random.choice(sorted(reader.chroms or ["chr1"]))
+                    start = random.randint(0, CHROM_SIZES[chrom])
+                    end = start + random.randint(1, 1000)
+                    expected = sorted(
+                        row
+                        for row in rows
+                        if row[0] == chrom and row[1] < end and start < row[2]
+                    )
+                    if chrom in reader.chroms:
+                        self.assertEqual(
+                            reader.bed_rows(chrom, start, end), expected
+                        )
+
+                for level in range(len(reader.zoom_levels)):
+                    for chrom in reader.chroms:
+                        records = reader.zoom_records(level, chrom)
+                        depth = sum(
+                            end - start
+                            for row_chrom, start, end, _ in rows
+                            if row_chrom == chrom
+                        )
+                        self.assertEqual(
+                            sum(record[3] for record in records),
+                            len(
+                                set().union(
+                                    *(
+                                        range(start, end)
+                                        for row_chrom, start, end, _ in rows
+                                        if row_chrom == chrom
+                                    )
+                                )
+                            ),
+                        )
+                        self.assertAlmostEqual(
+                            sum(record[6] for record in records), depth
+                        )
+            self.assertGreater(len(reader.zoom_levels), 0)
+
+            with self.assertRaises(ValueError):
+                write_bigbed(
+                    file_path, [("chr3", 0, 5, ["R"])], CHROM_SIZES, AUTO_SQL
+                )
+            with self.assertRaises(ValueError):
+                write_bigbed(
+                    file_path,
+                    [("chr10", 0, 801, ["R"])],
+                    CHROM_SIZES,
+                    AUTO_SQL,
+                )
+
+    def test_write_bigwig(self):
+        """
+        Check that the runs of a bigWig file are read back, whether written
+        from a fixedStep or a bedGraph wig file
+        """
+        fixed_step = (
+            "track type=wiggle_0 visibility=full\n"
+            "fixedStep chrom=chr2 start=11 step=1\n"
+            + "\n".join(["0", "0", "1", "2", "2", "1", "0"])
+        )
+        bedgraph = (
+            "track type=bedGraph visibility=full\n"
+            "chr2\t10\t12\t0\n"
+            "chr2\t12\t13\t1\n"
+            "chr2\t13\t15\t2\n"
+            "chr2\t15\t16\t1\n"
+            "chr2\t16\t17\t0\n"
+        )
+        expected = [
+            ("chr2", 10, 12, 0.0),
+            ("chr2", 12, 13, 1.0),
+            ("chr2", 13, 15, 2.0),
+            ("chr2", 15, 16, 1.0),
+            ("chr2", 16, 17, 0.0),
+        ]
+        with tempfile.TemporaryDirectory() as out_dir:
+            wig_path = os.path.join(out_dir, "density.wig")
+            for wig in [fixed_step, bedgraph]:
+                with open(wig_path, "w") as handle:
+                    handle.write(wig)
+                self.assertEqual(read_wig_runs(wig_path), expected)
+
+            random.seed(2)
+            runs = []
+            for chrom in ["chr1", "chr10"]:
+                position = 0
+                while position < CHROM_SIZES[chrom] - 30:
+                    position += random.randint(0, 5)
+                    end = position + random.randint(1, 20)
+                    runs.append(
+                        (chrom, position, end, float(random.randint(0, 9)))
+                    )
+                    position = end
+            file_path = wig_path + ".bw"
+            write_bigwig(file_path, runs, CHROM_SIZES)
+            reader = BbiReader(file_path)
+
+            self.assertEqual(reader.magic, BIGWIG_MAGIC)
+            self.assertIsNone(reader.auto_sql)
+            self.assertEqual(
+                reader.wig_runs("chr1") + reader.wig_runs("chr10"), runs
+            )
+            self.assertGreater(len(reader.zoom_levels), 0)
+            for level in range(len(reader.zoom_levels)):
+                records = reader.zoom_records(level, "chr1")
+                self.assertAlmostEqual(
+                    sum(record[6] for record in records),
+                    sum(
+                        (end - start) * value
+                        for chrom, start, end, value in runs
+                        if chrom == "chr1"
+                    ),
+                )
+
+            with self.assertRaises(ValueError):
+                write_bigwig(
+                    file_path,
+                    [("chr1", 0, 10, 1.0), ("chr1", 5, 15, 1.0)],
+                    CHROM_SIZES,
+                )
+
+    def test_read_bed_rows(self):
+        """Check that the rows of a BED file are read"""
+        with tempfile.TemporaryDirectory() as out_dir:
+            bed_path = os.path.join(out_dir, "sites.bed")
+            with open(bed_path, "w") as handle:
+                handle.write("track name=x\nchr1\t3\t9\tPUM2\t0\t+\n\n")
+            self.assertEqual(
+                read_bed_rows(bed_path), [("chr1", 3, 9, ["PUM2", "0", "+"])]
+            )
+
+    def test_ucsc_files(self):
+        """
+        Check that bigBed and bigWig files are laid out byte for byte as the
+        UCSC tools lay them out. The files in test_data come from the test
+        data of the trackhub package, made there by bedToBigBed (from chr1
+        rows 20-60, 40-100, 80-90 and 250-300, with chr1 10000 bases long)
+        and bedGraphToBigWig (from sine-no1-100.bedgraph, with chromosomes
+        chr1, chr2 and chr3 100000, 75000 and 50000 bases long)
+        """
+        bed_rows = [
+            ("chr1", 20, 60, []),
+            ("chr1", 40, 100, []),
+            ("chr1", 80, 90, []),
+            ("chr1", 250, 300, []),
+        ]
+        bed3_auto_sql = (
+            "table bed\n"
+            '"Browser Extensible Data"\n'
+            "   (\n"
+            '   string chrom;       "Reference sequence chromosome or '
+            'scaffold"\n'
+            '   uint   chromStart;  "Start position in chromosome"\n'
+            '   uint   chromEnd;    "End position in chromosome"\n'
+            "   )\n"
+        )
+        with tempfile.TemporaryDirectory() as out_dir:
+            for ucsc_path, write in [
+                (
+                    "test/test_data/random-hg38-2.bigBed",
+                    lambda file_path: write_bigbed(
+                        file_path,
+                        bed_rows,
+                        {"chr1": 10000},
+                        bed3_auto_sql,
+                        3,
+                    ),
+                ),
+                (
+                    "test/test_data/sine-no1-100.bedgraph.bw",
+                    lambda file_path: write_bigwig(
+                        file_path,
+                        read_wig_runs("test/test_data/sine-no1-100.bedgraph"),
+                        {"chr1": 100000, "chr2": 75000, "chr3": 50000},
+                    ),
+                ),
+            ]:
+                file_path = os.path.join(out_dir, "ucsc")
+                write(file_path)
+                ucsc = BbiReader(ucsc_path)
+                written = BbiReader(file_path)
+                chrom_tree_offset, data_offset = struct.unpack_from(
+                    "<QQ", ucsc.data, 8
+                )
+                index_end = min(
+                    [data for _, _, data, _ in ucsc.zoom_levels]
+                    or [len(ucsc.data)]
+                )
+
+                # Header, zoom headers, autoSql and total summary
+                self.assertEqual(
+                    written.data[:chrom_tree_offset],
+                    ucsc.data[:chrom_tree_offset],
+                )
+                # Chromosome tree
+                self.assertEqual(
+                    written.data[chrom_tree_offset:data_offset],
+                    ucsc.data[chrom_tree_offset:data_offset],
+                )
+                # R tree of the data
+                self.assertEqual(
+                    written.data[ucsc.index_offset : index_end],
+                    ucsc.data[ucsc.index_offset : index_end],
+                )
+                self.assertEqual(written.data, ucsc.data)
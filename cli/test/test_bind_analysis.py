@@ -3,6 +3,7 @@ Tests the bind analysis module functions for correctness.
 
 """
 import copy
+import io
 import unittest
 
 from src.rnpfind.bind_analysis import Storage
@@ -120,6 +121,63 @@ class TestStorage(unittest.TestCase):
         self.assertTrue(True)
         # TODO: Do proper testing
 
+    def test_corr_update(self):
+        """
+        Check that correlations kept up to date while RBPs are added, replaced
+        and removed agree with correlations computed from scratch
+        """
+        storage = Storage()
+        storage["rbp1"] = BindingSites([(100, 200), (300, 400), (600, 700)])
+        storage["rbp2"] = BindingSites([(210, 290), (620, 640)])
+        storage.self_analysis_thresholds([15, 30], progress_feedback=False)
+
+        storage["rbp3"] = BindingSites([(440, 460), (745, 760)])
+        storage["rbp1"] = BindingSites([(100, 200), (450, 500)])
+        storage["rbp4"] = BindingSites([(250, 300)])
+        del storage["rbp2"]
+
+        self.assertEqual(
+            list(storage.gap_table.rbps), ["RBP1", "RBP3", "RBP4"]
+        )
+
+        fresh_storage = Storage()
+        for rbp, sites in storage.items():
+            fresh_storage[rbp] = sites
+
+        for threshold in [15, 30]:
+            self.assertEqual(
+                storage.self_analysis(
+                    bp_threshold=threshold, progress_feedback=False
+                ),
+                fresh_storage.self_analysis(
+                    bp_threshold=threshold, progress_feedback=False
+                ),
+            )
+
+        # Sites changed in place are noticed too, for thresholds computed
+        # before or not
+        storage["rbp4"].add((430, 445))
+        storage["rbp1"].remove((100, 200, None))
+        fresh_storage = Storage()
+        for rbp, sites in storage.items():
+            fresh_storage[rbp] = BindingSites(sites)
+
+        for threshold in [15, 30, 31]:
+            self.assertEqual(
+                storage.self_analysis(
+                    bp_threshold=threshold, progress_feedback=False
+                ),
+                fresh_storage.self_analysis(
+                    bp_threshold=threshold, progress_feedback=False
+                ),
+            )
+        self.assertNotEqual(
+            storage.self_analysis(bp_threshold=31, progress_feedback=False)[
+                "RBP3"
+            ]["RBP4"],
+            0,
+        )
+
     def test_summary(self):
         """
         Check that summary() returns correct info.
@@ -165,6 +223,122 @@ class TestStorage(unittest.TestCase):
         self.assertEqual(cor23, f_score(1, 1 / 2))
         self.assertEqual(cor13, f_score(1, 1 / 3))
 
+    def test_self_analysis_matrix(self):
+        """
+        Check that the correlation matrix agrees with the nested dictionary
+        returned by self_analysis()
+        """
+        storage = Storage()
+        storage["rbp1"] = BindingSites([(100, 200), (300, 400), (600, 700)])
+        storage["rbp2"] = BindingSites([(300, 400), (600, 700)])
+        storage["rbp3"] = BindingSites([(600, 700)])
+        storage["rbp4"] = BindingSites([(2000, 2100)])
+
+        matrix, rbps = storage.self_analysis_matrix(progress_feedback=False)
+        sym_cor_table = storage.self_analysis(progress_feedback=False)
+
+        self.assertEqual(rbps, ["RBP1", "RBP2", "RBP3", "RBP4"])
+        self.assertEqual(matrix.shape, (4, 4))
+        for i, rbp_i in enumerate(rbps):
+            for j, rbp_j in enumerate(rbps):
+                self.assertEqual(matrix[i][j], sym_cor_table[rbp_i][rbp_j])
+
+        # RBP4 binds too far away from the others
+        self.assertEqual(sym_cor_table["RBP1"]["RBP4"], 0)
+        self.assertEqual(sym_cor_table["RBP4"]["RBP4"], 1)
+
+    def test_self_analysis_thresholds(self):
+        """
+        Check that correlations for several thresholds at once agree with
+        self_analysis() run for each threshold separately
+        """
+        storage = Storage()
+        storage["rbp1"] = BindingSites([(100, 200), (300, 400), (600, 700)])
+        storage["rbp2"] = BindingSites([(210, 290), (620, 640)])
+        storage["rbp3"] = BindingSites([(440, 460), (745, 760)])
+
+        thresholds = [5, 15, 30, 50]
+        corr_tables = storage.self_analysis_thresholds(
+            thresholds, progress_feedback=False
+        )
+        self.assertEqual(list(corr_tables), thresholds)
+
+        for threshold in thresholds:
+            other_storage = Storage()
+            for rbp, sites in storage.items():
+                other_storage[rbp] = sites
+            self.assertEqual(
+                corr_tables[threshold],
+                other_storage.self_analysis(
+                    bp_threshold=threshold, progress_feedback=False
+                ),
+            )
+
+        # Sites 40 bases apart only score when the threshold is large enough
+        self.assertEqual(corr_tables[30]["RBP1"]["RBP3"], 0)
+        self.assertGreater(corr_tables[50]["RBP1"]["RBP3"], 0)
+
+    def test_self_analysis_sparse(self):
+        """
+        Check that the sparse correlation analysis lists exactly the non-zero
+        correlations between distinct RBPs
+        """
+        storage = Storage()
+        storage["rbp1"] = BindingSites([(100, 200), (300, 400), (600, 700)])
+        storage["rbp2"] = BindingSites([(210, 290), (620, 640)])
+        storage["rbp3"] = BindingSites([(440, 460), (745, 760)])
+        storage["rbp4"] = BindingSites([(2000, 2100)])
+
+        sparse_corr_lists = storage.self_analysis_sparse([30, 50])
+        corr_tables = storage.self_analysis_thresholds(
+            [30, 50], progress_feedback=False
+        )
+
+        for threshold in [30, 50]:
+            corr_table = corr_tables[threshold]
+            expected = [
+                (rbp1, rbp2, corr_table[rbp1][rbp2])
+                for rbp1, rbp2 in [
+                    ("RBP1", "RBP2"),
+                    ("RBP1", "RBP3"),
+                    ("RBP2", "RBP3"),
+                ]
+                if corr_table[rbp1][rbp2] != 0
+            ]
+            self.assertEqual(sparse_corr_lists[threshold], expected)
+
+        # RBP1 and RBP3 are 40 bases apart
+        self.assertEqual(
+            [(a, b) for a, b, _ in sparse_corr_lists[30]], [("RBP1", "RBP2")]
+        )
+        self.assertIn(
+            ("RBP1", "RBP3"), [(a, b) for a, b, _ in sparse_corr_lists[50]]
+        )
+
+    def test_self_analysis_jobs(self):
+        """
+        Check that computing correlations over several processes gives the
+        same result as computing them in one
+        """
+        storage = Storage()
+        storage["rbp1"] = BindingSites([(100, 200), (300, 400), (600, 700)])
+        storage["rbp2"] = BindingSites([(210, 290), (620, 640)])
+        storage["rbp3"] = BindingSites([(440, 460), (745, 760)])
+        storage["rbp4"] = BindingSites([(2000, 2100)])
+        storage["rbp5"] = BindingSites()
+        storage["rbp6"] = BindingSites([(50, 90), (450, 470), (1990, 2010)])
+
+        parallel_storage = copy.deepcopy(storage)
+
+        self.assertEqual(
+            parallel_storage.self_analysis_thresholds(
+                [10, 30, 50], progress_feedback=False, jobs=3
+            ),
+            storage.self_analysis_thresholds(
+                [10, 30, 50], progress_feedback=False
+            ),
+        )
+
     def test_bind_near(self):
         """Check that the binds_near() function works correctly"""
         storage = Storage()
@@ -175,6 +349,69 @@ class TestStorage(unittest.TestCase):
         rbps = storage.binds_near((400, 500))
         self.assertTrue(list_equal(rbps, ["RBP1", "RBP2"]))
 
+        # The site index should follow RBPs being added and removed
+        storage["rbp4"] = BindingSites([(520, 530)])
+        self.assertEqual(
+            storage.binds_near((400, 500), bp_threshold=30),
+            ["RBP1", "RBP2", "RBP4"],
+        )
+        del storage["rbp2"]
+        self.assertEqual(
+            storage.binds_near((400, 500), bp_threshold=30), ["RBP1", "RBP4"]
+        )
+
+        # ...and the sites of an RBP changing in place
+        storage["rbp3"].add((500, 510, "x"))
+        self.assertEqual(storage.binds_near((502, 503), 0), ["RBP3"])
+        storage["rbp3"].remove((500, 510, "x"))
+        self.assertEqual(storage.binds_near((502, 503), 0), [])
+
+    def test_window_join(self):
+        """Check that window_join() pairs up sites within a window"""
+        storage = Storage()
+        storage["rbp1"] = BindingSites([(100, 200), (300, 400), (600, 700)])
+        storage["rbp2"] = BindingSites([(200, 450), (600, 700)])
+        storage["rbp3"] = BindingSites([(720, 730)])
+
+        pairs = [
+            (gene_site[:2], rbp, site[:2], distance)
+            for gene_site, rbp, site, distance in storage.window_join(
+                "rbp3", bp_threshold=30
+            )
+        ]
+        self.assertEqual(
+            pairs,
+            [
+                ((720, 730), "RBP1", (600, 700), 20),
+                ((720, 730), "RBP2", (600, 700), 20),
+                ((720, 730), "RBP3", (720, 730), 0),
+            ],
+        )
+
+    def test_site_relations(self):
+        """
+        Check that site_relations() agrees with binds_near() on which sites
+        compete or cooperate with an RBP
+        """
+        storage = Storage()
+        storage["rbp1"] = BindingSites([(100, 200), (300, 400), (600, 700)])
+        storage["rbp2"] = BindingSites([(205, 220), (450, 460), (760, 780)])
+        storage["rbp3"] = BindingSites([(410, 415), (690, 695), (900, 910)])
+
+        site_relations = storage.site_relations("rbp1", 15, 56)
+        for binding_sites in storage.values():
+            for site in binding_sites:
+                if "RBP1" in storage.binds_near(site, bp_threshold=15):
+                    expected = "competitive"
+                elif "RBP1" in storage.binds_near(site, bp_threshold=56):
+                    expected = "cooperative"
+                else:
+                    expected = None
+                self.assertEqual(site_relations.get(site), expected)
+
+        self.assertNotIn((900, 910, None), site_relations)
+        self.assertEqual(site_relations[(450, 460, None)], "cooperative")
+
     def test_filter(self):
         """Check that the filter function works correctly"""
         storage = Storage()
@@ -271,6 +508,28 @@ class TestStorage(unittest.TestCase):
         self.assertTrue("chrX\t1200\t1300\tRBP2" in bed_lines)
         self.assertTrue("chrX\t1200\t1300\tRBP3" in bed_lines)
 
+    def test_write_bed(self):
+        """Check that write_bed() writes what print_bed() returns"""
+        storage = Storage()
+        storage["rbp1"] = BindingSites([(100, 200), (300, 400)])
+        storage["rbp2"] = BindingSites([(200, 450)])
+
+        bed_file = io.StringIO()
+        storage.write_bed(bed_file, chr_n=2, include_header=True)
+        self.assertEqual(
+            bed_file.getvalue(),
+            storage.print_bed(chr_n=2, include_header=True),
+        )
+        self.assertEqual(
+            bed_file.getvalue().split("\n")[1:],
+            [
+                "chr2\t100\t200\tRBP1",
+                "chr2\t300\t400\tRBP1",
+                "chr2\t200\t450\tRBP2",
+                "",
+            ],
+        )
+
     def test_sum_over_all(self):
         """Check that sum_over_all() works correctly"""
         storage = Storage()
@@ -293,6 +552,49 @@ class TestStorage(unittest.TestCase):
             )
         )
 
+        # Sites are tagged with the position of their RBP
+        storage = Storage()
+        storage["rbp1"] = BindingSites([(100, 200, 0), (300, 400, (1, 2))])
+        storage["rbp2"] = BindingSites([(100, 200, 0)])
+        storage["rbp3"] = BindingSites(
+            [(100, 200), (150, 250)], overlap_mode=True
+        )
+        summed = storage.sum_over_all()
+        self.assertTrue(summed.overlap_mode)
+        self.assertEqual(
+            list(summed),
+            [
+                (100, 200, (0, 0)),
+                (100, 200, (1, 0)),
+                (100, 200, (2, None)),
+                (150, 250, (2, None)),
+                (300, 400, (0, (1, 2))),
+            ],
+        )
+
+    def test_max_depth(self):
+        """Check that max_depth() works correctly"""
+        storage = Storage()
+        self.assertEqual(storage.max_depth(), 0)
+        storage["rbp1"] = BindingSites([(100, 200), (300, 400), (600, 700)])
+        storage["rbp2"] = BindingSites([(200, 450), (600, 700)])
+        self.assertEqual(storage.max_depth(), 2)
+        self.assertIs(storage.get_summed_sites(), storage.get_summed_sites())
+
+        # The summed sites are gathered again when RBPs change
+        storage["rbp3"] = BindingSites([(600, 700)])
+        self.assertEqual(storage.max_depth(), 3)
+        del storage["rbp3"]
+        self.assertEqual(storage.max_depth(), 2)
+
+        # ...and when the sites of an RBP change in place
+        storage["rbp3"] = BindingSites()
+        self.assertEqual(storage.max_depth(), 2)
+        storage["rbp3"].add((620, 680))
+        self.assertEqual(storage.max_depth(), 3)
+        storage["rbp3"].remove((620, 680, None))
+        self.assertEqual(storage.max_depth(), 2)
+
     def test_print_wig(self):
         """Check that print_wig() works correctly"""
         storage = Storage()
@@ -4,11 +4,15 @@ Tests the bind analysis (BindingSites) module functions for correctness.
 Remember that binding sites are made of (start coord, end coord, annotation)
 
 """
+
 import copy
+import io
 import random
 import string
 import unittest
+from unittest import mock
 
+from src.rnpfind import binding_analysis_binding_sites
 from src.rnpfind.binding_analysis_binding_sites import BindingSites
 
 
@@ -112,6 +116,21 @@ class TestBindingSites(unittest.TestCase):
             [[(85, 99, "orangeblue")], [(85, 99, "blueorange")]],
         )
 
+    def test_add_many(self):
+        """Check that add_many() gives the same result as add()"""
+        new_sites = [(10, 20, "a"), (15, 30, "b"), (5, 8, "c"), (15, 30, "b")]
+        for overlap_mode in (True, False):
+            one_by_one = BindingSites(overlap_mode=overlap_mode)
+            for site in new_sites:
+                one_by_one.add(site)
+            at_once = BindingSites(overlap_mode=overlap_mode)
+            at_once.add_many(new_sites[:1])
+            at_once.add_many(new_sites[1:])
+            self.assertEqual(list(at_once), list(one_by_one))
+
+        with self.assertRaises(ValueError):
+            BindingSites(overlap_mode=True).add_many([(10, 5, "a")])
+
     def test_remove(self):
         """Check that site removal works correctly"""
         sites = BindingSites()
@@ -266,6 +285,53 @@ class TestBindingSites(unittest.TestCase):
             self.assertEqual(int(end), ends[i])
             self.assertEqual(name, site_name)
 
+    @mock.patch.object(
+        binding_analysis_binding_sites, "BED_WRITE_BATCH_SIZE", 2
+    )
+    def test_write_bed(self):
+        """
+        Check that write_bed() writes what print_bed() returns, a few lines
+        at a time
+        """
+        sites = BindingSites([(70, 90, "a"), (100, 110, "b"), (140, 200, "a")])
+
+        def color(site):
+            return (255, 0, 0) if site[2] == "a" else [0, 0, 255]
+
+        bed_file = io.StringIO()
+        with mock.patch.object(
+            bed_file, "writelines", wraps=bed_file.writelines
+        ) as writelines:
+            sites.write_bed(
+                bed_file,
+                name="RBP",
+                chr_n=5,
+                displacement=1000,
+                antisense=True,
+                include_color=True,
+                conditional_color_func=color,
+            )
+        self.assertEqual(
+            [len(call.args[0]) for call in writelines.call_args_list], [2, 1]
+        )
+        self.assertEqual(
+            bed_file.getvalue(),
+            "chr5\t800\t860\tRBP\t1000\t-\t800\t860\t255,0,0\n"
+            "chr5\t890\t900\tRBP\t1000\t-\t890\t900\t0,0,255\n"
+            "chr5\t910\t930\tRBP\t1000\t-\t910\t930\t255,0,0\n",
+        )
+        self.assertEqual(
+            bed_file.getvalue(),
+            sites.print_bed(
+                name="RBP",
+                chr_n=5,
+                displacement=1000,
+                antisense=True,
+                include_color=True,
+                conditional_color_func=color,
+            ),
+        )
+
     def test_return_depth(self):
         """Check that return_depth() works correctly"""
         sites = BindingSites(overlap_mode=True)
@@ -291,6 +357,125 @@ class TestBindingSites(unittest.TestCase):
             + [1] * 2,
         )
 
+    def test_depth_runs(self):
+        """Check that the depth of coverage is computed and kept correctly"""
+        sites = BindingSites(overlap_mode=True)
+        sites.add((7, 9))
+        sites.add((9, 11))
+        sites.add((14, 20))
+        sites.add((15, 18))
+        sites.add((16, 16))
+        self.assertEqual(
+            sites.get_depth_runs(),
+            [(7, 11, 1), (14, 15, 1), (15, 18, 2), (18, 20, 1)],
+        )
+        self.assertIs(sites.get_depth_runs(), sites.get_depth_runs())
+        self.assertEqual(sites.max_depth(), 2)
+        self.assertEqual(sites.base_cover(), 10)
+
+        # Adding or removing sites drops the runs computed
+        sites.add((16, 17))
+        self.assertEqual(sites.max_depth(), 3)
+        sites.remove((16, 17, None))
+        self.assertEqual(sites.max_depth(), 2)
+        with self.assertRaises(ValueError):
+            sites.return_depth(length=19)
+        self.assertEqual(BindingSites().max_depth(), 0)
+
+    def test_overlap_mode_queries(self):
+        """
+        Check that overlap queries work on overlapping sites (overlap_mode on)
+        """
+        sites = BindingSites(overlap_mode=True)
+        sites.add((10, 100, "a"))
+        sites.add((20, 30, "b"))
+        sites.add((25, 40, "c"))
+        sites.add((60, 70, "d"))
+
+        self.assertTrue(sites.is_overlap((35, 36)))
+        self.assertFalse(sites.is_overlap((100, 120)))
+
+        filtered = sites.filter_overlap((28, 35))
+        self.assertTrue(filtered.overlap_mode)
+        self.assertEqual(sta_list(filtered), [(10, 100), (20, 30), (25, 40)])
+        self.assertEqual(
+            sta_list(sites.filter_overlap((101, 110), bp_threshold=2)),
+            [(10, 100)],
+        )
+
+        self.assertEqual(sta_list(sites.sites_at(25)), sta_list(filtered))
+        self.assertEqual(sta_list(sites.sites_at(40)), [(10, 100)])
+        self.assertEqual(sites.sites_at(100), [])
+
+        depth_array = sites.return_depth(length=110)
+        for position in range(110):
+            self.assertEqual(sites.depth_at(position), depth_array[position])
+
+        # The index should follow the sites being added and removed
+        sites.add((95, 105, "e"))
+        self.assertEqual(sites.depth_at(96), 2)
+        sites.remove((10, 100, "a"))
+        self.assertEqual(sites.depth_at(96), 1)
+        self.assertEqual(sites.depth_at(50), 0)
+
+    def test_set_operations(self):
+        """
+        Check that union(), intersect(), subtract() and complement() work
+        correctly
+        """
+        sites_1 = BindingSites()
+        sites_1.add((10, 20, "a"))
+        sites_1.add((30, 50, "b"))
+        sites_1.add((70, 80, "c"))
+
+        sites_2 = BindingSites()
+        sites_2.add((15, 35, "x"))
+        sites_2.add((40, 45, "y"))
+        sites_2.add((80, 90, "z"))
+
+        union = sites_1.union(sites_2)
+        self.assertEqual(sta_list(union), [(10, 50), (70, 80), (80, 90)])
+        self.assertEqual(set(union[0][2]), {"a", "b", "x", "y"})
+
+        # The same as adding the sites one by one
+        added = copy.deepcopy(sites_1)
+        for site in sites_2:
+            added.add(site)
+        self.assertEqual(sta_list(union), sta_list(added))
+
+        union = sites_1.union(
+            sites_2, annotation_merger=lambda annotations: "".join(annotations)
+        )
+        self.assertEqual(union[0][2], "axby")
+
+        intersection = sites_1.intersect(sites_2)
+        self.assertEqual(
+            sta_list(intersection), [(15, 20), (30, 35), (40, 45)]
+        )
+        self.assertEqual(set(intersection[1][2]), {"b", "x"})
+
+        difference = sites_1.subtract(sites_2)
+        self.assertEqual(
+            sta_list(difference), [(10, 15), (35, 40), (45, 50), (70, 80)]
+        )
+        self.assertEqual(
+            [site[2] for site in difference], ["a", "b", "b", "c"]
+        )
+        self.assertEqual(sta_list(sites_2.subtract(sites_2)), [])
+
+        self.assertEqual(
+            sta_list(sites_1.complement(100)),
+            [(0, 10), (20, 30), (50, 70), (80, 100)],
+        )
+        self.assertEqual(sta_list(sites_1.complement(40)), [(0, 10), (20, 30)])
+        self.assertEqual(sta_list(BindingSites().complement(5)), [(0, 5)])
+
+        overlapping_sites = BindingSites(overlap_mode=True)
+        with self.assertRaises(ValueError):
+            sites_1.union(overlapping_sites)
+        with self.assertRaises(ValueError):
+            overlapping_sites.complement(100)
+
     def test_overlap_collapse(self):
         """Check that overlap_collapse() works correctly"""
         sites = BindingSites(overlap_mode=True)
@@ -472,3 +657,46 @@ class TestBindingSites(unittest.TestCase):
                 1,
             ],
         )
+
+    def test_print_bedgraph(self):
+        """
+        Test that print_bedgraph() gives the depths print_wig() gives, one
+        line per run of bases of the same depth
+        """
+        sites = BindingSites(overlap_mode=True)
+        sites.add((7, 9))
+        sites.add((14, 20))
+        sites.add((15, 18))
+        sites.add((16, 17))
+
+        bedgraph = sites.print_bedgraph(
+            chr_no=2, displacement=100, length=22, include_header=False
+        )
+        self.assertEqual(
+            bedgraph.split("\n"),
+            [
+                "chr2\t100\t107\t0",
+                "chr2\t107\t109\t1",
+                "chr2\t109\t114\t0",
+                "chr2\t114\t115\t1",
+                "chr2\t115\t116\t2",
+                "chr2\t116\t117\t3",
+                "chr2\t117\t118\t2",
+                "chr2\t118\t120\t1",
+                "chr2\t120\t122\t0",
+                "",
+            ],
+        )
+
+        antisense_bedgraph = sites.print_bedgraph(
+            displacement=100, length=22, antisense=True
+        ).split("\n")
+        self.assertEqual(
+            antisense_bedgraph[0], "track type=bedGraph visibility=full"
+        )
+        self.assertEqual(antisense_bedgraph[1], "chr1\t100\t102\t0")
+        self.assertEqual(antisense_bedgraph[-3], "chr1\t113\t115\t1")
+        self.assertEqual(antisense_bedgraph[-2], "chr1\t115\t122\t0")
+
+        with self.assertRaises(ValueError):
+            sites.print_bedgraph(length=19)
@@ -0,0 +1,87 @@
+"""
+Tests the coverage collapse module for correctness.
+
+"""
+
+import random
+import unittest
+
+from src.rnpfind.annotation_table import AnnotationTable
+from src.rnpfind.binding_analysis_binding_sites import BindingSites
+from src.rnpfind.coverage_collapse import (
+    ASCENDING_STARTS,
+    DESCENDING_ENDS,
+    CoverageCollapser,
+)
+
+
+class TestCoverageCollapser(unittest.TestCase):
+    """
+    Check if the CoverageCollapser class functions correctly
+    """
+
+    def test_collapse(self):
+        """
+        Check that collapsing sites while they come in gives the same sites as
+        overlap_collapse() does
+        """
+        random.seed(0)
+        for _ in range(200):
+            sites = []
+            for i in range(random.randint(1, 30)):
+                start = random.randint(0, 100)
+                end = start + random.choice([0, 1, 5, 10, 30])
+                sites.append((start, end, i % 7))
+            sites.append(sites[0])
+
+            binding_sites = BindingSites(overlap_mode=True)
+            for site in sites:
+                binding_sites.add(site)
+            if binding_sites.base_cover() == 0:
+                continue
+
+            for number in (
+                binding_sites.base_cover(),
+                binding_sites.base_cover() // 3,
+                0,
+            ):
+                collapsed = binding_sites.overlap_collapse(
+                    "baseCoverNumber",
+                    number,
+                    annotation_merger=AnnotationTable.merge,
+                )
+                for order, key in (
+                    (ASCENDING_STARTS, lambda site: site[0]),
+                    (DESCENDING_ENDS, lambda site: -site[1]),
+                ):
+                    collapser = CoverageCollapser(
+                        order,
+                        keep_depth_runs=True,
+                        annotation_merger=AnnotationTable.merge,
+                    )
+                    collapser.add_many(sorted(sites, key=key))
+                    collapser.finish()
+                    self.assertEqual(
+                        collapser.base_cover(), binding_sites.base_cover()
+                    )
+                    self.assertEqual(
+                        collapser.collapse(number), list(collapsed)
+                    )
+
+    def test_order(self):
+        """Check that sites given out of order are refused"""
+        collapser = CoverageCollapser(ASCENDING_STARTS)
+        collapser.add((10, 20, None))
+        with self.assertRaises(ValueError):
+            collapser.add((5, 20, None))
+
+        collapser = CoverageCollapser(DESCENDING_ENDS)
+        collapser.add((10, 20, None))
+        with self.assertRaises(ValueError):
+            collapser.add((10, 30, None))
+
+        collapser = CoverageCollapser()
+        collapser.add((10, 20, None))
+        collapser.add((12, 30, None))
+        with self.assertRaises(ValueError):
+            collapser.collapse(5)
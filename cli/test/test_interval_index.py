@@ -0,0 +1,60 @@
+"""
+Tests the interval index module for correctness.
+
+"""
+
+import random
+import unittest
+
+from src.rnpfind.interval_index import IntervalIndex
+
+
+class TestIntervalIndex(unittest.TestCase):
+    """
+    Check if the IntervalIndex class functions correctly
+    """
+
+    def test_overlap(self):
+        """Check that overlap() finds the intervals overlapping a range"""
+        index = IntervalIndex(
+            [(300, 400), (100, 200), (150, 900), (600, 700), (200, 200)],
+            ["b", "a", "c", "d", "e"],
+        )
+        self.assertEqual(
+            index.intervals,
+            [(100, 200), (150, 900), (200, 200), (300, 400), (600, 700)],
+        )
+        self.assertEqual(index.overlap_labels(190, 310), ["a", "c", "e", "b"])
+        self.assertEqual(index.overlap_labels(400, 600), ["c"])
+        self.assertEqual(index.overlap_labels(900, 1000), [])
+        self.assertEqual(IntervalIndex().overlap(0, 100), [])
+
+    def test_overlap_random(self):
+        """
+        Check overlap() against brute force on random (overlapping) intervals
+        """
+        rng = random.Random(0)
+        for _ in range(200):
+            intervals = []
+            for _ in range(rng.randint(0, 100)):
+                start = rng.randint(0, 1000)
+                intervals.append((start, start + rng.choice([0, 5, 50, 400])))
+            index = IntervalIndex(intervals)
+
+            for _ in range(10):
+                start = rng.randint(-50, 1050)
+                end = start + rng.randint(0, 100)
+                self.assertEqual(
+                    index.overlap(start, end),
+                    [
+                        i
+                        for i, (site_start, site_end) in enumerate(
+                            index.intervals
+                        )
+                        if site_start < end and start < site_end
+                    ],
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,245 @@
+"""
+Tests the load data module for correctness.
+
+"""
+
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from src.rnpfind import load_data as load_data_module
+from src.rnpfind.coverage_collapse import ASCENDING_STARTS
+from src.rnpfind.load_data import data_chunks, load_data
+from src.rnpfind.site_batch import SiteBatch, batch_sites
+
+from .helpers import RNA_INFO
+from .helpers import scan_data_load as genome_scan_data_load
+from .helpers import scan_max_site_length
+
+
+def scan_data_load(rna_info):
+    """A CPU bound style data load function, for testing"""
+    for i in range(0, rna_info["length"], 7):
+        yield "PUM2", i, i + 5, ("motif", str(i % 3))
+        yield "QKI", i + 2, i + 4, "motif;x"
+    yield SiteBatch.from_sites("QKI", ("motif", "y"), [(1, 3), (50, 55)])
+
+
+def file_data_load(rna_info):
+    """An I/O bound style data load function, for testing"""
+    return [
+        ("HNRNPC", 3, 40, ("id1", "clip")),
+        ("HNRNPC", 30, 60, ("id2", "clip")),
+        ("PUM2", 0, rna_info["length"], ("id3", "clip")),
+    ]
+
+
+@mock.patch.dict(
+    load_data_module.data_load_sources_functions,
+    {
+        "scan_a": scan_data_load,
+        "scan_b": scan_data_load,
+        "file": file_data_load,
+    },
+)
+@mock.patch.object(load_data_module, "io_bound_data_load_sources", {"file"})
+@mock.patch.object(load_data_module, "uncached_data_load_sources", {"scan_b"})
+class TestLoadData(unittest.TestCase):
+    """
+    Check if load_data functions correctly
+    """
+
+    def test_concurrent_load_data(self):
+        """
+        Check that loading data sources concurrently gives the same result as
+        loading them one after the other
+        """
+        rna_info = {"official_name": "TEST", "length": 100}
+        sources = ["scan_a", "file", "scan_b"]
+
+        serial = load_data(sources, rna_info)
+        concurrent = load_data(sources, rna_info, jobs=2)
+
+        self.assertEqual(list(concurrent), sources)
+        for source in sources:
+            self.assertEqual(list(concurrent[source]), list(serial[source]))
+            self.assertEqual(
+                concurrent[source].annotation_table.rows,
+                serial[source].annotation_table.rows,
+            )
+            for rbp, binding_sites in serial[source].items():
+                self.assertEqual(
+                    list(concurrent[source][rbp]), list(binding_sites)
+                )
+
+    def test_batch_sites(self):
+        """Check that binding sites are grouped into chunks correctly"""
+        sites = [
+            ("PUM2", 0, 5, ("a",)),
+            ("QKI", 3, 9, ["b"]),
+            ("PUM2", 7, 8, ("b",)),
+            SiteBatch.from_sites("HNRNPC", ("c",), [(1, 2), (4, 6)]),
+            ("QKI", 10, 12, ("a",)),
+        ]
+        batches = list(batch_sites(sites, batch_size=2))
+        self.assertEqual([len(batch) for batch in batches], [2, 1, 2, 1])
+        self.assertEqual(batches[0].rbps, ["PUM2", "QKI"])
+        self.assertEqual(batches[0].annotations, [("a",), ("b",)])
+        self.assertIs(batches[2], sites[3])
+        self.assertEqual(
+            [site for batch in batches for site in batch],
+            [
+                ("PUM2", 0, 5, ("a",)),
+                ("QKI", 3, 9, ("b",)),
+                ("PUM2", 7, 8, ("b",)),
+                ("HNRNPC", 1, 2, ("c",)),
+                ("HNRNPC", 4, 6, ("c",)),
+                ("QKI", 10, 12, ("a",)),
+            ],
+        )
+        self.assertEqual(
+            list(batches[0].rbp_rows()), [("PUM2", [0]), ("QKI", [1])]
+        )
+
+    def test_streaming_load_data(self):
+        """
+        Check that collapsing the sites of a sorted data source while they are
+        loaded gives the same result as collapsing them after
+        """
+        rna_info = {"official_name": "TEST", "length": 100}
+        serial = load_data(["file"], rna_info)
+        with mock.patch.dict(
+            load_data_module.data_load_sources_site_orders,
+            {"file": lambda _: ASCENDING_STARTS},
+        ):
+            streamed = load_data(["file"], rna_info)
+            streamed_table = load_data(["file"], rna_info, as_site_table=True)
+
+        self.assertEqual(list(streamed["file"]), list(serial["file"]))
+        for rbp, binding_sites in serial["file"].items():
+            self.assertFalse(streamed["file"][rbp].overlap_mode)
+            self.assertEqual(list(streamed["file"][rbp]), list(binding_sites))
+            self.assertEqual(
+                list(streamed_table.storage("file")[rbp]), list(binding_sites)
+            )
+
+    def test_cached_load_data(self):
+        """
+        Check that data sources loaded before are taken from the cache, unless
+        they are not to be cached
+        """
+        rna_info = {
+            "official_name": "TEST",
+            "chr_n": 1,
+            "start_coord": 1,
+            "end_coord": 100,
+            "strand": "+",
+            "length": 100,
+        }
+        sources = ["scan_a", "file", "scan_b"]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            loaded = load_data(sources, rna_info, cache_dir=cache_dir)
+
+            def failing_data_load(_):
+                raise AssertionError("Data source was loaded again")
+
+            with mock.patch.dict(
+                load_data_module.data_load_sources_functions,
+                {"scan_a": failing_data_load, "file": failing_data_load},
+            ):
+                cached = load_data(sources, rna_info, cache_dir=cache_dir)
+                with self.assertRaises(AssertionError):
+                    load_data(["file"], rna_info)
+
+        self.assertEqual(list(cached), sources)
+        for source in sources:
+            self.assertEqual(
+                cached[source].annotation_table.rows,
+                loaded[source].annotation_table.rows,
+            )
+            for rbp, binding_sites in loaded[source].items():
+                self.assertEqual(
+                    list(cached[source][rbp]), list(binding_sites)
+                )
+
+    def test_site_table_load_data(self):
+        """
+        Check that loading data sources into a SiteTable, cached or not, gives
+        the same binding sites as loading them into Storage instances, whether
+        or not some bases are cut off
+        """
+        rna_info = dict(RNA_INFO, start_coord=1, end_coord=100, length=100)
+        sources = ["scan_a", "file", "scan_b"]
+        for ratio in [1, 0.5]:
+            with mock.patch.object(
+                load_data_module,
+                "EXPERIMENTAL_BINDING_SITE_ACCEPTABLE_COVERAGE_RATIO",
+                ratio,
+            ), tempfile.TemporaryDirectory() as cache_dir:
+                big_storage = load_data(sources, rna_info)
+                for _ in range(2):
+                    site_table = load_data(
+                        sources,
+                        rna_info,
+                        cache_dir=cache_dir,
+                        as_site_table=True,
+                    )
+                    self.assertEqual(site_table.sources, sources)
+                    for source, storage in big_storage.items():
+                        table_storage = site_table.group_by_source()[source]
+                        self.assertEqual(
+                            sorted(table_storage), sorted(storage)
+                        )
+                        for rbp, binding_sites in storage.items():
+                            self.assertEqual(
+                                list(table_storage[rbp]), list(binding_sites)
+                            )
+
+    @mock.patch.dict(
+        load_data_module.data_load_sources_functions,
+        {"genome_scan": genome_scan_data_load},
+    )
+    @mock.patch.dict(
+        load_data_module.data_load_sources_max_site_lengths,
+        {"genome_scan": scan_max_site_length},
+    )
+    def test_chunked_load_data(self):
+        """
+        Check that scanning an RNA in chunks, one after the other or
+        concurrently, gives the same result as scanning it whole
+        """
+        rna_info = dict(RNA_INFO, start_coord=1, end_coord=100)
+        self.assertIsNone(data_chunks("genome_scan", rna_info))
+        self.assertIsNone(data_chunks("genome_scan", rna_info, 100))
+        self.assertIsNone(data_chunks("file", rna_info, 10))
+        self.assertEqual(
+            data_chunks("genome_scan", rna_info, 40),
+            [(0, 47), (40, 87), (80, 100)],
+        )
+
+        random.seed(5)
+        for _ in range(30):
+            start = random.randint(1, 500)
+            rna_info = dict(
+                RNA_INFO,
+                strand=random.choice("+-"),
+                start_coord=start,
+                end_coord=random.randint(start + 10, 600),
+            )
+            chunk_length = random.randint(1, 60)
+            whole = load_data(["genome_scan"], rna_info)["genome_scan"]
+            for jobs in [1, 2] if chunk_length > 30 else [1]:
+                chunked = load_data(
+                    ["genome_scan"],
+                    rna_info,
+                    jobs=jobs,
+                    chunk_length=chunk_length,
+                )["genome_scan"]
+                self.assertEqual(
+                    chunked.annotation_table.rows,
+                    whole.annotation_table.rows,
+                )
+                self.assertEqual(list(chunked), list(whole))
+                for rbp, binding_sites in whole.items():
+                    self.assertEqual(list(chunked[rbp]), list(binding_sites))
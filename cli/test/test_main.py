@@ -0,0 +1,134 @@
+"""
+Tests the batch mode of the main module for correctness.
+
+"""
+
+import csv
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from src.rnpfind import load_data as load_data_module
+from src.rnpfind import main as main_module
+from src.rnpfind.main import (
+    MANIFEST_FILE_NAME,
+    batch_dir_name,
+    read_batch_file,
+    rnpfind_batch,
+)
+
+
+def file_data_load(rna_info):
+    """A data load function giving sites along the whole RNA, for testing"""
+    length = rna_info["end_coord"] - rna_info["start_coord"] + 1
+    return [
+        ("HNRNPC", 3, 40, ("id1", "clip")),
+        ("PUM2", 0, length, ("id2", "clip")),
+    ]
+
+
+def get_rna_preference(transcript):
+    """Looks up made up transcripts, as get_user_rna_preference() would"""
+    if transcript == "NOTAGENE":
+        print("Error parsing transcript", file=sys.stderr)
+        sys.exit(1)
+    if transcript == "BROKEN":
+        return {
+            "official_name": transcript,
+            "chr_n": 1,
+            "start_coord": 100,
+            "end_coord": 1,
+            "strand": "+",
+        }
+    return {
+        "official_name": transcript.upper(),
+        "chr_n": 1,
+        "start_coord": 1,
+        "end_coord": 100,
+        "strand": "+",
+    }
+
+
+def rbps_analysis(big_storage, rna_info, configs):
+    """An analysis method listing the RBPs found, for testing"""
+    with open(os.path.join(configs["out_dir"], "rbps.txt"), "w") as handle:
+        handle.write(" ".join(big_storage["file"].get_rbps()))
+
+
+@mock.patch.dict(
+    load_data_module.data_load_sources_functions, {"file": file_data_load}
+)
+@mock.patch.dict(
+    main_module.analysis_method_functions, {"rbps": rbps_analysis}
+)
+@mock.patch.object(main_module, "get_user_rna_preference", get_rna_preference)
+@mock.patch.object(main_module, "check_ro_data", lambda: None)
+class TestBatch(unittest.TestCase):
+    """
+    Check if several transcripts are analysed correctly in batch mode
+    """
+
+    def test_read_batch_file(self):
+        """Check that transcripts are read from a batch file"""
+        with tempfile.TemporaryDirectory() as out_dir:
+            batch_file = os.path.join(out_dir, "genes.txt")
+            with open(batch_file, "w") as handle:
+                handle.write(
+                    "# genes\nMalat1\n\n 5:4000-14000 \nMalat1\nMALAT1\n"
+                )
+            self.assertEqual(
+                read_batch_file(batch_file), ["Malat1", "5:4000-14000"]
+            )
+        self.assertEqual(batch_dir_name("Malat1"), "malat1")
+        self.assertEqual(batch_dir_name("5:4000-14000"), "5_4000-14000")
+
+    def test_rnpfind_batch(self):
+        """
+        Check that each transcript gets its own output directory and a row in
+        the manifest, whether or not its analysis fails, however many
+        processes the batch is spread over
+        """
+        transcripts = ["Malat1", "NOTAGENE", "BROKEN", "5:4000-14000"]
+        for jobs in [1, 2]:
+            with tempfile.TemporaryDirectory() as out_dir:
+                rows = rnpfind_batch(
+                    transcripts,
+                    sources=["file"],
+                    methods=["rbps"],
+                    out_dir=out_dir,
+                    jobs=jobs,
+                    use_cache=False,
+                )
+                with open(os.path.join(out_dir, MANIFEST_FILE_NAME)) as handle:
+                    manifest = list(csv.DictReader(handle, delimiter="\t"))
+                self.assertEqual(
+                    sorted(os.listdir(out_dir)),
+                    ["5_4000-14000", "malat1", MANIFEST_FILE_NAME],
+                )
+                for directory in ["malat1", "5_4000-14000"]:
+                    path = os.path.join(out_dir, directory, "rbps.txt")
+                    with open(path) as handle:
+                        self.assertEqual(handle.read(), "HNRNPC PUM2")
+
+            self.assertEqual(
+                [row["transcript"] for row in manifest], transcripts
+            )
+            self.assertEqual(
+                [row["status"] for row in manifest],
+                ["done", "not found", "failed", "done"],
+            )
+            self.assertEqual(
+                [row["status"] for row in rows],
+                [row["status"] for row in manifest],
+            )
+            self.assertEqual(manifest[0]["name"], "MALAT1")
+            self.assertEqual(manifest[0]["region"], "1:1-100(+)")
+            self.assertEqual(manifest[0]["rbps"], "2")
+            self.assertEqual(manifest[0]["sites"], "2")
+            self.assertIn("ValueError", manifest[2]["error"])
+
+        # Transcripts that would share an output directory are refused
+        with self.assertRaises(ValueError):
+            rnpfind_batch(["Malat1", "MALAT1"], sources=["file"])
@@ -0,0 +1,175 @@
+"""
+Tests the output scheduler module for correctness.
+
+"""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from src.rnpfind import load_data as load_data_module
+from src.rnpfind import populate_trackhub as populate_trackhub_module
+from src.rnpfind.load_data import load_data
+from src.rnpfind.output_scheduler import OutputTask, run_output_tasks
+from src.rnpfind.ucsc_visualize import ucsc_visualize
+
+from .helpers import make_storage, scan_data_load
+
+RNA_INFO = {
+    "official_name": "TEST",
+    "chr_n": 5,
+    "start_coord": 1001,
+    "end_coord": 1100,
+    "strand": "-",
+}
+
+AUTO_SQL_TEMPLATE = """table insert_source_name_here
+"Binding sites for testing"
+(
+string chrom; "Chromosome"
+uint chromStart; "Start"
+uint chromEnd; "End"
+string name; "RBP"
+uint score; "Score"
+char[1] strand; "Strand"
+uint thickStart; "Thick start"
+uint thickEnd; "Thick end"
+uint reserved; "Color"
+"""
+
+
+def write_file(path, text, *inputs):
+    """Writes a file out of the text of other files, for testing"""
+    for input_path in inputs:
+        with open(input_path) as handle:
+            text += handle.read()
+    with open(path, "w") as handle:
+        handle.write(text)
+    return len(text)
+
+
+def read_tree(directory):
+    """Returns the contents of every file under a directory, by path"""
+    contents = {}
+    for path in sorted(Path(directory).rglob("*")):
+        if path.is_file():
+            contents[str(path.relative_to(directory))] = path.read_bytes()
+    return contents
+
+
+class TestOutputScheduler(unittest.TestCase):
+    """
+    Check if output tasks are run in an order that respects their
+    dependencies, and that the files written do not depend on the order
+    """
+
+    def test_run_output_tasks(self):
+        """
+        Check that tasks wait for the tasks they come after, and that the
+        tasks given by a follow-up are run
+        """
+        for jobs in [1, 3]:
+            with tempfile.TemporaryDirectory() as out_dir:
+                paths = {name: os.path.join(out_dir, name) for name in "abcde"}
+
+                def follow_up(_, paths=paths):
+                    return [
+                        OutputTask(
+                            "e",
+                            write_file,
+                            paths["e"],
+                            "e",
+                            paths["d"],
+                            after=["d"],
+                        ),
+                        OutputTask("d", write_file, paths["d"], "d"),
+                    ]
+
+                results = run_output_tasks(
+                    [
+                        OutputTask(
+                            "c",
+                            write_file,
+                            paths["c"],
+                            "c",
+                            paths["a"],
+                            paths["b"],
+                            after=["a", "b"],
+                        ),
+                        OutputTask("a", write_file, paths["a"], "a"),
+                        OutputTask(
+                            "b",
+                            write_file,
+                            paths["b"],
+                            "b",
+                            paths["a"],
+                            after=["a"],
+                            follow_up=follow_up,
+                        ),
+                    ],
+                    jobs=jobs,
+                )
+                with open(paths["c"]) as handle:
+                    self.assertEqual(handle.read(), "caba")
+                with open(paths["e"]) as handle:
+                    self.assertEqual(handle.read(), "ed")
+            self.assertEqual(results, {"a": 1, "b": 2, "c": 4, "d": 1, "e": 2})
+
+            with self.assertRaises(ValueError):
+                run_output_tasks(
+                    [OutputTask("a", len, "a", after=["b"])], jobs=jobs
+                )
+
+    def test_parallel_ucsc_visualize(self):
+        """
+        Check that the BED, bigBed, density plot and bigWig files and the
+        trackhub are the same whether written over one process or several
+        """
+        # Storage instances made by load_data() are sent to the worker
+        # processes too
+        with mock.patch.dict(
+            load_data_module.data_load_sources_functions,
+            {"rbpdb": scan_data_load},
+        ):
+            scanned = load_data(
+                ["rbpdb"], dict(RNA_INFO, start_coord=301, end_coord=400)
+            )
+        big_storage = {"postar": make_storage(), "rbpdb": scanned["rbpdb"]}
+        with tempfile.TemporaryDirectory() as autosql_dir:
+            with open(
+                os.path.join(autosql_dir, "general_template.as"), "w"
+            ) as handle:
+                handle.write(AUTO_SQL_TEMPLATE)
+            # The annotations of make_storage() have two columns
+            columns = {"names": ["id", "method"], "descriptions": ["", ""]}
+            with mock.patch.object(
+                populate_trackhub_module, "AUTOSQL_PATH", autosql_dir
+            ), mock.patch.dict(
+                populate_trackhub_module.column_data,
+                {"postar": columns, "rbpdb": columns},
+            ):
+                for single_track in [False, True]:
+                    trees = []
+                    for jobs in [1, 3]:
+                        with tempfile.TemporaryDirectory() as out_dir:
+                            ucsc_visualize(
+                                big_storage,
+                                RNA_INFO,
+                                configs={
+                                    "out_dir": out_dir,
+                                    "trackhub": True,
+                                    "trackhub-only": False,
+                                    "single-track": single_track,
+                                    "jobs": jobs,
+                                },
+                            )
+                            trees.append(read_tree(out_dir))
+                    self.assertEqual(trees[0], trees[1])
+                    self.assertTrue(
+                        any(path.endswith(".bigBed") for path in trees[0])
+                    )
+                    self.assertTrue(
+                        any(path.endswith(".bigWig") for path in trees[0])
+                    )
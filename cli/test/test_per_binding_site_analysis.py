@@ -0,0 +1,53 @@
+"""
+Tests the per binding site analysis module for correctness.
+
+"""
+import unittest
+
+from src.rnpfind.bind_analysis import Storage
+from src.rnpfind.binding_analysis_binding_sites import BindingSites
+from src.rnpfind.per_binding_site_analysis import per_site_rows
+
+
+class TestPerSiteRows(unittest.TestCase):
+    """
+    Check if per_site_rows() lists the sites around each binding site
+    """
+
+    def setUp(self):
+        self.storage = Storage()
+        self.storage["rbp1"] = BindingSites([(100, 200), (600, 700)])
+        self.storage["rbp2"] = BindingSites([(205, 220), (740, 750)])
+        self.storage["rbp3"] = BindingSites([(150, 160), (900, 910)])
+
+    def test_main_rbp(self):
+        """Check the rows listed for the sites of one RBP"""
+        rows = [
+            (rbp, site[:2], nearby_rbp, nearby_site[:2], distance, relation)
+            for rbp, site, nearby_rbp, nearby_site, distance, relation in (
+                per_site_rows(self.storage, main_rbp="RBP1")
+            )
+        ]
+        self.assertEqual(
+            rows,
+            [
+                ("RBP1", (100, 200), "RBP3", (150, 160), 0, "competitive"),
+                ("RBP1", (100, 200), "RBP2", (205, 220), 5, "competitive"),
+                ("RBP1", (600, 700), "RBP2", (740, 750), 40, "cooperative"),
+            ],
+        )
+
+    def test_all_rbps(self):
+        """
+        Check that rows for all RBPs are the same as those for each RBP in turn
+        """
+        rows = list(per_site_rows(self.storage))
+        expected = []
+        for rbp in self.storage.get_rbps():
+            expected += list(per_site_rows(self.storage, main_rbp=rbp))
+        self.assertEqual(rows, expected)
+        self.assertEqual(len(rows), 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
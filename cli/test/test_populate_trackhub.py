@@ -0,0 +1,163 @@
+"""
+Tests the populate trackhub module for correctness.
+
+"""
+
+import os
+import tempfile
+import unittest
+
+from src.rnpfind.config import GENOME_VERSION
+from src.rnpfind.populate_rbp_binding_sites_script import (
+    populate_binding_sites,
+    single_track_file_name,
+)
+from src.rnpfind.populate_trackhub import (
+    FieldFilterTrack,
+    convert_bed_file,
+    convert_wig_file,
+    density_plot,
+    rbp_filters,
+)
+
+from .helpers import make_storage
+
+RNA_INFO = {
+    "official_name": "TEST",
+    "chr_n": 5,
+    "start_coord": 1001,
+    "end_coord": 1100,
+    "strand": "-",
+}
+
+CHROM_SIZES = {"chr5": 5000}
+
+
+def bed_auto_sql(field_count):
+    """Makes up an AutoSql description of the fields of a BED file"""
+    return (
+        'table test\n"Sites for testing"\n(\n'
+        + "".join(
+            f'string field{i}; "Field {i}"\n' for i in range(field_count)
+        )
+        + ")\n"
+    )
+
+
+class TestPopulateTrackhub(unittest.TestCase):
+    """
+    Check if binding sites are saved and shown in trackhubs correctly
+    """
+
+    def test_single_track(self):
+        """
+        Check that the BED file holding the binding sites of all RBPs from a
+        source has the lines of the BED files of each RBP
+        """
+        big_storage = {"postar": make_storage()}
+        with tempfile.TemporaryDirectory() as out_dir:
+            lines = {}
+            for single_track in [False, True]:
+                path = os.path.join(out_dir, str(single_track))
+                populate_binding_sites(
+                    big_storage,
+                    RNA_INFO,
+                    ["postar"],
+                    path,
+                    single_track=single_track,
+                )
+                file_names = sorted(os.listdir(os.path.join(path, "postar")))
+                lines[single_track] = []
+                for file_name in file_names:
+                    with open(os.path.join(path, "postar", file_name)) as bed:
+                        lines[single_track] += bed.readlines()
+
+        self.assertEqual(
+            file_names, [single_track_file_name(RNA_INFO, "postar")]
+        )
+        self.assertEqual(sorted(lines[True]), sorted(lines[False]))
+        self.assertEqual(
+            {line.split("\t")[3] for line in lines[True]}, {"HNRNPC", "PUM2"}
+        )
+
+    def test_bbi_files(self):
+        """
+        Check that the bigBed and bigWig files written straight from the
+        binding sites are the ones converted from the BED and .wig files
+        """
+        big_storage = {"postar": make_storage()}
+        with tempfile.TemporaryDirectory() as out_dir:
+            populate_binding_sites(big_storage, RNA_INFO, ["postar"], out_dir)
+            bed_path = os.path.join(
+                out_dir, "postar", f"pum2-postar-{GENOME_VERSION}-sites.bed"
+            )
+            with open(bed_path) as bed:
+                auto_sql = bed_auto_sql(len(bed.readline().split("\t")))
+
+            for single_track in [False, True]:
+                path = os.path.join(out_dir, str(single_track))
+                source_path = os.path.join(path, "postar")
+                populate_binding_sites(
+                    big_storage,
+                    RNA_INFO,
+                    ["postar"],
+                    path,
+                    single_track=single_track,
+                    auto_sql=auto_sql,
+                    chrom_sizes=CHROM_SIZES,
+                )
+                for run_length in [True, False]:
+                    density_plot(
+                        big_storage,
+                        RNA_INFO,
+                        ["postar"],
+                        path,
+                        run_length=run_length,
+                        chrom_sizes=CHROM_SIZES,
+                    )
+                    file_names = sorted(os.listdir(source_path))
+                    # .wig files are fixedStep unless asked to be bedGraph
+                    track_type = (
+                        "type=bedGraph" if run_length else "type=wiggle_0"
+                    )
+                    converted = {}
+                    for file_name in file_names:
+                        file_path = os.path.join(source_path, file_name)
+                        if file_name.endswith(".bed"):
+                            self.assertIn(file_name[:-4] + ".bb", file_names)
+                            with open(file_path[:-4] + ".bb", "rb") as bb:
+                                converted[file_path[:-4] + ".bb"] = bb.read()
+                            convert_bed_file(file_path, auto_sql, CHROM_SIZES)
+                        elif file_name.endswith(".wig"):
+                            self.assertIn(file_name + ".bw", file_names)
+                            with open(file_path) as wig:
+                                header = wig.readline().split()
+                            self.assertEqual(header[1], track_type)
+                            with open(file_path + ".bw", "rb") as bw:
+                                converted[file_path + ".bw"] = bw.read()
+                            convert_wig_file(file_path, CHROM_SIZES)
+                    self.assertEqual(len(converted), 2 if single_track else 4)
+                    for file_path, data in converted.items():
+                        with open(file_path, "rb") as handle:
+                            self.assertEqual(handle.read(), data)
+
+    def test_rbp_filters(self):
+        """Check that tracks holding several RBPs can be filtered by RBP"""
+        track = FieldFilterTrack(
+            name="test-postar-binding-sites",
+            source="test.bb",
+            tracktype="bigBed 9 +",
+            field_filters=rbp_filters(["PUM2", "HNRNPC"]),
+        )
+        self.assertEqual(
+            str(track).splitlines()[-3:],
+            [
+                "filterLabel.name RBP",
+                "filterValues.name HNRNPC,PUM2",
+                "filterType.name multipleListOr",
+            ],
+        )
+        self.assertEqual(
+            rbp_filters(["PUM2", "HNRNPA1,HNRNPA2"])["filterType.name"],
+            "wildcard",
+        )
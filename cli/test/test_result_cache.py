@@ -0,0 +1,179 @@
+"""
+Tests the result cache module for correctness.
+
+"""
+
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from src.rnpfind import load_data as load_data_module
+from src.rnpfind.load_data import load_data
+from src.rnpfind.result_cache import (
+    cache_file_path,
+    cache_storage,
+    load_cached_storage,
+    storage_from_columns,
+    storage_to_columns,
+)
+
+from .helpers import (
+    RNA_INFO,
+    make_storage,
+    scan_data_load,
+    scan_max_site_length,
+)
+
+
+class TestResultCache(unittest.TestCase):
+    """
+    Check if the result cache functions correctly
+    """
+
+    def assert_same_storage(self, storage, other_storage):
+        """Check that two Storage instances hold the same binding sites"""
+        self.assertEqual(list(storage), list(other_storage))
+        self.assertEqual(
+            storage.annotation_table.rows, other_storage.annotation_table.rows
+        )
+        for rbp, binding_sites in storage.items():
+            self.assertEqual(list(other_storage[rbp]), list(binding_sites))
+            self.assertEqual(
+                other_storage[rbp].overlap_mode, binding_sites.overlap_mode
+            )
+
+    def test_columns(self):
+        """Check that a Storage instance is rebuilt from its columns"""
+        storage = make_storage()
+        columns = storage_to_columns(storage)
+        self.assertEqual(columns["site_counts"].tolist(), [2, 3, 0])
+        self.assertEqual(
+            columns["annotation_lengths"].tolist(), [-1, 2, -1, -1, 3]
+        )
+        self.assert_same_storage(
+            storage, storage_from_columns("postar", columns)
+        )
+
+    def test_cache_file_path(self):
+        """Check that regions and sources are cached apart"""
+        self.assertEqual(
+            cache_file_path("postar", RNA_INFO, "cache"),
+            cache_file_path(
+                "postar", dict(RNA_INFO, official_name="OTHER"), "cache"
+            ),
+        )
+        self.assertNotEqual(
+            cache_file_path("postar", RNA_INFO, "cache"),
+            cache_file_path("rbpdb", RNA_INFO, "cache"),
+        )
+        self.assertNotEqual(
+            cache_file_path("postar", RNA_INFO, "cache"),
+            cache_file_path("postar", RNA_INFO, "cache", kind="sites"),
+        )
+        for key, value in [
+            ("chr_n", "X"),
+            ("end_coord", 2001),
+            ("strand", "+"),
+        ]:
+            self.assertNotEqual(
+                cache_file_path("postar", RNA_INFO, "cache"),
+                cache_file_path(
+                    "postar", dict(RNA_INFO, **{key: value}), "cache"
+                ),
+            )
+
+    def test_cache_storage(self):
+        """Check that Storage instances are cached and evicted"""
+        storage = make_storage()
+        other_rna_info = dict(RNA_INFO, start_coord=1)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.assertIsNone(
+                load_cached_storage("postar", RNA_INFO, cache_dir)
+            )
+            cache_storage("postar", RNA_INFO, storage, cache_dir)
+            self.assert_same_storage(
+                storage, load_cached_storage("postar", RNA_INFO, cache_dir)
+            )
+            self.assertIsNone(
+                load_cached_storage("rbpdb", RNA_INFO, cache_dir)
+            )
+
+            # The least recently used file is evicted first
+            path = cache_file_path("postar", RNA_INFO, cache_dir)
+            os.utime(path, ns=(0, 0))
+            size = path.stat().st_size
+            cache_storage(
+                "postar", other_rna_info, storage, cache_dir, size_limit=size
+            )
+            self.assertIsNone(
+                load_cached_storage("postar", RNA_INFO, cache_dir)
+            )
+            self.assertIsNotNone(
+                load_cached_storage("postar", other_rna_info, cache_dir)
+            )
+            self.assertEqual(
+                os.listdir(cache_dir),
+                [cache_file_path("postar", other_rna_info, cache_dir).name],
+            )
+
+    @mock.patch.dict(
+        load_data_module.data_load_sources_functions,
+        {"scan": scan_data_load},
+    )
+    @mock.patch.dict(
+        load_data_module.data_load_sources_max_site_lengths,
+        {"scan": scan_max_site_length},
+    )
+    def test_sliced_load_data(self):
+        """
+        Check that the sites of a region taken from a cached region enclosing
+        or overlapping it are exactly those found by scanning it all
+        """
+        scanned_regions = []
+
+        def count_scans(rna_info):
+            scanned_regions.append(
+                (rna_info["start_coord"], rna_info["end_coord"])
+            )
+            return scan_data_load(rna_info)
+
+        random.seed(3)
+        for _ in range(60):
+            strand = random.choice("+-")
+            cached_start = random.randint(1, 300)
+            cached_end = random.randint(cached_start + 50, 600)
+            start = random.randint(1, 550)
+            end = random.randint(start + 10, min(start + 200, 600))
+            cached_rna_info = dict(
+                RNA_INFO,
+                strand=strand,
+                start_coord=cached_start,
+                end_coord=cached_end,
+            )
+            rna_info = dict(
+                RNA_INFO, strand=strand, start_coord=start, end_coord=end
+            )
+
+            scanned = load_data(["scan"], rna_info)["scan"]
+            with tempfile.TemporaryDirectory() as cache_dir:
+                load_data(["scan"], cached_rna_info, cache_dir=cache_dir)
+                scanned_regions.clear()
+                with mock.patch.dict(
+                    load_data_module.data_load_sources_functions,
+                    {"scan": count_scans},
+                ):
+                    sliced = load_data(["scan"], rna_info, cache_dir=cache_dir)
+            self.assert_same_storage(scanned, sliced["scan"])
+
+            # Nothing is known from a cached region with an unknown base
+            if cached_start <= start and end <= cached_end < 451:
+                self.assertEqual(scanned_regions, [])
+            self.assertTrue(
+                sum(
+                    scanned_end - scanned_start + 1
+                    for scanned_start, scanned_end in scanned_regions
+                )
+                <= end - start + 1
+            )
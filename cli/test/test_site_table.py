@@ -0,0 +1,121 @@
+"""
+Tests the site table module for correctness.
+
+"""
+
+import unittest
+
+from src.rnpfind.bind_analysis import Storage
+from src.rnpfind.binding_analysis_binding_sites import BindingSites
+from src.rnpfind.proximity_matrix import (
+    concatenate_sites,
+    sparse_f_measures,
+    sparse_f_measures_of_sites,
+)
+from src.rnpfind.site_table import SiteTable
+
+
+def make_big_storage():
+    """Makes a small big_storage with two data sources"""
+    postar = Storage()
+    postar["HNRNPC"] = BindingSites([(10, 20, 0), (30, 40, (1, 2))])
+    postar["PUM2"] = BindingSites([(5, 8, 3)])
+
+    rbpdb = Storage()
+    rbpdb["PUM2"] = BindingSites([(6, 12, 0), (50, 60, 0)])
+    rbpdb["QKI"] = BindingSites(
+        [(1, 9, None), (2, 4, None)], overlap_mode=True
+    )
+    return {"postar": postar, "rbpdb": rbpdb}
+
+
+class TestSiteTable(unittest.TestCase):
+    """
+    Check if the SiteTable class functions correctly
+    """
+
+    def test_columns(self):
+        """Check that sites are laid out in contiguous columns"""
+        table = SiteTable.from_big_storage(make_big_storage())
+        self.assertEqual(len(table), 7)
+        self.assertEqual(table.sources, ["postar", "rbpdb"])
+        self.assertEqual(table.rbps, ["HNRNPC", "PUM2", "QKI"])
+        self.assertEqual(table.source_ids.tolist(), [0, 0, 0, 1, 1, 1, 1])
+        self.assertEqual(table.rbp_ids.tolist(), [0, 0, 1, 1, 1, 2, 2])
+        self.assertEqual(table.starts.tolist(), [10, 30, 5, 6, 50, 1, 2])
+        self.assertEqual(table.ends.tolist(), [20, 40, 8, 12, 60, 9, 4])
+        self.assertEqual(
+            [table.annotations[i] for i in table.annotation_ids],
+            [0, (1, 2), 3, 0, 0, None, None],
+        )
+
+        self.assertEqual(table.source_slice("rbpdb"), slice(3, 7))
+        self.assertEqual(table.group_slice("rbpdb", "PUM2"), slice(3, 5))
+        with self.assertRaises(KeyError):
+            table.group_slice("postar", "QKI")
+        with self.assertRaises(KeyError):
+            table.source_slice("encori")
+        with self.assertRaises(KeyError):
+            table.storage("encori")
+        with self.assertRaises(ValueError):
+            table.add_storage("postar", Storage())
+
+    def test_views(self):
+        """Check that the views give back the sites they were made from"""
+        big_storage = make_big_storage()
+        table = SiteTable.from_big_storage(big_storage)
+
+        by_source = table.group_by_source()
+        self.assertEqual(list(by_source), ["postar", "rbpdb"])
+        for source, storage in big_storage.items():
+            self.assertEqual(list(by_source[source]), list(storage))
+            for rbp, binding_sites in storage.items():
+                sites = by_source[source][rbp]
+                self.assertEqual(list(sites), list(binding_sites))
+                self.assertEqual(
+                    sites.overlap_mode, binding_sites.overlap_mode
+                )
+        # Built once, when first looked up
+        self.assertIs(by_source["postar"], by_source["postar"])
+
+        by_rbp = table.group_by_rbp()
+        self.assertEqual(list(by_rbp["PUM2"]), ["postar", "rbpdb"])
+        self.assertEqual(list(by_rbp["QKI"]), ["rbpdb"])
+        self.assertEqual(
+            list(by_rbp["PUM2"]["rbpdb"]), list(big_storage["rbpdb"]["PUM2"])
+        )
+        with self.assertRaises(KeyError):
+            by_rbp["HNRNPC"]["rbpdb"]
+
+        rebuilt = table.to_big_storage()
+        self.assertEqual(
+            rebuilt["postar"].binds_near((0, 10)),
+            big_storage["postar"].binds_near((0, 10)),
+        )
+
+    def test_source_columns(self):
+        """
+        Check that the sites of a data source are summarised and laid out as
+        for its Storage instance
+        """
+        big_storage = make_big_storage()
+        table = SiteTable.from_big_storage(big_storage)
+        for source, storage in big_storage.items():
+            self.assertEqual(table.source_rbps(source), list(storage))
+            self.assertEqual(table.summary(source), storage.summary())
+
+        storage = big_storage["postar"]
+        rbps, starts, ends, rbp_ids = table.source_columns("postar")
+        expected = concatenate_sites(storage)
+        self.assertEqual(rbps, expected[0])
+        self.assertEqual(starts.tolist(), expected[1].tolist())
+        self.assertEqual(ends.tolist(), expected[2].tolist())
+        self.assertEqual(rbp_ids.tolist(), expected[3].tolist())
+        self.assertEqual(
+            sparse_f_measures_of_sites(
+                table.source_columns("postar"), [0, 5, 30]
+            ),
+            sparse_f_measures(storage, [0, 5, 30]),
+        )
+        with self.assertRaises(ValueError):
+            table.source_columns("rbpdb")